@@ -0,0 +1,93 @@
+"""
+# Adaptive batch size benchmark
+
+Measures the time to write points with `write_points()` in fixed size batches
+and in batches sized by an `AdaptiveBatchSize`. The HTTP round trip is
+replaced by a transport adapter which takes a fixed overhead plus a cost per
+line to answer, and refuses bodies over a size limit with a 413.
+
+Usage:
+
+    python bench/adaptive_batches.py [points]
+
+"""
+# System imports
+import os
+import sys
+import time
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import requests  # noqa: E402
+
+# Project imports
+import influx  # noqa: E402
+
+
+# Seconds of overhead per request and per line, and the most lines accepted
+OVERHEAD = 0.05
+PER_LINE = 0.00001
+LIMIT = 25000
+
+
+class _LoadAdapter(requests.adapters.BaseAdapter):
+    """ Transport adapter answering writes after a delay growing with their
+    size, refusing those over the limit. """
+    def send(self, request, **kwargs):
+        lines = bytes(request.body).count(b'\n')
+        resp = requests.Response()
+        resp.request = request
+        resp.url = request.url
+        if lines > LIMIT:
+            time.sleep(OVERHEAD)
+            resp.status_code = 413
+            resp.reason = 'Request Entity Too Large'
+            resp._content = b''
+        else:
+            time.sleep(OVERHEAD + PER_LINE * lines)
+            resp.status_code = 204
+            resp.reason = 'No Content'
+        return resp
+
+    def close(self):
+        pass
+
+
+def _write(client, points, size):
+    """ Return the seconds taken and points lost writing *points* in batches
+    of *size*. """
+    lost = 0
+    start = time.time()
+    for i in range(0, len(points), size):
+        batch = points[i:i + size]
+        try:
+            client.write_points('bench', batch)
+        except requests.exceptions.HTTPError:
+            lost += len(batch)
+    return time.time() - start, lost
+
+
+def main(points=500000):
+    data = [influx.Point('cpu', {'value': float(i)}, {'host': 'a'}, i)
+            for i in range(points)]
+
+    for size in (1000, 5000, 50000):
+        client = influx.InfluxDB('http://127.0.0.1:8086', 60, 'u')
+        client.session.mount('http://', _LoadAdapter())
+        elapsed, lost = _write(client, data, size)
+        print("fixed {:<6} {:6.2f} s  {:>6} points lost".format(
+            size, elapsed, lost))
+
+    batching = influx.AdaptiveBatchSize(5000, target=0.25)
+    client = influx.InfluxDB('http://127.0.0.1:8087', 60, 'u',
+                             batching=batching)
+    client.session.mount('http://', _LoadAdapter())
+    elapsed, lost = _write(client, data, points)
+    print("adaptive     {:6.2f} s  {:>6} points lost".format(elapsed, lost))
+    print("adaptive     {}".format(batching.stats()))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
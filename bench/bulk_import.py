@@ -0,0 +1,101 @@
+"""
+# Bulk import benchmark
+
+Measures importing a line protocol file by parsing it into values for
+`write_many()`, against posting it with `influx.bulk.import_file()`. The HTTP
+round trip is replaced by a transport adapter which sleeps before answering,
+standing in for the server's write time.
+
+Usage:
+
+    python bench/bulk_import.py [lines] [delay_ms] [workers]
+
+"""
+# System imports
+import os
+import sys
+import tempfile
+import time
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import requests  # noqa: E402
+
+# Project imports
+import influx  # noqa: E402
+from influx import bulk  # noqa: E402
+
+
+class _SlowAdapter(requests.adapters.BaseAdapter):
+    """ Transport adapter answering every request with a 204, slowly. """
+    def __init__(self, delay):
+        super(_SlowAdapter, self).__init__()
+        self.delay = delay
+
+    def send(self, request, **kwargs):
+        time.sleep(self.delay)
+        resp = requests.Response()
+        resp.status_code = 204
+        resp.reason = 'No Content'
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        pass
+
+
+def _parse(path, batch):
+    """ Yield `(tags, values)` batches of the lines in *path*. """
+    values = []
+    with open(path, 'r') as source:
+        for line in source:
+            key, fields, stamp = line.split(' ')
+            host = key.split('=')[1]
+            fields = dict(f.split('=') for f in fields.split(','))
+            values.append([int(stamp), host, float(fields['usage']),
+                           float(fields['idle'])])
+            if len(values) == batch:
+                yield values
+                values = []
+    if values:
+        yield values
+
+
+def main(lines=200000, delay_ms=20, workers=4):
+    handle, path = tempfile.mkstemp(suffix='.lp')
+    with os.fdopen(handle, 'w') as target:
+        for i in range(lines):
+            target.write('cpu,host=h{} usage={},idle={} {}\n'.format(
+                i % 100, i * 0.5, 100 - i * 0.5, 1521241703000000000 + i))
+    size = os.path.getsize(path)
+
+    client = influx.InfluxDB('http://127.0.0.1:8086', 60, 'n')
+    client.session.mount('http://', _SlowAdapter(delay_ms / 1000.0))
+
+    try:
+        start = time.time()
+        fields = ['time', 'host', 'usage', 'idle']
+        for values in _parse(path, 5000):
+            client.write_many('bench', 'cpu', fields, values,
+                              {'host': 'VALUE'}, time_field='time')
+        parsed = time.time() - start
+
+        # Batches of about the same number of lines
+        start = time.time()
+        bulk.import_file(client, 'bench', path, size * 5000 // lines,
+                         workers)
+        imported = time.time() - start
+    finally:
+        os.remove(path)
+
+    for name, seconds in (('write_many', parsed),
+                          ('bulk x{}'.format(workers), imported)):
+        print("{:<12} {:8.2f} s {:10.0f} lines/s".format(name, seconds,
+                                                         lines / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:4]])
@@ -0,0 +1,74 @@
+"""
+# Circuit breaker benchmark
+
+Measures how long a burst of `write()` calls from several threads takes to
+fail against an InfluxDB which accepts connections but never answers, with and
+without a circuit breaker on the client.
+
+Usage:
+
+    python bench/circuit_breaker.py [writes] [timeout]
+
+"""
+# System imports
+import os
+import socket
+import sys
+import threading
+import time
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Project imports
+import influx  # noqa: E402
+from influx.breaker import CircuitBreaker  # noqa: E402
+
+
+def _hang(listener):
+    """ Accept connections to *listener* and never answer them. """
+    conns = []
+    while True:
+        conn, _ = listener.accept()
+        conns.append(conn)
+
+
+def _burst(client, writes, threads=8):
+    """ Return the seconds taken by *writes* failing writes over *threads*. """
+    def run(count):
+        for _ in range(count):
+            try:
+                client.write('bench', 'cpu', {'value': 1.0}, time=1)
+            except Exception:
+                pass
+
+    workers = [threading.Thread(target=run, args=(writes // threads,))
+               for _ in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.time() - start
+
+
+def main(writes=400, timeout=0.5):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(128)
+    thread = threading.Thread(target=_hang, args=(listener,))
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:{}'.format(listener.getsockname()[1])
+
+    breaker = CircuitBreaker(failures=5, reset=60)
+    for name, kwargs in (('none', {}), ('breaker', {'breaker': breaker})):
+        client = influx.InfluxDB(url, timeout, 'u', **kwargs)
+        elapsed = _burst(client, writes)
+        print("{:<8} {:8.2f} s for {} writes".format(name, elapsed, writes))
+    print("breaker  {}".format(breaker.stats()))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]] +
+         [float(a) for a in sys.argv[2:3]])
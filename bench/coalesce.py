@@ -0,0 +1,47 @@
+"""
+# Coalescing benchmark
+
+Measures serializing a batch where each series and timestamp is emitted
+several times (as from retries or state change storms), with and without
+coalescing the points first.
+
+Usage:
+
+    python bench/coalesce.py [rows] [copies]
+
+"""
+# System imports
+import os
+import sys
+import timeit
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Project imports
+from influx import InfluxDB, line_protocol  # noqa: E402
+
+
+def main(rows=25000, copies=4):
+    fields = ['time', 'value', 'count']
+    values = [[1521241703097608 + i, i * 0.5, i]
+              for i in range(rows) for _ in range(copies)]
+
+    def plain():
+        return InfluxDB._make_many_lines('cpu', fields, values,
+                                         {'host': 'a'}, 'time', 'u')
+
+    def coalesced():
+        points = InfluxDB._make_many_points('cpu', fields, values,
+                                            {'host': 'a'}, 'time')
+        points, _ = line_protocol.coalesce(points)
+        return line_protocol.make_lines(points, precision='u')
+
+    for name, func in (('plain', plain), ('coalesced', coalesced)):
+        best = min(timeit.repeat(func, number=1, repeat=3))
+        print("{:<10} {:8.1f} ms {:10d} bytes".format(
+            name, best * 1e3, len(func())))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,135 @@
+"""
+# Measurement copy benchmark
+
+Measures copying a measurement between two instances with `select_where()`,
+`unpack()` and `write_many()`, against `copy_measurement()`, reporting the
+wall time and the peak memory traced while copying. Both instances are
+replaced by transport adapters which generate the data, and sleep in
+proportion to the rows read or written.
+
+Usage:
+
+    python bench/copy_measurement.py [rows] [read_us] [write_us]
+
+"""
+# System imports
+import io
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+try:
+    from urllib.parse import unquote_plus
+except ImportError:
+    from urllib import unquote_plus
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import requests  # noqa: E402
+
+# Project imports
+import influx  # noqa: E402
+
+HOSTS = 4
+
+
+class _Adapter(requests.adapters.BaseAdapter):
+    """ Transport adapter standing in for an InfluxDB with *rows* points, one
+    per second, spread over `HOSTS` series. """
+    def __init__(self, rows, read_cost, write_cost):
+        super(_Adapter, self).__init__()
+        self.rows = rows
+        self.read_cost = read_cost
+        self.write_cost = write_cost
+
+    def send(self, request, **kwargs):
+        url = unquote_plus(request.url)
+        resp = requests.Response()
+        resp.request = request
+        resp.url = request.url
+        resp.status_code = 200
+
+        if '/write' in url:
+            time.sleep(request.body.count(b'\n') * self.write_cost)
+            resp.status_code = 204
+            resp.raw = io.BytesIO(b'')
+            return resp
+
+        if 'SHOW FIELD KEYS' in url:
+            body = {'results': [{'statement_id': 0, 'series': [
+                {'name': 'm', 'columns': ['fieldKey', 'fieldType'],
+                 'values': [['value', 'float']]}]}]}
+            resp.raw = io.BytesIO(json.dumps(body).encode('utf-8'))
+            return resp
+
+        start, stop = [int(s) for s in re.findall(r'time [<>]=? (\d+)', url)]
+        stop = min(stop, self.rows)
+        time.sleep((stop - start) * self.read_cost)
+        if 'GROUP BY *' in url:
+            size = int(re.search(r'chunk_size=(\d+)', url).group(1))
+            lines = []
+            for offset in range(start, stop, size):
+                series = [{'name': 'm', 'tags': {'host': 'h{}'.format(h)},
+                           'columns': ['time', 'value'],
+                           'values': [[t, t * 0.5] for t in range(
+                               offset, min(offset + size, stop))
+                               if t % HOSTS == h]}
+                          for h in range(HOSTS)]
+                lines.append(json.dumps({'results': [
+                    {'statement_id': 0, 'series': series}]}))
+            body = '\n'.join(lines)
+        else:
+            body = json.dumps({'results': [{'statement_id': 0, 'series': [
+                {'name': 'm', 'columns': ['time', 'host', 'value'],
+                 'values': [[t, 'h{}'.format(t % HOSTS), t * 0.5]
+                            for t in range(start, stop)]}]}]})
+        resp.raw = io.BytesIO(body.encode('utf-8'))
+        return resp
+
+    def close(self):
+        pass
+
+
+def _measure(func):
+    tracemalloc.start()
+    start = time.time()
+    func()
+    seconds = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main(rows=200000, read_us=2, write_us=4):
+    adapter = _Adapter(rows, read_us / 1e6, write_us / 1e6)
+    src = influx.InfluxDB('http://src:8086', 60, 's')
+    dst = influx.InfluxDB('http://dst:8086', 60, 's')
+    src.session.mount('http://', adapter)
+    dst.session.mount('http://', adapter)
+
+    def sequential():
+        result = src.select_where('db', 'm',
+                                  where='time >= 0s AND time < {}s'.format(
+                                      rows))
+        columns, values = src.unpack(result)
+        for i in range(0, len(values), 10000):
+            dst.write_many('copy', 'm', columns, values[i:i + 10000],
+                           {'host': 'VALUE'}, time_field='time')
+
+    def pipelined():
+        influx.copy_measurement(src, dst, 'db', 'm', 0, rows,
+                                window=rows // 10, chunk_size=10000)
+
+    for name, func in (('sequential', sequential),
+                       ('copy_measurement', pipelined)):
+        seconds, peak = _measure(func)
+        print("{:<18} {:6.2f} s {:8.1f} MB peak".format(
+            name, seconds, peak / 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:4]])
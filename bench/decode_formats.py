@@ -0,0 +1,52 @@
+"""
+# Response decoding benchmark
+
+Measures the cost of decoding a large numeric query result from JSON (as
+`response.json()` does) and from MessagePack, as returned by InfluxDB when
+asked for `application/x-msgpack`.
+
+Usage:
+
+    python bench/decode_formats.py [rows]
+
+"""
+# System imports
+import json
+import os
+import sys
+import timeit
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import msgpack  # noqa: E402
+
+# Project imports
+from influx import formats  # noqa: E402
+
+
+def main(rows=100000):
+    values = [[1521241703097608 + i, i * 0.5, i, 'host{}'.format(i % 10)]
+              for i in range(rows)]
+    result = {'results': [{'statement_id': 0, 'series': [
+        {'name': 'cpu', 'columns': ['time', 'value', 'count', 'host'],
+         'values': values}]}]}
+
+    as_json = json.dumps(result).encode('utf-8')
+    as_msgpack = msgpack.packb(result, use_bin_type=True)
+
+    def decode_json():
+        json.loads(as_json.decode('utf-8'))
+
+    def decode_msgpack():
+        formats.read_msgpack(as_msgpack)
+
+    for name, func, size in (('json', decode_json, len(as_json)),
+                             ('msgpack', decode_msgpack, len(as_msgpack))):
+        best = min(timeit.repeat(func, number=1, repeat=5))
+        print("{:<8} {:8.1f} ms {:10d} bytes".format(name, best * 1e3, size))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,106 @@
+"""
+# Hedged reads benchmark
+
+Measures the latency percentiles of `select_where()` against two stand-in
+replicas which each answer one request in fifty slowly, read through a plain
+client and through a `HedgedInfluxDB` over both, hedging after the observed
+p95 and after a fixed delay.
+
+Usage:
+
+    python bench/hedged_reads.py [reads]
+
+"""
+# System imports
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Project imports
+import influx  # noqa: E402
+
+
+# Fraction of requests answered slowly, and how slowly
+SLOW_RATE = 0.02
+SLOW = 0.2
+
+BODY = json.dumps({'results': [{'statement_id': 0, 'series': [
+    {'name': 'cpu', 'columns': ['time', 'value'],
+     'values': [[i, 1.0] for i in range(10)]}]}]}).encode('utf-8')
+
+
+def _serve(listener):
+    """ Answer requests on every connection to *listener*, some slowly. """
+    def handle(conn):
+        pending = b''
+        while True:
+            while b'\r\n\r\n' not in pending:
+                data = conn.recv(65536)
+                if not data:
+                    return
+                pending += data
+            head, _, pending = pending.partition(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            while len(pending) < length:
+                pending += conn.recv(65536)
+            pending = pending[length:]
+            if random.random() < SLOW_RATE:
+                time.sleep(SLOW)
+            conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: application/json'
+                         b'\r\nContent-Length: ' +
+                         str(len(BODY)).encode('ascii') + b'\r\n\r\n' + BODY)
+
+    while True:
+        conn, _ = listener.accept()
+        thread = threading.Thread(target=handle, args=(conn,))
+        thread.daemon = True
+        thread.start()
+
+
+def _listen():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(16)
+    thread = threading.Thread(target=_serve, args=(listener,))
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:{}'.format(listener.getsockname()[1])
+
+
+def _percentiles(client, reads):
+    """ Return the p50, p95 and p99 of *reads* reads in milliseconds. """
+    times = []
+    for _ in range(reads):
+        start = time.time()
+        client.select_where('bench', 'cpu', where='time > 0')
+        times.append(time.time() - start)
+    times.sort()
+    return [times[int(len(times) * p)] * 1000 for p in (0.5, 0.95, 0.99)]
+
+
+def main(reads=2000):
+    random.seed(1)
+    urls = [_listen(), _listen()]
+    clients = (('plain', influx.InfluxDB(urls[0], 60, 'u')),
+               ('p95', influx.HedgedInfluxDB(urls)),
+               ('fixed', influx.HedgedInfluxDB(urls, delay=0.01)))
+    for name, client in clients:
+        p50, p95, p99 = _percentiles(client, reads)
+        print("{:<7} p50 {:7.2f} ms  p95 {:7.2f} ms  p99 {:7.2f} ms".format(
+            name, p50, p95, p99))
+        if name != 'plain':
+            print("        {}".format(client.stats()))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
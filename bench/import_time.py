@@ -0,0 +1,58 @@
+"""
+# Import time benchmark
+
+Measures the wall time of a cold `import influx` (and of the line protocol
+module on its own) in fresh interpreters, and reports which heavy
+dependencies were loaded as a side effect.
+
+Usage:
+
+    python bench/import_time.py [runs]
+
+"""
+# System imports
+import os
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ('requests', 'simplejson', 'pytool')
+
+SCRIPT = """
+import sys
+import {module}
+print(','.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure(module, runs):
+    """ Return the best import time in seconds and the heavy modules. """
+    script = SCRIPT.format(module=module, heavy=HEAVY)
+    baseline = [sys.executable, '-c', 'pass']
+    command = [sys.executable, '-c', script]
+
+    def best(args):
+        times = []
+        for _ in range(runs):
+            start = time.time()
+            output = subprocess.check_output(args, cwd=ROOT)
+            times.append(time.time() - start)
+        return min(times), output.decode('utf-8').strip()
+
+    empty, _ = best(baseline)
+    elapsed, loaded = best(command)
+    return elapsed - empty, loaded
+
+
+def main(runs=10):
+    for module in ('influx', 'influx.line_protocol'):
+        elapsed, loaded = measure(module, runs)
+        print("{:<22} {:8.2f} ms  loaded: {}".format(
+            module, elapsed * 1e3, loaded or '-'))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
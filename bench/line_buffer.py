@@ -0,0 +1,72 @@
+"""
+# Reusable write buffer benchmark
+
+Measures `write_many()` of a batch of points with and without
+`reuse_buffers`, against a transport adapter answering every request with a
+204 at once, reporting the time per call and the peak memory traced while
+writing.
+
+Usage:
+
+    python bench/line_buffer.py [iterations] [points]
+
+"""
+# System imports
+import os
+import sys
+import timeit
+import tracemalloc
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import requests  # noqa: E402
+
+# Project imports
+import influx  # noqa: E402
+
+
+class _Adapter(requests.adapters.BaseAdapter):
+    """ Transport adapter answering every request with a 204. """
+    def send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.status_code = 204
+        resp.reason = 'No Content'
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        pass
+
+
+def main(iterations=500, points=1000):
+    fields = ['time', 'host', 'usage', 'idle']
+    values = [[1521241703097608 + i, 'h{}'.format(i % 10), i * 0.5, 100.0]
+              for i in range(points)]
+
+    for reuse in (False, True):
+        client = influx.InfluxDB('http://127.0.0.1:8086', 60, 'u',
+                                 reuse_buffers=reuse)
+        client.session.mount('http://', _Adapter())
+
+        def write():
+            client.write_many('bench', 'cpu', fields, values,
+                              {'host': 'VALUE'}, time_field='time')
+
+        best = min(timeit.repeat(write, number=iterations, repeat=5))
+
+        write()
+        tracemalloc.start()
+        write()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        name = 'reuse' if reuse else 'strings'
+        print("{:<8} {:8.1f} us/call {:8.1f} KB peak".format(
+            name, best / iterations * 1e6, peak / 1e3))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,66 @@
+"""
+# Sampled profiling overhead benchmark
+
+Measures `write_many()` of a batch of points with profiling off and with one
+in N calls profiled, against a transport adapter answering every request with
+a 204 at once.
+
+Usage:
+
+    python bench/profiling_overhead.py [iterations] [points]
+
+"""
+# System imports
+import os
+import sys
+import timeit
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import requests  # noqa: E402
+
+# Project imports
+import influx  # noqa: E402
+
+
+class _Adapter(requests.adapters.BaseAdapter):
+    """ Transport adapter answering every request with a 204. """
+    def send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.status_code = 204
+        resp.reason = 'No Content'
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        pass
+
+
+def main(iterations=2000, points=100):
+    client = influx.InfluxDB('http://127.0.0.1:8086', 60, 'u')
+    client.session.mount('http://', _Adapter())
+    fields = ['time', 'host', 'value']
+    values = [[1521241703097608 + i, 'h{}'.format(i % 10), i * 0.5]
+              for i in range(points)]
+
+    def write():
+        client.write_many('bench', 'cpu', fields, values, {'host': 'VALUE'},
+                          time_field='time')
+
+    for sample in (0, 1000, 100, 10, 1):
+        client.stop_profiling()
+        if sample:
+            client.start_profiling(sample)
+        best = min(timeit.repeat(write, number=iterations, repeat=5))
+        name = '1 in {}'.format(sample) if sample else 'off'
+        print("{:<10} {:8.2f} us/call".format(name,
+                                              best / iterations * 1e6))
+
+    client.stop_profiling().dump(sys.stdout, limit=5)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,82 @@
+"""
+# Rollup benchmark
+
+Compares writing 10 Hz readings as is with rolling them up into 1 minute
+windows, by the time spent on the client and the line protocol bytes sent.
+The HTTP round trip is replaced by a transport adapter that returns
+immediately.
+
+Usage:
+
+    python bench/rollup.py [series] [minutes]
+
+"""
+# System imports
+import os
+import sys
+import time
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import requests  # noqa: E402
+
+# Project imports
+import influx  # noqa: E402
+
+
+class _Adapter(requests.adapters.BaseAdapter):
+    """ Transport adapter answering every request with a 204. """
+    def __init__(self):
+        super(_Adapter, self).__init__()
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += len(request.body or b'')
+        resp = requests.Response()
+        resp.status_code = 204
+        resp.reason = 'No Content'
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        pass
+
+
+def main(series=10, minutes=10):
+    client = influx.InfluxDB('http://127.0.0.1:8086', 60, 'ms')
+    adapter = _Adapter()
+    client.session.mount('http://', adapter)
+
+    fields = ['time', 'value']
+    start = 1521241680000
+    batches = [[[start + minute * 60000 + i * 100, float(i % 50)]
+                for i in range(600)]
+               for minute in range(minutes)]
+
+    def plain():
+        for values in batches:
+            for host in range(series):
+                client.write_many('bench', 'sensor', fields, values,
+                                  {'host': str(host)}, 'time')
+
+    def rollup():
+        writer = influx.RollupWriter(client, '1m')
+        for values in batches:
+            for host in range(series):
+                writer.write_many('bench', 'sensor', fields, values,
+                                  {'host': str(host)}, 'time')
+        writer.close()
+
+    for name, func in (('plain', plain), ('rollup', rollup)):
+        adapter.sent = 0
+        begin = time.time()
+        func()
+        print("{:<7} {:8.1f} ms {:10d} bytes".format(
+            name, (time.time() - begin) * 1e3, adapter.sent))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
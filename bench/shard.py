@@ -0,0 +1,79 @@
+"""
+# Sharded write benchmark
+
+Measures writing a batch of series through `ShardedInfluxDB`, which splits it
+by instance and sends the pieces in parallel, against sending each instance's
+piece in turn. The HTTP round trip is replaced by a transport adapter which
+sleeps before answering.
+
+Usage:
+
+    python bench/shard.py [shards] [delay_ms]
+
+"""
+# System imports
+import os
+import sys
+import time
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import requests  # noqa: E402
+
+# Project imports
+import influx  # noqa: E402
+
+
+class _SlowAdapter(requests.adapters.BaseAdapter):
+    """ Transport adapter answering every request with a 204, slowly. """
+    def __init__(self, delay):
+        super(_SlowAdapter, self).__init__()
+        self.delay = delay
+
+    def send(self, request, **kwargs):
+        time.sleep(self.delay)
+        resp = requests.Response()
+        resp.status_code = 204
+        resp.reason = 'No Content'
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        pass
+
+
+def main(shards=4, delay_ms=20):
+    urls = ['http://shard{}:8086'.format(i) for i in range(shards)]
+    client = influx.ShardedInfluxDB(urls)
+    for shard in client.clients.values():
+        shard.session.mount('http://', _SlowAdapter(delay_ms / 1000.0))
+
+    fields = ['time', 'host', 'value']
+    values = [[1521241703097608 + i, 'host{}'.format(i % 100), float(i)]
+              for i in range(10000)]
+    tags = {'host': 'VALUE'}
+
+    def sharded():
+        client.write_many('bench', 'cpu', fields, values, tags, 'time')
+
+    def sequential():
+        points = influx.InfluxDB._make_many_points('cpu', fields, values,
+                                                   dict(tags), 'time')
+        pieces = {}
+        for point in points:
+            shard = client._shard('bench', point.key())
+            pieces.setdefault(shard, []).append(point)
+        for shard, shard_points in pieces.items():
+            shard.write_points('bench', shard_points)
+
+    for name, func in (('sequential', sequential), ('sharded', sharded)):
+        begin = time.time()
+        func()
+        print("{:<11} {:8.1f} ms".format(name, (time.time() - begin) * 1e3))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
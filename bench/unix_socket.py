@@ -0,0 +1,85 @@
+"""
+# Unix socket transport benchmark
+
+Measures the round trip of a single point `write()` over TCP loopback and over
+a unix domain socket, against a minimal stand-in server answering every
+request with a 204 on a kept alive connection.
+
+Usage:
+
+    python bench/unix_socket.py [iterations]
+
+"""
+# System imports
+import os
+import socket
+import sys
+import tempfile
+import threading
+import timeit
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Project imports
+import influx  # noqa: E402
+
+
+def _serve(listener):
+    """ Answer requests on every connection to *listener* with a 204. """
+    def handle(conn):
+        pending = b''
+        while True:
+            while b'\r\n\r\n' not in pending:
+                data = conn.recv(65536)
+                if not data:
+                    return
+                pending += data
+            head, _, pending = pending.partition(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            while len(pending) < length:
+                pending += conn.recv(65536)
+            pending = pending[length:]
+            conn.sendall(b'HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n'
+                         b'\r\n')
+
+    while True:
+        conn, _ = listener.accept()
+        thread = threading.Thread(target=handle, args=(conn,))
+        thread.daemon = True
+        thread.start()
+
+
+def _listen(family, address):
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.bind(address)
+    listener.listen(16)
+    thread = threading.Thread(target=_serve, args=(listener,))
+    thread.daemon = True
+    thread.start()
+    return listener
+
+
+def main(iterations=5000):
+    tcp = _listen(socket.AF_INET, ('127.0.0.1', 0))
+    path = os.path.join(tempfile.mkdtemp(), 'influxdb.sock')
+    _listen(socket.AF_UNIX, path)
+
+    urls = (('tcp', 'http://127.0.0.1:{}'.format(tcp.getsockname()[1])),
+            ('unix', 'http+unix://' + path))
+    for name, url in urls:
+        client = influx.InfluxDB(url, 60, 'u')
+
+        def write():
+            client.write('bench', 'cpu', {'value': 1.0}, {'host': 'a'},
+                         1521241703.097608)
+
+        best = min(timeit.repeat(write, number=iterations, repeat=5))
+        print("{:<6} {:8.2f} us/call".format(name, best / iterations * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
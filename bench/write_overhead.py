@@ -0,0 +1,74 @@
+"""
+# Write overhead benchmark
+
+Measures the client side cost of a single point `write()`, with the HTTP
+round trip replaced by a transport adapter that returns immediately. Request
+building and preparation by *requests* is included in the timings. The same
+write over UDP, to a local socket which is never read, is timed for
+comparison.
+
+Usage:
+
+    python bench/write_overhead.py [iterations]
+
+"""
+# System imports
+import os
+import socket
+import sys
+import timeit
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import requests  # noqa: E402
+
+# Project imports
+import influx  # noqa: E402
+
+
+class _Adapter(requests.adapters.BaseAdapter):
+    """ Transport adapter answering every request with a 204. """
+    def send(self, request, **kwargs):
+        resp = requests.Response()
+        resp.status_code = 204
+        resp.reason = 'No Content'
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        pass
+
+
+def main(iterations=20000):
+    client = influx.InfluxDB('http://127.0.0.1:8086', 60, 'u')
+    client.session.mount('http://', _Adapter())
+
+    def write():
+        client.write('bench', 'cpu', {'value': 1.0}, {'host': 'a'},
+                     1521241703.097608)
+
+    def make_request():
+        client._make_request(influx.IQL_WRITE, database='bench',
+                             lines='cpu,host=a value=1.0 1521241703097608\n')
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(('127.0.0.1', 0))
+    udp = influx.InfluxUDP(
+        'udp://127.0.0.1:{}'.format(listener.getsockname()[1]), 'u')
+
+    def udp_write():
+        udp.write('bench', 'cpu', {'value': 1.0}, {'host': 'a'},
+                  1521241703.097608)
+
+    for name, func in (('write', write), ('_make_request', make_request),
+                       ('udp write', udp_write)):
+        best = min(timeit.repeat(func, number=iterations, repeat=5))
+        print("{:<14} {:8.2f} us/call".format(
+            name, best / iterations * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,69 @@
+"""
+# Write queue producer latency benchmark
+
+Measures the time producers spend per point when InfluxDB is slow, writing
+directly with `write()` and enqueueing with `WriteQueue.put()`. The HTTP round
+trip is replaced by a transport adapter which sleeps before answering.
+
+Usage:
+
+    python bench/write_queue.py [points] [delay_ms]
+
+"""
+# System imports
+import os
+import sys
+import time
+
+# Make the package importable when run from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 3rd party imports
+import requests  # noqa: E402
+
+# Project imports
+import influx  # noqa: E402
+
+
+class _SlowAdapter(requests.adapters.BaseAdapter):
+    """ Transport adapter answering every request with a 204, slowly. """
+    def __init__(self, delay):
+        super(_SlowAdapter, self).__init__()
+        self.delay = delay
+
+    def send(self, request, **kwargs):
+        time.sleep(self.delay)
+        resp = requests.Response()
+        resp.status_code = 204
+        resp.reason = 'No Content'
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        pass
+
+
+def main(points=200, delay_ms=50):
+    client = influx.InfluxDB('http://127.0.0.1:8086', 60, 'u')
+    client.session.mount('http://', _SlowAdapter(delay_ms / 1000.0))
+
+    def produce(write):
+        latencies = []
+        for i in range(points):
+            start = time.time()
+            write('bench', 'cpu', {'value': float(i)}, {'host': 'a'})
+            latencies.append(time.time() - start)
+        latencies.sort()
+        return latencies[len(latencies) // 2], latencies[-1]
+
+    queue = influx.WriteQueue(client, batch_size=100, flush_interval=0.01)
+    for name, write in (('write', client.write), ('queue.put', queue.put)):
+        median, worst = produce(write)
+        print("{:<10} median {:9.1f} us  max {:9.1f} us".format(
+            name, median * 1e6, worst * 1e6))
+    queue.close()
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
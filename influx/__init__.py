@@ -6,22 +6,39 @@ This module contains an InfluxDB client.
 """
 # System imports
 import logging
-try:
-    from urllib import parse
-except ImportError:
-    import urlparse as parse
-
-# 3rd party imports
-import pytool
-import requests
-import simplejson
-from requests.exceptions import RequestException, HTTPError
+import numbers
+import re
+import threading
+import time
+import weakref
 
 # Project imports
+from . import arrow
+from . import formats
 from . import line_protocol
+from .lazy import LazyModule, hashed_singleton
+from .batching import AdaptiveBatchSize  # noqa: F401
+from .hedge import HedgedInfluxDB  # noqa: F401
+from .line_protocol import Point, Series  # noqa: F401
+from .migrate import copy_measurement  # noqa: F401
+from .schema import SchemaCache
+from .shard import ShardedInfluxDB  # noqa: F401
+from .template import Template
+from .udp import InfluxUDP  # noqa: F401
+from .writer import RollupWriter, WriteQueue  # noqa: F401
+
+# 3rd party imports, loaded on first use to keep `import influx` fast
+requests = LazyModule('requests')
+
+# Text types, so unicode durations are accepted on Python 2
+try:
+    string_types = (str, unicode)  # noqa: F821
+except NameError:
+    string_types = (str,)
 
 
 # Mappings for InfluxQL commands to HTTP requests
+IQL_PING = 'GET', 'ping', None, ''
 IQL_WRITE = 'POST', 'write?db={database}&precision={precision}', '', '{lines}'
 IQL_CREATE_DATABASE = ('POST', 'query', {'q':
                                          "CREATE DATABASE \"{database}\""}, '')
@@ -31,21 +48,64 @@ IQL_DROP_MEASUREMENT = ('POST', 'query', {'db': "{database}",
                         'q': "DROP MEASUREMENT \"{measurement}\""}, '')
 IQL_SELECT = ('GET', 'query', {'db': "{database}", 'epoch': '{precision}',
               'q': "SELECT {fields} FROM {measurement} WHERE {where}"}, '')
+IQL_SELECT_CHUNKED = ('GET', 'query', {
+                      'db': "{database}", 'epoch': '{precision}',
+                      'chunked': 'true', 'chunk_size': '{chunk_size}',
+                      'q': "SELECT {fields} FROM {measurement} WHERE {where}"},
+                      '')
+IQL_SELECT_SERIES_CHUNKED = ('GET', 'query', {
+                             'db': "{database}", 'epoch': '{precision}',
+                             'chunked': 'true', 'chunk_size': '{chunk_size}',
+                             'q': "SELECT {fields} FROM {measurement} WHERE "
+                                  "{where} GROUP BY *"},
+                             '')
 IQL_SHOW_TAGS = ('GET', 'query', {'db': "{database}",
                  'q': "SHOW TAG KEYS FROM {measurement}"}, '')
 IQL_SHOW_FIELDS = ('GET', 'query', {'db': "{database}",
                    'q': "SHOW FIELD KEYS FROM {measurement}"}, '')
+IQL_SHOW_ALL_TAGS = ('GET', 'query', {'db': "{database}",
+                     'q': "SHOW TAG KEYS"}, '')
+IQL_SHOW_ALL_FIELDS = ('GET', 'query', {'db': "{database}",
+                       'q': "SHOW FIELD KEYS"}, '')
 IQL_SELECT_INTO = ('POST', 'query', {'db': "{database}",
                    'q': "SELECT {fields} INTO {target} FROM {source} {where} "
                                      "{group_by}"}, '')
 
 
+log = logging.getLogger('influx-client')
+
+
+# InfluxQL duration units, in seconds
+DURATION_UNITS = {
+        'ns': 1e-9,
+        'u': 1e-6,
+        'ms': 1e-3,
+        's': 1,
+        'm': 60,
+        'h': 3600,
+        'd': 86400,
+        'w': 604800,
+        }
+
+# Candidate GROUP BY time() intervals for automatic selection, in seconds
+NICE_INTERVALS = [
+        0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+        1, 2, 5, 10, 15, 30,
+        60, 120, 300, 600, 900, 1800,
+        3600, 7200, 10800, 21600, 43200,
+        86400, 604800,
+        ]
+
+# Pages of rows sharing one timestamp before paginate() warns about them
+RUN_PAGES_WARNING = 10
+
+
 def debug(*args, **kwargs):
     """ Debug log helper. """
-    logging.getLogger('influx-client').debug(*args, **kwargs)
+    log.debug(*args, **kwargs)
 
 
-@pytool.lang.hashed_singleton
+@hashed_singleton
 class InfluxDB:
     """
     InfluxDB client class
@@ -58,18 +118,163 @@ class InfluxDB:
     """
 
     __slots__ = [
+            'base_url',
+            'batching',
+            'breaker',
+            'buffers',
+            'coalesced',
+            'environment',
+            'field_schemas',
+            'headers',
+            'keepalive',
+            'latency',
+            'lock',
             'precision',
+            'profiler',
+            'schema',
             'session',
+            'templates',
             'timeout',
             'url',
+            'version',
             '__weakref__',
             ]
 
-    def __init__(self, url, timeout=60, precision='u'):
+    def __init__(self, url, timeout=60, precision='u', schema_ttl=0,
+                 msgpack=False, warm=0, keepalive=None, profile=0,
+                 reuse_buffers=False, breaker=None, batching=None):
         self.url = url
         self.timeout = timeout
         self.precision = precision
+        self.schema = SchemaCache(schema_ttl)
         self.session = requests.Session()
+        self.templates = {}
+
+        # Unix socket URLs get their own transport, with requests going to a
+        # placeholder host on it
+        self.base_url = url
+        if url.startswith('http+unix://'):
+            from . import unix
+            socket_path, self.base_url = unix.split_url(url)
+            self.session.mount(unix.SCHEME, unix.UnixAdapter(socket_path))
+
+        self.environment = None
+        self.field_schemas = {}
+        self.breaker = breaker
+        self.batching = batching
+
+        # Ask for MessagePack responses if we can decode them
+        self.headers = None
+        if msgpack and formats.get_msgpack() is not None:
+            self.headers = {'Accept': formats.MSGPACK}
+
+        self.version = None
+        self.latency = None
+        self.keepalive = None
+        self.coalesced = 0
+        self.lock = threading.Lock()
+        # Each thread writes through its own reusable buffer, if enabled
+        self.buffers = threading.local() if reuse_buffers else None
+
+        self.profiler = None
+        if profile:
+            self.start_profiling(profile)
+
+        # Creating a client should not fail because InfluxDB is unavailable,
+        # so warm up errors are only logged
+        if warm:
+            try:
+                self.warm(warm)
+            except requests.exceptions.RequestException:
+                log.warning("Failed warming connections to %s", url,
+                            exc_info=True)
+        if keepalive:
+            self.start_keepalive(keepalive, warm or 1)
+
+    def ping(self):
+        """
+        Return the server version from pinging InfluxDB.
+
+        The version and the round trip time of the ping are kept in the
+        client's *version* and *latency* (in seconds) attributes.
+
+        If there is an error with the request, an exception will be raised from
+        the *requests* library.
+
+        """
+        start = time.time()
+        resp = self._make_request(IQL_PING)
+        latency = time.time() - start
+        InfluxDB._check_and_raise(resp)
+
+        self.latency = latency
+        self.version = resp.headers.get('X-Influxdb-Version', None)
+        return self.version
+
+    def warm(self, connections=1):
+        """
+        Return the server version after opening *connections* pooled
+        connections to InfluxDB, by pinging on that many threads at once.
+
+        Connections beyond the session pool size (`10` by default) are not
+        kept.
+
+        If there is an error with the request, an exception will be raised from
+        the *requests* library.
+
+        :param int connections: Number of connections to open (default `1`)
+
+        """
+        pings = [_Background(self.ping) for _ in range(connections)]
+        for ping in pings:
+            ping.result()
+        return self.version
+
+    def start_keepalive(self, interval, connections=1):
+        """
+        Start a background thread pinging InfluxDB on *connections*
+        connections every *interval* seconds, which keeps pooled connections
+        from going idle and keeps the *version* and *latency* attributes up to
+        date. Failed pings are logged and otherwise ignored.
+
+        :param float interval: Seconds between pings
+        :param int connections: Number of connections to keep open
+            (default `1`)
+
+        """
+        self.stop_keepalive()
+        self.keepalive = _KeepAlive(self, interval, connections)
+
+    def stop_keepalive(self):
+        """ Stop the background keep alive thread, if it is running. """
+        if self.keepalive is not None:
+            self.keepalive.stop()
+            self.keepalive = None
+
+    def start_profiling(self, sample=100, memory=True):
+        """
+        Return a :class:`~influx.profiling.Profiler` which profiles one in
+        every *sample* calls of this client's line protocol serialization,
+        response decoding and request sending, separately.
+
+        :param int sample: Profile one call in this many (default `100`)
+        :param bool memory: Set this to `False` to not trace allocations
+            (default `True`)
+
+        """
+        from . import profiling
+        self.profiler = profiling.Profiler(sample, memory)
+        return self.profiler
+
+    def stop_profiling(self):
+        """
+        Stop profiling, and return a :class:`~influx.profiling.ProfileReport`
+        of the calls profiled, or `None` if profiling was not started.
+
+        """
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            return profiler.report()
 
     def create_database(self, database):
         """
@@ -89,7 +294,7 @@ class InfluxDB:
         """
         resp = self._make_request(IQL_CREATE_DATABASE, database=database)
         InfluxDB._check_and_raise(resp)
-        return resp.json()
+        return self._decode(resp)
 
     def drop_database(self, database):
         """
@@ -105,8 +310,9 @@ class InfluxDB:
 
         """
         resp = self._make_request(IQL_DROP_DATABASE, database=database)
+        self.schema.invalidate(database)
         InfluxDB._check_and_raise(resp)
-        return resp.json()
+        return self._decode(resp)
 
     def drop_measurement(self, measurement, database):
         """
@@ -125,8 +331,9 @@ class InfluxDB:
         """
         resp = self._make_request(
             IQL_DROP_MEASUREMENT, database=database, measurement=measurement)
+        self.schema.invalidate(database, measurement)
         InfluxDB._check_and_raise(resp)
-        return resp.json()
+        return self._decode(resp)
 
     def write(self, database, measurement, fields, tags={}, time=None):
         """
@@ -144,18 +351,28 @@ class InfluxDB:
         :return dict: Response JSON
 
         """
-        lines = InfluxDB._make_lines(measurement, fields, tags, time,
+        schema = self.field_schemas.get(measurement, None)
+        point = InfluxDB._make_point(measurement, fields, tags, time,
                                      precision=self.precision)
+        lines = self._serialize(self._make_payload, [point], schema)
         resp = self._safe_request(IQL_WRITE, database=database, lines=lines)
         InfluxDB._check_and_raise(resp)
         if resp.status_code != 204:
-            return resp.json()
+            return self._decode(resp)
 
     def write_many(self, database, measurement, fields, values, tags={},
-                   time_field=None):
+                   time_field=None, coalesce=False):
         """
         Return response JSON from writing data points as a dict.
 
+        With *coalesce*, points which share a series and timestamp are merged
+        into one before being serialized, with the last value for each field
+        winning, as it would in InfluxDB. The number of points merged away is
+        added to the client's *coalesced* counter.
+
+        If the client has an :class:`~influx.batching.AdaptiveBatchSize`, the
+        points are written in batches of its current size.
+
         If there is an error with the request, an exception will be raised from
         the *requests* library.
 
@@ -166,15 +383,100 @@ class InfluxDB:
         :param dict tags: Dictionary of tags to associate with these points
         :param str time_field: Field to extract and use as the timestamp
             (optional)
+        :param bool coalesce: Merge points with the same series and timestamp
+            (default `False`)
         :return dict: Response JSON
 
         """
-        lines = InfluxDB._make_many_lines(measurement, fields, values, tags,
-                                          time_field, precision=self.precision)
+        schema = self.field_schemas.get(measurement, None)
+        if self.batching is not None:
+            points = InfluxDB._make_many_points(measurement, fields, values,
+                                                tags, time_field, schema)
+            if coalesce:
+                points, merged = line_protocol.coalesce(points)
+                self._add_coalesced(merged)
+            return self._write_batches(database, points)
+
+        if coalesce:
+            lines = self._serialize(self._make_coalesced_lines, measurement,
+                                    fields, values, tags, time_field, schema)
+        else:
+            points = InfluxDB._make_many_points(measurement, fields, values,
+                                                tags, time_field, schema)
+            lines = self._serialize(self._make_payload, points)
         resp = self._safe_request(IQL_WRITE, database=database, lines=lines)
         InfluxDB._check_and_raise(resp)
         if resp.status_code != 204:
-            return resp.json()
+            return self._decode(resp)
+
+    def write_points(self, database, points):
+        """
+        Return response JSON from writing data points as a dict.
+
+        Points are serialized directly, without building intermediate dicts,
+        which makes this the cheapest way to write large numbers of points.
+
+        Field schemas set with :meth:`set_field_schema` are used for points
+        whose series does not have its own schema.
+
+        If the client has an :class:`~influx.batching.AdaptiveBatchSize`, the
+        points are written in batches of its current size.
+
+        If there is an error with the request, an exception will be raised from
+        the *requests* library.
+
+        :param str database: Database name to write to
+        :param list points: List of :class:`~influx.line_protocol.Point`
+        :return dict: Response JSON
+
+        """
+        if self.batching is not None:
+            return self._write_batches(database, points, self.field_schemas)
+
+        lines = self._serialize(self._make_payload, points,
+                                self.field_schemas)
+        resp = self._safe_request(IQL_WRITE, database=database, lines=lines)
+        InfluxDB._check_and_raise(resp)
+        if resp.status_code != 204:
+            return self._decode(resp)
+
+    def write_lines(self, database, lines):
+        """
+        Return response JSON from writing line protocol *lines* as is.
+
+        If there is an error with the request, an exception will be raised from
+        the *requests* library.
+
+        :param str database: Database name to write to
+        :param str lines: Newline separated line protocol lines
+        :return dict: Response JSON
+
+        """
+        resp = self._safe_request(IQL_WRITE, database=database, lines=lines)
+        InfluxDB._check_and_raise(resp)
+        if resp.status_code != 204:
+            return self._decode(resp)
+
+    def set_field_schema(self, measurement, fields, digits=None):
+        """
+        Declare the field types for *measurement*.
+
+        Subsequent writes to *measurement* convert declared fields with a
+        fixed formatter for their type, instead of probing the type of every
+        value. Fields declared as `'integer'` are written as true integers.
+        Passing `None` as *fields* removes the schema.
+
+        :param str measurement: Measurement name
+        :param dict fields: Field names mapped to `'float'`, `'integer'`,
+            `'boolean'` or `'string'`
+        :param dict digits: Float field names mapped to the number of decimal
+            places to write (optional)
+
+        """
+        if fields is None:
+            self.field_schemas.pop(measurement, None)
+            return
+        self.field_schemas[measurement] = line_protocol.Schema(fields, digits)
 
     def unpack(self, result):
         """
@@ -232,8 +534,32 @@ class InfluxDB:
 
         return columns, values
 
+    def unpack_series(self, result):
+        """
+        Return every series in the first statement of *result*.
+
+        Unlike :meth:`unpack`, this keeps all the series InfluxDB returns,
+        which there will be one of per tag group for `GROUP BY <tag>`
+        queries.
+
+        :param dict result: Result dictionary as returned by API
+        :return list: List of `(name, tags, columns, values)` tuples, where
+            *tags* is a dict of the group's tag values (empty when not
+            grouped by tags)
+
+        """
+        unpacked = []
+        for series in InfluxDB._unpack_series(result):
+            columns = series.get('columns', None)
+            if not columns:
+                continue
+            unpacked.append((series.get('name', None),
+                             series.get('tags', None) or {},
+                             columns, series.get('values', [])))
+        return unpacked
+
     def select_recent(self, database, measurement, fields='*', tags=None,
-                      relative_time="15m"):
+                      relative_time="15m", format=None, output=None):
         """
         Return response JSON from querying InfluxDB for all fields in the given
         database and measurement.
@@ -247,6 +573,9 @@ class InfluxDB:
         :param str tags: Tags to restrict the select by (optional)
         :param str relative_time: Relative time to now() to query for
                                   (optional, default `'15m'`)
+        :param str format: Response format, see :meth:`select_where`
+        :param output: File-like object to write the raw response body to,
+            see :meth:`select_where`
 
         .. note::
 
@@ -265,18 +594,31 @@ class InfluxDB:
         else:
             where = relative_time
 
-        resp = self._safe_request(IQL_SELECT, database=database,
-                                  measurement=measurement, fields=fields,
-                                  where=where)
-        InfluxDB._check_and_raise(resp)
-        return resp.json()
+        return self._select(database, measurement, fields, where, format,
+                            output)
 
     def select_where(self, database, measurement, fields='*', tags=None,
-                     where=None, desc=False, limit=None):
+                     where=None, desc=False, limit=None, format=None,
+                     output=None, offset=None):
         """
         Return response JSON from querying InfluxDB for all fields in the given
         database and measurement.
 
+        With `format='msgpack'` the results are requested as MessagePack,
+        which is smaller and faster to decode, and returned in the same
+        structure as JSON. This falls back to JSON if *msgpack* is not
+        installed.
+
+        With `format='csv'` the results are requested as CSV and streamed,
+        and a generator of rows (lists of strings) is returned instead, parsed
+        incrementally without building the whole result in memory. A header
+        row (`name`, `tags`, then the columns) comes first, and again
+        whenever the columns change.
+
+        If *output* is given with a *format*, the raw response body is
+        written to it as it arrives and the number of bytes written is
+        returned, without parsing any rows.
+
         If there is an error with the request, an exception will be raised from
         the *requests* library.
 
@@ -287,6 +629,10 @@ class InfluxDB:
         :param str where: Where clause to add (default `'time > now() - 15m'`)
         :param bool desc: Set this to `True` if you want descending values
         :param int limit: Limit to this number of rows
+        :param str format: Response format, `'json'`, `'msgpack'` or `'csv'`
+            (optional, default `'json'`)
+        :param output: File-like object opened for writing bytes (optional)
+        :param int offset: Skip this number of rows, with *limit* (optional)
 
         """
         where = where or "time > now() - 15m"
@@ -302,12 +648,297 @@ class InfluxDB:
         # Add the limit into the WHERE clause so it's ordered correctly
         if limit:
             where += " LIMIT {}".format(limit)
+            if offset:
+                where += " OFFSET {}".format(offset)
+
+        return self._select(database, measurement, fields, where, format,
+                            output)
+
+    def paginate(self, database, measurement, fields='*', tags=None,
+                 where=None, page_size=10000, desc=False, prefetch=False):
+        """
+        Return a generator of pages of `(columns, values)` for a query over
+        a possibly large time range.
+
+        Pages are fetched by advancing a cursor on the `time` column of the
+        last row of each page (`time >= cursor`), instead of using an offset
+        from the start, so every page costs the same for the server. Rows
+        which share the cursor timestamp and were already returned are
+        skipped with an `OFFSET`, so series with identical timestamps are not
+        lost or repeated at page boundaries.
+
+        The server still reads the skipped rows, so a run of rows sharing one
+        timestamp costs more the longer it is, and a warning is logged once a
+        run spans `RUN_PAGES_WARNING` pages. Restricting the query with
+        *tags* or a larger *page_size* avoids this.
+
+        If there is an error with the request, an exception will be raised from
+        the *requests* library.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str fields: Fields to select in query (optional, default `'*'`)
+        :param str tags: Tags to restrict the select by (optional)
+        :param str where: Where clause to add (default `'time > now() - 15m'`)
+        :param int page_size: Number of rows per page (default `10000`)
+        :param bool desc: Set this to `True` to page backwards in time
+        :param bool prefetch: Set this to `True` to fetch the next page in a
+            background thread while the current page is being processed
+
+        """
+        where = where or "time > now() - 15m"
+        op = '<=' if desc else '>='
+
+        def fetch(cursor, skip):
+            clause = where
+            if cursor is not None:
+                clause = "({}) AND time {} {}".format(
+                    where, op, self._time_literal(cursor))
+            resp = self.select_where(database, measurement, fields, tags,
+                                     where=clause, desc=desc,
+                                     limit=page_size, offset=skip)
+            return self.unpack(resp)
+
+        cursor = None
+        skip = 0
+        pending = None
+        while True:
+            if pending is not None:
+                columns, values = pending.result()
+            else:
+                columns, values = fetch(cursor, skip)
+            if not values:
+                return
+
+            # A short page means there is nothing after it
+            full = len(values) >= page_size
+
+            # Count the rows at the new cursor timestamp, including those
+            # from earlier pages if the whole page shares one timestamp
+            index = columns.index('time')
+            last = values[-1][index]
+            same = 0
+            for row in reversed(values):
+                if row[index] != last:
+                    break
+                same += 1
+            if last == cursor:
+                threshold = RUN_PAGES_WARNING * page_size
+                if skip < threshold <= skip + same:
+                    log.warning("Paginating over %s or more rows at time %s "
+                                "in %s, which gets slower as the run grows",
+                                threshold, last, measurement)
+                skip += same
+            else:
+                skip = same
+            cursor = last
+
+            pending = None
+            if full and prefetch:
+                pending = _Background(fetch, cursor, skip)
+
+            yield columns, values
+
+            if not full:
+                return
+
+    def select_aggregate(self, database, measurement, fields=None,
+                         interval=None, where=None, tags=None,
+                         group_by_tags=None, fill=None, start=None, end=None,
+                         points=1000):
+        """
+        Return a list of series from querying InfluxDB for aggregates of
+        *fields* grouped into *interval* time buckets, as returned by
+        :meth:`unpack_series`.
+
+        Aggregating on the server means only one row per interval (and per
+        tag group) is transferred and decoded, rather than every raw point.
+
+        The time range may be given with *start* and *end*, or as part of
+        *where*. If *interval* is not given, it is chosen from the time range
+        so that about *points* intervals are returned, rounded up to a whole
+        interval such as `'10s'`, `'5m'` or `'1h'`.
+
+        If there is an error with the request, an exception will be raised from
+        the *requests* library.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param dict fields: Field names mapped to an aggregate function name
+            or a list of them, e.g. `{'value': 'mean'}` (default
+            `{'value': 'mean'}`). Each aggregate is returned in a column named
+            `<function>_<field>`. A string is used as the fields clause as is.
+        :param str interval: GROUP BY time() interval (optional)
+        :param str where: Where clause to add (optional)
+        :param dict tags: Tags to restrict the select by (optional)
+        :param list group_by_tags: Tag names to group by, or `'*'` (optional)
+        :param fill: Fill option for empty intervals, one of `'null'`,
+            `'none'`, `'previous'`, `'linear'` or a number (optional)
+        :param start: Start of the time range, as a datetime, an epoch
+            timestamp in seconds (integer or float) or a duration relative to
+            now such as `'6h'` (optional, default `'15m'` if *where* is not
+            given)
+        :param end: End of the time range, as a datetime or an epoch
+            timestamp in seconds (optional, default now)
+        :param int points: Target number of intervals when *interval* is not
+            given (default `1000`)
+        :return list: List of `(name, tags, columns, values)` tuples
+
+        """
+        fields = fields or {'value': 'mean'}
+        if isinstance(fields, dict):
+            selects = []
+            for field, functions in sorted(fields.items()):
+                if not isinstance(functions, (list, tuple)):
+                    functions = [functions]
+                for function in functions:
+                    selects.append('{}({}) AS {}'.format(
+                        function, line_protocol.quote_ident(field),
+                        line_protocol.quote_ident(function + '_' + field)))
+            fields = ', '.join(selects)
+
+        if start is None and not where:
+            start = '15m'
+
+        # Build the time range and work out its length for the interval
+        clauses = []
+        duration = None
+        if isinstance(start, string_types):
+            clauses.append("time > now() - {}".format(start))
+            duration = InfluxDB._parse_duration(start)
+        elif start is not None:
+            timestamp = line_protocol.timestamp_converter(self.precision)
+            units = 1e9 / line_protocol._PRECISION_NS[self.precision]
+
+            def convert(value):
+                # Numbers are seconds, even integers, unlike for points
+                if isinstance(value, numbers.Real):
+                    value = float(value)
+                return timestamp(value)
+
+            start = convert(start)
+            if end is None:
+                end = line_protocol.now(self.precision)
+            else:
+                end = convert(end)
+            clauses.append("time >= {}".format(self._time_literal(start)))
+            clauses.append("time < {}".format(self._time_literal(end)))
+            duration = (end - start) / units
+        if where:
+            clauses.append("({})".format(where))
+        if tags:
+            clauses.append(InfluxDB._format_tags(tags))
+
+        if interval is None:
+            if duration is None:
+                raise ValueError("select_aggregate() requires an interval "
+                                 "or a start when the time range is only "
+                                 "given by where")
+            interval = InfluxDB._nice_interval(duration / max(points, 1))
+
+        group_by = ['time({})'.format(interval)]
+        if group_by_tags == '*':
+            group_by.append('*')
+        elif group_by_tags:
+            group_by.extend(line_protocol.quote_ident(t)
+                            for t in group_by_tags)
+
+        where = ' AND '.join(clauses)
+        where += ' GROUP BY ' + ', '.join(group_by)
+        if fill is not None:
+            where += ' fill({})'.format(fill)
 
         resp = self._safe_request(IQL_SELECT, database=database,
                                   measurement=measurement, fields=fields,
                                   where=where)
         InfluxDB._check_and_raise(resp)
-        return resp.json()
+        return self.unpack_series(self._decode(resp))
+
+    def select_to_arrow(self, database, measurement, fields='*', tags=None,
+                        where=None, chunk_size=10000):
+        """
+        Return a `pyarrow.Table` from querying InfluxDB for *measurement*.
+
+        The results are requested as a chunked, streamed response, and each
+        chunk is converted column by column into a record batch as it
+        arrives, so only one chunk of decoded rows is held at a time. Columns
+        which aren't known fields, such as computed values, are `float64` if
+        numeric, and columns without values in the first chunk take their
+        type from a later one.
+
+        Requires the optional *pyarrow* package.
+
+        If there is an error with the request, an exception will be raised from
+        the *requests* library.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str fields: Fields to select in query (optional, default `'*'`)
+        :param str tags: Tags to restrict the select by (optional)
+        :param str where: Where clause to add (default `'time > now() - 15m'`)
+        :param int chunk_size: Number of rows per chunk (default `10000`)
+
+        """
+        return arrow.make_table(list(self._select_batches(
+            database, measurement, fields, tags, where, chunk_size)))
+
+    def export_parquet(self, path, database, measurement, fields='*',
+                       tags=None, where=None, chunk_size=10000,
+                       compression='snappy'):
+        """
+        Return the number of rows written to a Parquet file at *path* from
+        querying InfluxDB for *measurement*.
+
+        Each chunk of the streamed result is written as its own row group as
+        it arrives, so memory use is bounded by one chunk regardless of the
+        time range queried. No file is written if there are no results.
+
+        A Parquet file has a single schema, so a `ValueError` is raised if a
+        column without any values in the first chunk has some in a later one.
+
+        Requires the optional *pyarrow* package.
+
+        If there is an error with the request, an exception will be raised from
+        the *requests* library.
+
+        :param str path: Path or file-like object to write to
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str fields: Fields to select in query (optional, default `'*'`)
+        :param str tags: Tags to restrict the select by (optional)
+        :param str where: Where clause to add (default `'time > now() - 15m'`)
+        :param int chunk_size: Number of rows per chunk and row group
+            (default `10000`)
+        :param str compression: Parquet compression codec (default
+            `'snappy'`)
+
+        """
+        pa = arrow.get_pyarrow()
+        pq = arrow.get_parquet()
+
+        rows = 0
+        writer = None
+        try:
+            for batch in self._select_batches(database, measurement, fields,
+                                              tags, where, chunk_size):
+                if writer is None:
+                    writer = pq.ParquetWriter(path, batch.schema,
+                                              compression=compression)
+                elif not batch.schema.equals(writer.schema):
+                    # Parquet files have one schema, fixed by the first chunk
+                    raise ValueError(
+                        "Columns {} had no values in the first chunk, so "
+                        "their type is unknown; select fewer columns or use "
+                        "a larger chunk_size".format(', '.join(
+                            name for name in batch.schema.names
+                            if not batch.schema.field(name).equals(
+                                writer.schema.field(name)))))
+                writer.write_table(pa.Table.from_batches([batch]))
+                rows += batch.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
 
     def select_into(self, *args, **kwargs):
         """
@@ -367,7 +998,7 @@ class InfluxDB:
                                   where=where, group_by=group_by)
 
         InfluxDB._check_and_raise(resp)
-        resp = resp.json()
+        resp = self._decode(resp)
         _, counts = self.unpack(resp)
         if counts:
             return counts[0][1]
@@ -378,38 +1009,216 @@ class InfluxDB:
         Return a list of tags from querying InfluxDB for tags names for a
         measurement.
 
+        If the schema cache is enabled, a cached result is returned without
+        querying InfluxDB.
+
         :param str database: Database name to query
         :param str measurement: Measurement name to query
 
         """
+        tags = self.schema.get_tags(database, measurement)
+        if tags is not None:
+            return list(tags)
+
         resp = self._make_request(IQL_SHOW_TAGS, database=database,
                                   measurement=measurement)
         InfluxDB._check_and_raise(resp)
 
-        tags = resp.json()
+        tags = self._decode(resp)
         _, tags = self.unpack(tags)
-        if tags:
-            return [t[0] for t in tags]
-        return []
+        tags = [t[0] for t in tags or []]
+        self.schema.set_tags(database, measurement, tags)
+        return tags
 
     def show_fields(self, database, measurement):
         """
         Return a list of fields from querying InfluxDB for fields names for a
         measurement.
 
+        If the schema cache is enabled, a cached result is returned without
+        querying InfluxDB.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+
+        """
+        fields, _ = self._show_fields(database, measurement)
+        return list(fields)
+
+    def show_field_types(self, database, measurement):
+        """
+        Return a dict of field names mapped to their InfluxDB types (`'float'`,
+        `'integer'`, `'string'` or `'boolean'`) for a measurement.
+
+        If the schema cache is enabled, a cached result is returned without
+        querying InfluxDB.
+
         :param str database: Database name to query
         :param str measurement: Measurement name to query
 
         """
+        _, types = self._show_fields(database, measurement)
+        return dict(types)
+
+    def warm_schema(self, database):
+        """
+        Populate the schema cache for every measurement in *database*.
+
+        This issues a single `SHOW TAG KEYS` and a single `SHOW FIELD KEYS`
+        query without a `FROM` clause, which InfluxDB answers with one series
+        per measurement. Subsequent calls to :meth:`show_tags`,
+        :meth:`show_fields` and :meth:`show_field_types` for measurements it
+        returned will not query InfluxDB until the cache expires.
+
+        This does nothing if the schema cache is disabled.
+
+        :param str database: Database name to query
+
+        """
+        if not self.schema:
+            return
+
+        resp = self._make_request(IQL_SHOW_ALL_TAGS, database=database)
+        InfluxDB._check_and_raise(resp)
+        tags = {}
+        for series in InfluxDB._unpack_series(self._decode(resp)):
+            tags[series['name']] = [t[0] for t in series.get('values', [])]
+
+        resp = self._make_request(IQL_SHOW_ALL_FIELDS, database=database)
+        InfluxDB._check_and_raise(resp)
+        fields = {}
+        for series in InfluxDB._unpack_series(self._decode(resp)):
+            fields[series['name']] = series.get('values', [])
+
+        self.schema.warm(database, tags, fields)
+
+    def _show_fields(self, database, measurement):
+        """
+        Return a 2-tuple of field names and a dict of field types, using the
+        schema cache if enabled.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+
+        """
+        cached = self.schema.get_fields(database, measurement)
+        if cached is not None:
+            return cached
+
         resp = self._make_request(IQL_SHOW_FIELDS, database=database,
                                   measurement=measurement)
         InfluxDB._check_and_raise(resp)
 
-        fields = resp.json()
-        _, fields = self.unpack(fields)
-        if fields:
-            return [f[0] for f in fields]
-        return []
+        _, fields = self.unpack(self._decode(resp))
+        fields = fields or []
+        self.schema.set_fields(database, measurement, fields)
+        return ([f[0] for f in fields],
+                dict((f[0], f[1] if len(f) > 1 else None) for f in fields))
+
+    def _select(self, database, measurement, fields, where, format=None,
+                output=None):
+        """
+        Return the decoded result of a SELECT query in *format*.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str fields: Fields to select
+        :param str where: Complete WHERE clause
+        :param str format: Response format (optional, default `'json'`)
+        :param output: File-like object to copy the raw response to
+            (optional)
+
+        """
+        # Fall back to JSON if we can't decode MessagePack
+        if format == 'msgpack' and formats.get_msgpack() is None:
+            format = None
+
+        if output is None and format in (None, 'json'):
+            resp = self._safe_request(IQL_SELECT, database=database,
+                                      measurement=measurement, fields=fields,
+                                      where=where)
+            InfluxDB._check_and_raise(resp)
+            return self._decode(resp)
+
+        format = format or 'json'
+        if format not in formats.CONTENT_TYPES:
+            raise ValueError("Unknown format {!r}".format(format))
+
+        resp = self._stream_request(IQL_SELECT, formats.CONTENT_TYPES[format],
+                                    database=database,
+                                    measurement=measurement, fields=fields,
+                                    where=where)
+        InfluxDB._check_and_raise(resp)
+
+        if output is not None:
+            return formats.copy_to(resp, output)
+        if format == 'csv':
+            return formats.read_csv(resp)
+        return self._decode(resp)
+
+    def _select_batches(self, database, measurement, fields, tags, where,
+                        chunk_size):
+        """
+        Return a generator of `pyarrow.RecordBatch` objects, one per chunk of
+        a chunked SELECT query.
+
+        The schema is made from the first chunk, using the measurement's field
+        types. Columns which had no values yet get their type from the first
+        later chunk which has some, so batches may differ only there.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str fields: Fields to select
+        :param dict tags: Tags to restrict the select by
+        :param str where: Where clause to add
+        :param int chunk_size: Number of rows per chunk
+
+        """
+        where = where or "time > now() - 15m"
+        if tags:
+            where += " AND {}".format(InfluxDB._format_tags(tags))
+
+        resp = self._stream_request(IQL_SELECT_CHUNKED, formats.JSON,
+                                    database=database,
+                                    measurement=measurement, fields=fields,
+                                    where=where, chunk_size=int(chunk_size))
+        InfluxDB._check_and_raise(resp)
+
+        schema = None
+        for result in formats.read_chunks(resp):
+            InfluxDB._raise_for_result(result, resp)
+            for _, _, columns, values in self.unpack_series(result):
+                if schema is None:
+                    schema = arrow.make_schema(
+                        columns, values,
+                        self.show_field_types(database, measurement),
+                        self.precision)
+                else:
+                    schema = arrow.update_schema(schema, values)
+                yield arrow.make_batch(values, schema)
+
+    def _select_series(self, database, measurement, where, chunk_size):
+        """
+        Return a generator of lists of `(tags, columns, values)` tuples, one
+        list per chunk of a chunked `SELECT * ... GROUP BY *` query, so tags
+        are kept apart from fields.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str where: Complete WHERE clause
+        :param int chunk_size: Number of rows per chunk
+
+        """
+        resp = self._stream_request(IQL_SELECT_SERIES_CHUNKED, formats.JSON,
+                                    database=database,
+                                    measurement=measurement, fields='*',
+                                    where=where, chunk_size=int(chunk_size))
+        InfluxDB._check_and_raise(resp)
+
+        for result in formats.read_chunks(resp):
+            InfluxDB._raise_for_result(result, resp)
+            yield [(tags, columns, values)
+                   for _, tags, columns, values in self.unpack_series(result)]
 
     def _safe_request(self, *args, **kwargs):
         """
@@ -438,7 +1247,7 @@ class InfluxDB:
             return resp
 
         # The response should contain JSON data
-        data = resp.json()
+        data = self._decode(resp)
 
         if 'error' in data:
             error = data['error']
@@ -461,7 +1270,7 @@ class InfluxDB:
         # Create the database
         try:
             db_resp = self.create_database(database)
-        except RequestException:
+        except requests.exceptions.RequestException:
             # XXX: We probably should include this exception to be raised or
             # report it
             return resp
@@ -479,37 +1288,240 @@ class InfluxDB:
         """
         Return a response object from making a request to the InfluxDB API.
 
+        The *influxql* tuple is compiled into a :class:`~influx.template.
+        Template` the first time it is used by this client, so subsequent
+        requests only format the per-call fields.
+
         :param tuple influxql: Tuple describing an InfluxQL API request
         :param dict **fields: Fields to include in the formatted and prepared
                               InfluxQL API request as keyword arguments
         :return requests.Response: A response object
 
         """
-        # Add the precision so we can use it in our query shenanigans
-        fields.update(precision=self.precision)
+        method, url, data = self._template(influxql).build(fields)
 
-        # Get the query template
-        method, path, params, data = influxql
+        debug(url)
 
-        # Format the path with any path fields
-        path = path.format(**fields)
+        return self._send(method, url, data, headers=self.headers)
 
-        # Format the params
-        params = InfluxDB._format_any(params, **fields)
+    def _stream_request(self, influxql, accept, **fields):
+        """
+        Return a streamed response object from making a request to the
+        InfluxDB API, asking for the response in the *accept* content type.
 
-        # Format the data body
-        data = InfluxDB._format_any(data, **fields)
+        The response body is not read, so the caller must consume or close
+        the response.
 
-        # Create the new URL
-        url = parse.urljoin(self.url, path)
+        :param tuple influxql: Tuple describing an InfluxQL API request
+        :param str accept: Accept header value
+        :param dict **fields: Fields to include in the formatted and prepared
+                              InfluxQL API request as keyword arguments
+        :return requests.Response: A response object
+
+        """
+        method, url, data = self._template(influxql).build(fields)
 
         debug(url)
-        debug(params)
+
+        return self._send(method, url, data, headers={'Accept': accept},
+                          stream=True)
+
+    def _template(self, influxql):
+        """
+        Return the compiled template for *influxql*, compiling it if needed.
+
+        Templates are cached by the identity of the *influxql* tuple, which is
+        normally one of the module level `IQL_*` constants.
+
+        :param tuple influxql: Tuple describing an InfluxQL API request
+        :return Template: Compiled template
+
+        """
+        entry = self.templates.get(id(influxql), None)
+        if entry is None or entry[0] is not influxql:
+            template = Template(influxql, self.base_url, self.precision)
+            entry = influxql, template
+            self.templates[id(influxql)] = entry
+        return entry[1]
+
+    def _send(self, method, url, data, headers=None, stream=False):
+        """
+        Return a response object from sending a request through the session.
+
+        This prepares the request directly rather than through
+        :meth:`requests.Session.request`, which would otherwise merge the
+        environment settings (proxies, netrc, CA bundles) on every call.
+        Those are resolved once per client instead.
+
+        :param str method: HTTP method
+        :param str url: Fully encoded URL including the query string
+        :param str data: Request body
+        :param dict headers: Headers to add to the session headers (optional)
+        :param bool stream: Set this to `True` to not read the response body
+        :return requests.Response: A response object
+
+        """
+        session = self.session
+        if self.environment is None:
+            self.environment = self._environment()
+        settings, auth = self.environment
+
+        # Encode the body once here, rather than having it measured and
+        # encoded separately further down the stack. Buffer views are sent as
+        # they are.
+        if data and not isinstance(data, (bytes, bytearray, memoryview)):
+            data = data.encode('utf-8')
+
+        request = requests.PreparedRequest()
+        request.prepare_method(method)
+        request.url = url
+        request.prepare_headers(session.headers)
+        if headers:
+            request.headers.update(headers)
+        request.prepare_cookies(session.cookies)
+        request.prepare_body(data or None, None)
+        request.prepare_auth(session.auth or auth, url)
+        request.prepare_hooks(session.hooks)
+
+        if stream:
+            settings = dict(settings, stream=True)
+
+        # Fail at once while the circuit breaker is open
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.check(self.url)
 
         # Make the request using the session socket pool
-        # XXX (Jake): May want to make the timeout here configurable...
-        return self.session.request(method, url, params=params, data=data,
-                                    timeout=self.timeout)
+        try:
+            if self.profiler is not None:
+                resp = self.profiler.call('send', session.send, request,
+                                          timeout=self.timeout, **settings)
+            else:
+                resp = session.send(request, timeout=self.timeout, **settings)
+        except Exception:
+            if breaker is not None:
+                breaker.failure()
+            raise
+
+        if breaker is not None:
+            if resp.status_code >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+        return resp
+
+    def _write_batches(self, database, points, schema=None):
+        """
+        Return the last response JSON from writing *points* in batches sized
+        by the client's :class:`~influx.batching.AdaptiveBatchSize`, which is
+        told how long each write took or why it failed.
+
+        A batch refused as too large (`413`) is split and retried while the
+        batch size can still shrink.
+
+        :param str database: Database name to write to
+        :param list points: List of :class:`~influx.line_protocol.Point`
+        :param schema: Field schema, or dict of them by measurement
+            (optional)
+
+        """
+        batching = self.batching
+        result = None
+        start = 0
+        while start < len(points):
+            batch = points[start:start + batching.size]
+            lines = self._serialize(self._make_payload, batch, schema)
+            began = time.time()
+            try:
+                resp = self._safe_request(IQL_WRITE, database=database,
+                                          lines=lines)
+                InfluxDB._check_and_raise(resp)
+            except Exception as err:
+                shrunk = batching.failure(err)
+                response = getattr(err, 'response', None)
+                if (shrunk and response is not None and
+                        response.status_code == 413):
+                    continue
+                raise
+            batching.success(len(batch), time.time() - began)
+            start += len(batch)
+            if resp.status_code != 204:
+                result = self._decode(resp)
+        return result
+
+    def _serialize(self, func, *args, **kwargs):
+        """ Return line protocol from calling *func*, profiled if sampled.
+        """
+        if self.profiler is None:
+            return func(*args, **kwargs)
+        return self.profiler.call('serialize', func, *args, **kwargs)
+
+    def _decode(self, resp):
+        """ Return the decoded body of *resp*, profiled if sampled. """
+        if self.profiler is None:
+            return formats.decode(resp)
+        return self.profiler.call('decode', formats.decode, resp)
+
+    def _make_coalesced_lines(self, measurement, fields, values, tags,
+                              time_field, schema):
+        """ Return line protocol for many points, with points sharing a
+        series and timestamp merged. """
+        points = InfluxDB._make_many_points(measurement, fields, values, tags,
+                                            time_field, schema)
+        points, merged = line_protocol.coalesce(points)
+        self._add_coalesced(merged)
+        return self._make_payload(points)
+
+    def _add_coalesced(self, merged):
+        """ Add *merged* to the coalesced counter, which writes from many
+        threads may update at once. """
+        with self.lock:
+            self.coalesced += merged
+
+    def _make_payload(self, points, schema=None):
+        """
+        Return line protocol for *points*, serialized into this thread's
+        reusable buffer as a `memoryview` if buffers are enabled, or as a
+        string otherwise.
+
+        :param list points: List of :class:`~influx.line_protocol.Point`
+        :param schema: Field schema, or dict of them by measurement
+            (optional)
+
+        """
+        buffer = self._line_buffer()
+        if buffer is None:
+            return line_protocol.make_lines(points, precision=self.precision,
+                                            schema=schema)
+        return line_protocol.make_lines_into(buffer, points, self.precision,
+                                             schema)
+
+    def _line_buffer(self):
+        """ Return this thread's cleared reusable
+        :class:`~influx.line_protocol.LineBuffer`, or `None` if buffers are
+        not enabled. """
+        buffers = self.buffers
+        if buffers is None:
+            return None
+        buffer = getattr(buffers, 'buffer', None)
+        if buffer is None:
+            buffer = buffers.buffer = line_protocol.LineBuffer()
+        buffer.clear()
+        return buffer
+
+    def _environment(self):
+        """
+        Return a 2-tuple of the session environment settings and netrc
+        authentication for this client's URL.
+
+        """
+        session = self.session
+        settings = session.merge_environment_settings(self.base_url, {},
+                                                      None, None, None)
+        auth = None
+        if session.trust_env:
+            auth = requests.utils.get_netrc_auth(self.base_url)
+        return settings, auth
 
     @staticmethod
     def _check_and_raise(response):
@@ -538,11 +1550,12 @@ class InfluxDB:
 
         # Try to decode the JSON body from Influx
         try:
-            msg = response.json()
+            msg = formats.decode(response)
             # Try to get the error from all possible places
             msg = msg.get('error', (msg.get('results', []) +
                                     [{}]).pop().get('error', None))
-        except simplejson.JSONDecodeError:
+        except ValueError:
+            # JSON and MessagePack decoding errors are both ValueErrors
             msg = None
 
         if msg:
@@ -552,10 +1565,31 @@ class InfluxDB:
         http_error_msg = "{} {} for {}".format(response.status_code, reason,
                                                response.url)
 
-        raise HTTPError(http_error_msg, response=response)
+        raise requests.exceptions.HTTPError(http_error_msg, response=response)
 
     @staticmethod
-    def _make_lines(measurement, fields, tags={}, time=None, precision=None):
+    def _raise_for_result(result, response):
+        """
+        Raises an exception if the decoded *result* contains an error, as
+        chunked responses report query errors in the body after a `200`.
+
+        :param dict result: Result dictionary as returned by API
+        :param request.Response response: The response it was read from
+
+        """
+        error = result.get('error', None)
+        for statement in result.get('results', None) or []:
+            error = error or statement.get('error', None)
+        if not error:
+            return
+
+        http_error_msg = "{} {} for {}".format(response.status_code, error,
+                                               response.url)
+        raise requests.exceptions.HTTPError(http_error_msg, response=response)
+
+    @staticmethod
+    def _make_lines(measurement, fields, tags={}, time=None, precision=None,
+                    schema=None):
         """
         Return InfluxDB line protocol lines as a string.
 
@@ -563,41 +1597,46 @@ class InfluxDB:
         :param dict fields: Fields dictionary
         :param dict tags: Tags to include (optional)
         :param datetime time: Time of the data points (optional, default now)
+        :param Schema schema: Field schema (optional)
+
+        """
+        point = InfluxDB._make_point(measurement, fields, tags, time,
+                                     precision=precision)
+        return line_protocol.make_lines([point], precision=precision,
+                                        schema=schema)
+
+    @staticmethod
+    def _make_point(measurement, fields, tags={}, time=None, precision=None):
+        """
+        Return a :class:`~influx.line_protocol.Point`, with any value tags
+        moved from the fields to the tags. The *fields* and *tags* given are
+        not changed.
+
+        :param str measurement: Measurement name
+        :param dict fields: Fields dictionary
+        :param dict tags: Tags to include (optional)
+        :param datetime time: Time of the data points (optional, default now)
+        :param str precision: Precision of the default time (optional)
 
         """
         if time is None:
-            time = pytool.time.utcnow()
+            time = line_protocol.now(precision)
 
         # Create list of value tags
-        value_tags = []
-        for tag, value in list(tags.items()):
-            if value == 'VALUE':
-                value_tags.append(tag)
-                del tags[tag]
+        value_tags = [tag for tag, value in tags.items() if value == 'VALUE']
 
-        # Create a point dict so value tags can be popped and replaced as tags
-        point = {
-                    'measurement': measurement,
-                    'fields': fields,
-                    'time': time,
-                }
-
-        # Create a dict of value tags for each point and add as tags
-        point_tags = {}
-        for tag_key in value_tags:
-            point_tags[tag_key] = fields.pop(tag_key)
-        point['tags'] = point_tags
-
-        lines = line_protocol.make_lines({
-                'tags': tags,
-                'points': [point]
-                },
-                precision=precision)
-        return lines
+        # Pop the value tags out of copies of the fields and tags
+        if value_tags:
+            tags = dict(tags)
+            fields = dict(fields)
+            for tag_key in value_tags:
+                tags[tag_key] = fields.pop(tag_key)
+
+        return line_protocol.Point(measurement, fields, tags, time)
 
     @staticmethod
     def _make_many_lines(measurement, fields, values, tags={},
-                         time_field=None, precision=None):
+                         time_field=None, precision=None, schema=None):
         """
         Return InfluxDB line protocol lines as a string.
 
@@ -607,6 +1646,26 @@ class InfluxDB:
         :param dict tags: Tags to include (optional)
         :param str time_field: Field to extract and use as the timestamp
             (optional)
+        :param Schema schema: Field schema (optional)
+
+        """
+        points = InfluxDB._make_many_points(measurement, fields, values, tags,
+                                            time_field, schema)
+        return line_protocol.make_lines(points, precision=precision)
+
+    @staticmethod
+    def _make_many_points(measurement, fields, values, tags={},
+                          time_field=None, schema=None):
+        """
+        Return a list of :class:`~influx.line_protocol.Point` in a series.
+
+        :param str measurement: Measurement name
+        :param list fields: Fields list
+        :param list values: List of values (list of lists)
+        :param dict tags: Tags to include (optional)
+        :param str time_field: Field to extract and use as the timestamp
+            (optional)
+        :param Schema schema: Field schema (optional)
 
         """
         # Create copies of our tags to prevent mutation
@@ -618,29 +1677,43 @@ class InfluxDB:
                 value_tags.append(tag)
                 del tags[tag]
 
+        # All points share the measurement and static tags
+        series = line_protocol.Series(measurement, tags, schema)
+
         points = []
         for line in values:
             line = dict(zip(fields, line))
-            point = {
-                    'measurement': measurement,
-                    'fields': line,
-                    }
 
-            # Create a dict of value tags for each point and add as tags
-            point_tags = {}
-            for tag_key in value_tags:
-                point_tags[tag_key] = line.pop(tag_key, None)
-            point['tags'] = point_tags
+            # Create a dict of value tags for each point
+            point_tags = None
+            if value_tags:
+                point_tags = {}
+                for tag_key in value_tags:
+                    point_tags[tag_key] = line.pop(tag_key, None)
 
+            time = None
             if time_field and line.get(time_field, None):
-                point['time'] = line.pop(time_field)
-            points.append(point)
+                time = line.pop(time_field)
+
+            points.append(series.point(line, time, point_tags))
+
+        return points
+
+    @staticmethod
+    def _unpack_series(result):
+        """
+        Return the list of series in the first statement of *result*.
+
+        :param dict result: Result dictionary as returned by API
+        :return list: List of series dicts
 
-        lines = line_protocol.make_lines({
-                'tags': tags,
-                'points': points,
-                }, precision=precision)
-        return lines
+        """
+        results = result.get('results', None) or [{}]
+        statement = results[0]
+        if not isinstance(statement, dict):
+            return []
+        return [s for s in statement.get('series', None) or []
+                if isinstance(s, dict)]
 
     @staticmethod
     def _format_any(obj, **fields):
@@ -669,6 +1742,54 @@ class InfluxDB:
         else:
             return obj.format(**fields)
 
+    def _time_literal(self, timestamp):
+        """
+        Return an InfluxQL absolute time literal for an integer *timestamp*
+        in this client's precision.
+
+        :param int timestamp: Epoch timestamp
+
+        """
+        suffix = self.precision or 'n'
+        return '{}{}'.format(int(timestamp), '' if suffix == 'n' else suffix)
+
+    @staticmethod
+    def _parse_duration(duration):
+        """
+        Return an InfluxQL duration string such as `'1h30m'` in seconds.
+
+        :param str duration: Duration literal
+
+        """
+        parts = re.findall(r'(\d+)(ns|ms|u|s|m|h|d|w)', duration)
+        if not parts or ''.join(n + u for n, u in parts) != duration:
+            raise ValueError("Invalid duration {!r}".format(duration))
+        return sum(int(n) * DURATION_UNITS[u] for n, u in parts)
+
+    @staticmethod
+    def _nice_interval(seconds):
+        """
+        Return the smallest whole interval of at least *seconds* as an
+        InfluxQL duration string.
+
+        :param float seconds: Minimum interval length in seconds
+
+        """
+        for nice in NICE_INTERVALS:
+            if nice >= seconds:
+                break
+        else:
+            # Whole weeks beyond the largest nice interval
+            weeks = -(-seconds // NICE_INTERVALS[-1])
+            return '{}w'.format(int(weeks))
+
+        if nice < 1:
+            return '{}ms'.format(int(round(nice * 1000)))
+        for unit in ('w', 'd', 'h', 'm'):
+            if nice % DURATION_UNITS[unit] == 0:
+                return '{}{}'.format(int(nice // DURATION_UNITS[unit]), unit)
+        return '{}s'.format(int(nice))
+
     @staticmethod
     def _format_tags(tags):
         """
@@ -693,7 +1814,73 @@ class InfluxDB:
         return where
 
 
-def client(url, timeout=60, precision='u'):
+class _Background(threading.Thread):
+    """
+    Runs a function in a daemon thread, holding its result or exception.
+
+    :param func: Callable to run
+    :param tuple args: Positional arguments for *func*
+
+    """
+    def __init__(self, func, *args):
+        super(_Background, self).__init__()
+        self.daemon = True
+        self.func = func
+        self.args = args
+        self.value = None
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.value = self.func(*self.args)
+        except Exception as err:
+            self.error = err
+
+    def result(self):
+        """ Return the result of the function, raising its exception. """
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class _KeepAlive(threading.Thread):
+    """
+    Pings a client's InfluxDB server in a daemon thread, until stopped or the
+    client is garbage collected.
+
+    :param InfluxDB client: Client to ping with
+    :param float interval: Seconds between pings
+    :param int connections: Number of connections to ping on
+
+    """
+    def __init__(self, client, interval, connections):
+        super(_KeepAlive, self).__init__()
+        self.daemon = True
+        self.client = weakref.ref(client)
+        self.interval = interval
+        self.connections = connections
+        self.stopped = threading.Event()
+        self.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            client = self.client()
+            if client is None:
+                return
+            try:
+                client.warm(self.connections)
+            except Exception:
+                log.debug("Keep alive ping failed", exc_info=True)
+            del client
+
+    def stop(self):
+        """ Stop pinging. """
+        self.stopped.set()
+
+
+def client(url, timeout=60, precision='u', **kwargs):
     """
     Return an InfluxDB client.
 
@@ -701,4 +1888,4 @@ def client(url, timeout=60, precision='u'):
     :param \*\*kwargs: Optional arguments to pass to client constructor
 
     """
-    return InfluxDB(url, timeout, precision)
+    return InfluxDB(url, timeout, precision, **kwargs)
@@ -0,0 +1,153 @@
+"""
+# Apache Arrow conversion
+
+This module builds *pyarrow* record batches from query results, column by
+column. *pyarrow* is an optional dependency, which is only imported when these
+helpers are first used.
+
+"""
+# System imports
+import importlib
+import numbers
+
+
+# Arrow timestamp units for each client precision which has one
+TIME_UNITS = {
+        'n': 'ns',
+        'u': 'us',
+        'ms': 'ms',
+        's': 's',
+        }
+
+# Names of the pyarrow type factories for each InfluxDB field type
+FIELD_TYPES = {
+        'float': 'float64',
+        'integer': 'int64',
+        'string': 'string',
+        'boolean': 'bool_',
+        }
+
+
+def get_pyarrow():
+    """ Return the *pyarrow* module, raising `ImportError` if missing. """
+    try:
+        return importlib.import_module('pyarrow')
+    except ImportError:
+        raise ImportError("pyarrow is required for Arrow and Parquet export, "
+                          "install it with 'pip install pyarrow'")
+
+
+def get_parquet():
+    """ Return the *pyarrow.parquet* module. """
+    get_pyarrow()
+    return importlib.import_module('pyarrow.parquet')
+
+
+def make_schema(columns, values, field_types, precision):
+    """
+    Return a `pyarrow.Schema` for a query result.
+
+    The `time` column becomes a UTC timestamp in the client *precision* (or an
+    integer for precisions Arrow does not have), and columns which are known
+    fields get their declared type. Other columns, such as tags and computed
+    values, have their type inferred from *values*: numbers are always
+    `float64`, since InfluxDB returns whole floats as integers, and columns
+    without any values are `null` until :func:`update_schema` sees some.
+
+    :param list columns: Result column names
+    :param list values: Rows of the first chunk of the result
+    :param dict field_types: Field names mapped to InfluxDB types
+    :param str precision: Client precision
+
+    """
+    pa = get_pyarrow()
+
+    fields = []
+    for index, name in enumerate(columns):
+        if name == 'time':
+            unit = TIME_UNITS.get(precision or 'n', None)
+            if unit:
+                kind = pa.timestamp(unit, tz='UTC')
+            else:
+                kind = pa.int64()
+        elif field_types.get(name, None) in FIELD_TYPES:
+            kind = getattr(pa, FIELD_TYPES[field_types[name]])()
+        else:
+            kind = _infer_type(pa, [row[index] for row in values])
+        fields.append(pa.field(name, kind))
+
+    return pa.schema(fields)
+
+
+def update_schema(schema, values):
+    """
+    Return *schema* with the type of each `null` column inferred from the
+    rows *values* of a later chunk, or *schema* itself if nothing changed.
+
+    :param pyarrow.Schema schema: Schema of the previous chunks
+    :param list values: Rows of the next chunk
+
+    """
+    pa = get_pyarrow()
+
+    for index, field in enumerate(schema):
+        if not pa.types.is_null(field.type):
+            continue
+        kind = _infer_type(pa, [row[index] for row in values])
+        if not pa.types.is_null(kind):
+            schema = schema.set(index, pa.field(field.name, kind))
+    return schema
+
+
+def make_table(batches):
+    """
+    Return a `pyarrow.Table` of *batches*, promoting `null` columns of the
+    earlier batches to the type found in later ones.
+
+    :param list batches: Record batches, in order
+
+    """
+    pa = get_pyarrow()
+
+    if not batches:
+        return pa.Table.from_batches([], schema=pa.schema([]))
+
+    tables = [pa.Table.from_batches([batch]) for batch in batches]
+    try:
+        return pa.concat_tables(tables, promote_options='default')
+    except TypeError:
+        # Older pyarrow, before promote_options replaced promote
+        return pa.concat_tables(tables, promote=True)
+
+
+def make_batch(values, schema):
+    """
+    Return a `pyarrow.RecordBatch` of the result rows *values*, transposed
+    and converted one column at a time.
+
+    :param list values: Result rows
+    :param pyarrow.Schema schema: Schema for the batch
+
+    """
+    pa = get_pyarrow()
+
+    if values:
+        columns = zip(*values)
+    else:
+        columns = [[] for _ in schema]
+
+    arrays = [pa.array(column, type=field.type)
+              for column, field in zip(columns, schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _infer_type(pa, column):
+    """ Return the Arrow type of the values in *column*, with numbers
+    always `float64`. """
+    present = [value for value in column if value is not None]
+    if not present:
+        return pa.null()
+    if all(isinstance(value, numbers.Real) and not isinstance(value, bool)
+           for value in present):
+        return pa.float64()
+    return pa.array(present).type
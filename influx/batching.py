@@ -0,0 +1,153 @@
+"""
+# Adaptive batch sizing
+
+This module contains a controller which sizes write batches from how long
+InfluxDB takes to answer them, growing the batch size additively while writes
+are fast and halving it when a write is slow or the server shows it is
+overloaded, as TCP does with its congestion window.
+
+"""
+# System imports
+import threading
+
+# Project imports
+from .lazy import LazyModule
+
+
+# Deferred import of requests, for the error types
+requests = LazyModule('requests')
+
+# Statuses which mean a batch was too large or the server overloaded
+OVERLOADED = frozenset((408, 413, 429, 500, 502, 503, 504))
+
+# Weight of the newest write in the moving averages
+ALPHA = 0.2
+
+
+class AdaptiveBatchSize(object):
+    """
+    Batch size controller, adjusted after each write with additive increase
+    and multiplicative decrease (AIMD).
+
+    A full batch written within *target* seconds grows the size by *step*
+    points. A write which took longer than *target*, timed out, or was
+    answered with a `413` (too large), `429` or `5xx` status multiplies the
+    size by *decrease*. Other errors, such as a `400` for a bad point, don't
+    say anything about the size and leave it as it is.
+
+    One controller may be shared by several writers to the same InfluxDB.
+
+    :param int size: Initial batch size in points (default `5000`)
+    :param int minimum: Smallest batch size (default `100`)
+    :param int maximum: Largest batch size (default `100000`)
+    :param float target: Seconds a write should take (default `1.0`)
+    :param int step: Points added after a fast full batch (default `500`)
+    :param float decrease: Factor applied after a slow or failed write
+        (default `0.5`)
+
+    """
+    __slots__ = [
+            'counts',
+            'decrease',
+            'latency',
+            'lock',
+            'maximum',
+            'minimum',
+            'size',
+            'step',
+            'target',
+            'throughput',
+            ]
+
+    def __init__(self, size=5000, minimum=100, maximum=100000, target=1.0,
+                 step=500, decrease=0.5):
+        if not 0 < minimum <= size <= maximum:
+            raise ValueError("Batch sizes must be 0 < minimum <= size <= "
+                             "maximum")
+        self.size = size
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.step = step
+        self.decrease = decrease
+        self.lock = threading.Lock()
+        self.latency = None
+        self.throughput = None
+        self.counts = dict.fromkeys(('writes', 'points', 'errors',
+                                     'increases', 'decreases'), 0)
+
+    def success(self, count, seconds):
+        """
+        Record a write of *count* points which took *seconds*.
+
+        :param int count: Number of points written
+        :param float seconds: Seconds the write took
+
+        """
+        with self.lock:
+            self.counts['writes'] += 1
+            self.counts['points'] += count
+            self.latency = _average(self.latency, seconds)
+            if seconds > 0:
+                self.throughput = _average(self.throughput, count / seconds)
+
+            if seconds > self.target:
+                self._decrease()
+            elif count >= self.size and self.size < self.maximum:
+                # Only full batches show that a larger one would be as fast
+                self.size = min(self.maximum, self.size + self.step)
+                self.counts['increases'] += 1
+
+    def failure(self, error):
+        """
+        Record a write which raised *error*, returning `True` if the batch
+        size was decreased because of it.
+
+        :param Exception error: Exception raised by the write
+
+        """
+        with self.lock:
+            self.counts['errors'] += 1
+            if not _overloaded(error):
+                return False
+            return self._decrease()
+
+    def stats(self):
+        """
+        Return a dict of the current batch `size`, the moving averages of
+        write `latency` in seconds and `throughput` in points per second of
+        write time, and counters of `writes`, `points`, `errors`, and size
+        `increases` and `decreases`.
+
+        """
+        with self.lock:
+            stats = dict(self.counts)
+            stats['size'] = self.size
+            stats['latency'] = self.latency
+            stats['throughput'] = self.throughput
+        return stats
+
+    def _decrease(self):
+        """ Shrink the batch size, returning `False` if it was already the
+        minimum, expecting the lock held. """
+        if self.size <= self.minimum:
+            return False
+        self.size = max(self.minimum, int(self.size * self.decrease))
+        self.counts['decreases'] += 1
+        return True
+
+
+def _overloaded(error):
+    """ Return `True` if *error* means the batch was too large or the server
+    is overloaded. """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return response.status_code in OVERLOADED
+    return isinstance(error, requests.exceptions.Timeout)
+
+
+def _average(average, value):
+    """ Return the exponential moving *average* updated with *value*. """
+    if average is None:
+        return value
+    return average + ALPHA * (value - average)
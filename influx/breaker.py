@@ -0,0 +1,169 @@
+"""
+# Circuit breaker
+
+This module contains a circuit breaker, which a client uses to stop sending
+requests to an InfluxDB that keeps failing, so callers fail at once instead of
+each waiting out the request timeout.
+
+"""
+# System imports
+import collections
+import threading
+import time
+
+# 3rd party imports
+import requests
+
+
+# Breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Monotonic clock, falling back to the wall clock before Python 3.3
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """ Raised instead of sending a request while a circuit is open. """
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker for the requests of an :class:`~influx.InfluxDB` client.
+
+    Connection errors, timeouts and 5xx responses are failures. The circuit
+    opens after *failures* failures in a row, or when at least *rate* of the
+    last *window* requests failed. While it is open, requests are rejected
+    with :class:`CircuitOpenError` without being sent. After *reset* seconds
+    it is half open, and a single request is let through as a probe: if it
+    succeeds the circuit closes, and if it fails it opens again. Requests
+    which were already in flight when it opened don't change its state.
+
+    :param int failures: Failures in a row which open the circuit
+        (default `5`)
+    :param float rate: Failure rate over the last *window* requests which
+        opens the circuit, between `0` and `1` (optional)
+    :param int window: Number of recent requests to compute the failure rate
+        over (default `20`)
+    :param float reset: Seconds to stay open before probing (default `30`)
+
+    """
+    __slots__ = [
+            'consecutive',
+            'changed',
+            'failures',
+            'lock',
+            'outcomes',
+            'probing',
+            'rate',
+            'rejected',
+            'reset',
+            'state',
+            'trips',
+            ]
+
+    def __init__(self, failures=5, rate=None, window=20, reset=30.0):
+        self.failures = failures
+        self.rate = rate
+        self.reset = reset
+        self.lock = threading.Lock()
+        self.outcomes = collections.deque(maxlen=window)
+        self.state = CLOSED
+        self.changed = _clock()
+        self.consecutive = 0
+        self.probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self):
+        """
+        Return `True` if a request may be sent now. A `True` result must be
+        followed by a call to :meth:`success` or :meth:`failure`.
+
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and _clock() - self.changed >= self.reset:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self, url):
+        """
+        Raise :class:`CircuitOpenError` if a request to *url* may not be sent
+        now, see :meth:`allow`.
+
+        :param str url: URL for the error message
+
+        """
+        if not self.allow():
+            raise CircuitOpenError("Circuit breaker for {} is open".format(
+                url))
+
+    def success(self):
+        """ Record a successful request. """
+        with self.lock:
+            self.consecutive = 0
+            self.outcomes.append(True)
+            if self.state == HALF_OPEN:
+                self.probing = False
+                self.outcomes.clear()
+                self._set_state(CLOSED)
+
+    def failure(self):
+        """ Record a failed request. """
+        with self.lock:
+            self.consecutive += 1
+            self.outcomes.append(False)
+            if self.state == HALF_OPEN:
+                self.probing = False
+                self._set_state(OPEN)
+            elif self.state == CLOSED and self._tripped():
+                self.trips += 1
+                self._set_state(OPEN)
+
+    def stats(self):
+        """
+        Return a dict of the `state` (`'closed'`, `'open'` or
+        `'half_open'`), the `seconds` spent in it, the `consecutive` failures,
+        the `failure_rate` over the recent requests, and counters of requests
+        `rejected` and times the circuit has `tripped` open.
+
+        """
+        with self.lock:
+            state = self.state
+            if state == OPEN and _clock() - self.changed >= self.reset:
+                state = HALF_OPEN
+            return {
+                    'state': state,
+                    'seconds': _clock() - self.changed,
+                    'consecutive': self.consecutive,
+                    'failure_rate': self._failure_rate(),
+                    'rejected': self.rejected,
+                    'tripped': self.trips,
+                    }
+
+    def _tripped(self):
+        """ Return `True` if the circuit should open, expecting the lock
+        held. """
+        if self.failures and self.consecutive >= self.failures:
+            return True
+        return (self.rate is not None and
+                len(self.outcomes) == self.outcomes.maxlen and
+                self._failure_rate() >= self.rate)
+
+    def _failure_rate(self):
+        """ Return the failure rate of the recent requests. """
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / float(len(self.outcomes))
+
+    def _set_state(self, state):
+        """ Change to *state*, expecting the lock held. """
+        self.state = state
+        self.changed = _clock()
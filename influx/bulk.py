@@ -0,0 +1,494 @@
+"""
+# Bulk importer
+
+This module streams line protocol files (and CSV files) into InfluxDB. Line
+protocol files are read in large binary blocks which are cut at the last line
+ending, so they are posted exactly as they are in the file, without parsing
+any values. CSV files are cut between the rows the CSV parser reads. Batches
+are posted by several threads sharing the client's pooled session.
+
+Progress is recorded as a byte offset in a checkpoint file, so an import
+which fails part way can be resumed from the last batch before which every
+batch was written.
+
+Usage:
+
+    python -m influx.bulk [options] url database file [file ...]
+
+"""
+# System imports
+import collections
+import csv
+import io
+import math
+import os
+import re
+import sys
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Project imports
+from . import line_protocol
+
+
+# Default bytes per posted batch, around 10000 typical lines
+BATCH_BYTES = 1024 * 1024
+
+# Default number of batches posted concurrently
+WORKERS = 4
+
+# CSV values written as integers and floats, where Python's own parsing would
+# also take `nan`, `inf` and digits with underscores
+INTEGER = re.compile(r'[-+]?[0-9]+\Z')
+FLOAT = re.compile(r'[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\Z')
+
+
+def read_batches(path, batch_bytes=BATCH_BYTES, offset=0):
+    """
+    Return a generator of `(end, payload)` tuples, where *payload* is a block
+    of whole lines of about *batch_bytes* read from *path*, and *end* is the
+    file offset after it.
+
+    A line longer than *batch_bytes* is carried into the next block, and a
+    last line without a line ending is still returned.
+
+    :param str path: File to read
+    :param int batch_bytes: Bytes to read per batch
+    :param int offset: File offset to start reading from (default `0`)
+
+    """
+    with io.open(path, 'rb') as source:
+        source.seek(offset)
+        pending = b''
+        while True:
+            block = source.read(batch_bytes)
+            if not block:
+                break
+            if pending:
+                block = pending + block
+            cut = block.rfind(b'\n') + 1
+            if not cut:
+                pending = block
+                continue
+            offset += cut
+            pending = block[cut:]
+            yield offset, block[:cut]
+
+        if pending.strip():
+            yield offset + len(pending), pending
+
+
+def read_csv_batches(path, measurement, tags=(), time_field=None,
+                     batch_bytes=BATCH_BYTES, offset=0, precision=None):
+    """
+    Return a generator of `(end, payload)` tuples, as :func:`read_batches`,
+    with the rows of the CSV file *path* converted to line protocol.
+
+    The first row of the file names the columns. Columns named in *tags*
+    become tags, the *time_field* column is used as the timestamp, and the
+    other columns become fields, written as numbers or booleans where the
+    value looks like one, and as strings otherwise. Empty values are left
+    out.
+
+    Batches are cut between the rows the CSV parser reads, so quoted values
+    may contain line endings.
+
+    :param str path: CSV file to read
+    :param str measurement: Measurement name to write to
+    :param list tags: Names of the columns holding tags
+    :param str time_field: Name of the column holding integer timestamps
+        in *precision* (optional)
+    :param int batch_bytes: Bytes to read per batch
+    :param int offset: File offset to start reading from (default `0`)
+    :param str precision: Precision of the timestamps (optional)
+
+    """
+    with io.open(path, 'rb') as source:
+        # Bytes consumed by the parser, which reads no further than the end
+        # of the row it returns
+        position = [0]
+
+        def lines():
+            for line in source:
+                position[0] += len(line)
+                yield line.decode('utf-8')
+
+        reader = csv.reader(lines())
+        columns = next(reader, None)
+        if columns is None:
+            return
+        if offset > position[0]:
+            source.seek(offset)
+            position[0] = offset
+
+        tags = frozenset(tags)
+        kinds = [_text if column in tags else
+                 _timestamp if column == time_field else _convert
+                 for column in columns]
+        series = line_protocol.Series(measurement)
+
+        def batch(rows):
+            if not rows:
+                return b''
+            points = []
+            for row in rows:
+                fields = dict(zip(columns, row))
+                stamp = fields.pop(time_field, None) if time_field else None
+                # Empty tag values are left out of the series key
+                point_tags = dict((tag, fields.pop(tag, None))
+                                  for tag in tags)
+                points.append(series.point(fields, stamp, point_tags))
+            return line_protocol.make_lines(points, precision).encode('utf-8')
+
+        start = position[0]
+        rows = []
+        for row in reader:
+            if row:
+                rows.append([kind(value) for kind, value in zip(kinds, row)])
+            if position[0] - start >= batch_bytes:
+                yield position[0], batch(rows)
+                start = position[0]
+                rows = []
+        if position[0] > start:
+            yield position[0], batch(rows)
+
+
+def import_batches(client, database, batches, workers=WORKERS,
+                   checkpoint=None, progress=None):
+    """
+    Return a dictionary of totals from posting *batches* to *database* from
+    *workers* threads.
+
+    After each batch is written, the end offset of the last batch before
+    which every batch has been written is saved to the *checkpoint* file.
+    Empty batches are not posted, but still move the checkpoint on. If a
+    batch fails, no more batches are posted, the batches already being
+    posted are finished, and the exception is raised.
+
+    :param client: :class:`~influx.InfluxDB` client to post with
+    :param str database: Database name to write to
+    :param batches: Iterable of `(end, payload)` tuples, such as
+        :func:`read_batches` returns
+    :param int workers: Number of batches to post concurrently
+    :param str checkpoint: Path of the checkpoint file (optional)
+    :param progress: Callable called with the totals after each batch
+        (optional)
+    :return dict: Totals of `'batches'`, `'lines'`, `'bytes'` and `'seconds'`,
+        and the `'offset'` reached
+
+    """
+    tracker = _Tracker(checkpoint, progress)
+    work = queue.Queue(workers * 2)
+    threads = []
+    for _ in range(workers):
+        thread = threading.Thread(target=_post,
+                                  args=(client, database, work, tracker))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    try:
+        for end, payload in batches:
+            if tracker.error is not None:
+                break
+            work.put((tracker.submit(end), payload))
+    finally:
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+
+    if tracker.error is not None:
+        raise tracker.error
+    return tracker.totals()
+
+
+def import_file(client, database, path, batch_bytes=BATCH_BYTES,
+                workers=WORKERS, checkpoint=None, progress=None,
+                csv_options=None):
+    """
+    Return a dictionary of totals from importing the line protocol file
+    *path* into *database*, see :func:`import_batches`.
+
+    When the *checkpoint* file exists, the import resumes from the offset it
+    holds. It is removed once the whole file is written.
+
+    :param client: :class:`~influx.InfluxDB` client to post with
+    :param str database: Database name to write to
+    :param str path: Line protocol file to import
+    :param int batch_bytes: Bytes per batch (default 1 MiB)
+    :param int workers: Number of batches to post concurrently (default `4`)
+    :param str checkpoint: Path of the checkpoint file (optional)
+    :param progress: Callable called with the totals after each batch
+        (optional)
+    :param dict csv_options: Arguments for :func:`read_csv_batches` to
+        import *path* as CSV instead (optional)
+
+    """
+    offset = load_checkpoint(checkpoint)
+    if csv_options is not None:
+        batches = read_csv_batches(path, batch_bytes=batch_bytes,
+                                   offset=offset, precision=client.precision,
+                                   **csv_options)
+    else:
+        batches = read_batches(path, batch_bytes, offset)
+
+    totals = import_batches(client, database, batches, workers, checkpoint,
+                            progress)
+    if checkpoint:
+        remove_checkpoint(checkpoint)
+    return totals
+
+
+def load_checkpoint(path):
+    """
+    Return the offset saved in the checkpoint file *path*, or `0` if there is
+    none.
+
+    :param str path: Path of the checkpoint file
+
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, 'r') as source:
+        return int(source.read().strip() or 0)
+
+
+def save_checkpoint(path, offset):
+    """
+    Save *offset* to the checkpoint file *path*, replacing it atomically.
+
+    :param str path: Path of the checkpoint file
+    :param int offset: File offset
+
+    """
+    temp = path + '.tmp'
+    with open(temp, 'w') as target:
+        target.write(str(offset))
+    os.rename(temp, path)
+
+
+def remove_checkpoint(path):
+    """
+    Remove the checkpoint file *path*, if it exists.
+
+    :param str path: Path of the checkpoint file
+
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def main(argv=None):
+    """ Command line entry point. """
+    # Only the command line needs argparse, so it is imported here
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='influx-bulk',
+        description="Import line protocol or CSV files into InfluxDB.")
+    parser.add_argument('url', help="InfluxDB API url")
+    parser.add_argument('database', help="Database name to write to")
+    parser.add_argument('files', nargs='+', help="Files to import")
+    parser.add_argument('--precision', default='n',
+                        help="Timestamp precision of the files (default n)")
+    parser.add_argument('--batch-bytes', type=int, default=BATCH_BYTES,
+                        help="Bytes per batch (default %(default)s)")
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help="Concurrent batches (default %(default)s)")
+    parser.add_argument('--timeout', type=int, default=60,
+                        help="Request timeout in seconds (default 60)")
+    parser.add_argument('--checkpoint',
+                        help="Checkpoint file, when importing a single file "
+                        "(default FILE.checkpoint)")
+    parser.add_argument('--csv', metavar='MEASUREMENT',
+                        help="Import CSV files into MEASUREMENT")
+    parser.add_argument('--tags', default='',
+                        help="Comma separated CSV columns holding tags")
+    parser.add_argument('--time',
+                        help="CSV column holding integer timestamps")
+    parser.add_argument('--quiet', action='store_true',
+                        help="Do not show progress")
+    args = parser.parse_args(argv)
+
+    if args.checkpoint and len(args.files) > 1:
+        parser.error("--checkpoint can only be used with a single file")
+
+    csv_args = None
+    if args.csv:
+        csv_args = {
+                'measurement': args.csv,
+                'tags': [tag for tag in args.tags.split(',') if tag],
+                'time_field': args.time,
+                }
+
+    # The package imports this module, so the client is imported late
+    from . import InfluxDB
+    client = InfluxDB(args.url, args.timeout, args.precision)
+
+    progress = None if args.quiet else _show_progress
+    for path in args.files:
+        checkpoint = args.checkpoint or path + '.checkpoint'
+        try:
+            totals = import_file(client, args.database, path,
+                                 args.batch_bytes, args.workers, checkpoint,
+                                 progress, csv_args)
+        except Exception as err:
+            sys.stderr.write("\n{}: failed, resume from offset {}: {}\n"
+                             .format(path, load_checkpoint(checkpoint), err))
+            return 1
+        if progress:
+            sys.stderr.write("\n")
+        sys.stderr.write("{}: {lines} lines in {seconds:.1f}s\n"
+                         .format(path, **totals))
+    return 0
+
+
+class _Tracker(object):
+    """
+    Shared state of an import, which advances the checkpoint past batches in
+    the order they were read, whatever order they are written in.
+
+    """
+    __slots__ = [
+            'batches',
+            'bytes',
+            'checkpoint',
+            'done',
+            'error',
+            'lines',
+            'lock',
+            'offset',
+            'order',
+            'progress',
+            'sequence',
+            'start',
+            ]
+
+    def __init__(self, checkpoint, progress):
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.lock = threading.Lock()
+        # Sequence numbers and end offsets of the batches being posted
+        self.order = collections.deque()
+        self.done = set()
+        self.sequence = 0
+        self.error = None
+        self.offset = None
+        self.batches = 0
+        self.lines = 0
+        self.bytes = 0
+        self.start = time.time()
+
+    def submit(self, end):
+        """ Return the sequence number of the batch ending at *end*, which
+        is being posted. """
+        with self.lock:
+            self.sequence += 1
+            self.order.append((self.sequence, end))
+            return self.sequence
+
+    def finish(self, sequence, payload):
+        """ Record that the batch numbered *sequence* was written. """
+        with self.lock:
+            if payload:
+                self.batches += 1
+                self.lines += (payload.count(b'\n') +
+                               (not payload.endswith(b'\n')))
+                self.bytes += len(payload)
+            self.done.add(sequence)
+
+            advanced = False
+            while self.order and self.order[0][0] in self.done:
+                sequence, self.offset = self.order.popleft()
+                self.done.remove(sequence)
+                advanced = True
+
+            if advanced and self.checkpoint:
+                save_checkpoint(self.checkpoint, self.offset)
+            if self.progress:
+                self.progress(self.totals())
+
+    def fail(self, err):
+        """ Record the first error. """
+        with self.lock:
+            if self.error is None:
+                self.error = err
+
+    def totals(self):
+        """ Return a dictionary of totals. """
+        return {
+                'batches': self.batches,
+                'lines': self.lines,
+                'bytes': self.bytes,
+                'seconds': time.time() - self.start,
+                'offset': self.offset,
+                }
+
+
+def _post(client, database, work, tracker):
+    """ Post batches from the *work* queue until given `None`. """
+    while True:
+        item = work.get()
+        if item is None:
+            return
+        if tracker.error is not None:
+            continue
+        sequence, payload = item
+        try:
+            # Empty batches only move the checkpoint on
+            if payload:
+                client.write_lines(database, payload)
+            # Saving the checkpoint or reporting progress may fail too, and
+            # the thread must keep taking work so the reader isn't blocked
+            tracker.finish(sequence, payload)
+        except Exception as err:
+            tracker.fail(err)
+
+
+def _convert(value):
+    """ Return a CSV *value* as a number or boolean where it looks like one.
+    """
+    if value == '':
+        return None
+    if INTEGER.match(value):
+        return int(value)
+    if FLOAT.match(value):
+        number = float(value)
+        # Overflowing values such as 1e999 are kept as they are
+        if not math.isinf(number):
+            return number
+        return value
+    lower = value.lower()
+    if lower in ('true', 'false'):
+        return lower == 'true'
+    return value
+
+
+def _text(value):
+    """ Return a CSV *value* as it is. """
+    return value
+
+
+def _timestamp(value):
+    """ Return a CSV *value* as an integer timestamp. """
+    return int(value) if value else None
+
+
+def _show_progress(totals):
+    """ Write the throughput so far to stderr. """
+    seconds = max(totals['seconds'], 1e-6)
+    sys.stderr.write(
+        "\r{lines} lines, {mb:.1f} MB, {rate:.0f} lines/s, {mbs:.1f} MB/s "
+        .format(lines=totals['lines'], mb=totals['bytes'] / 1e6,
+                rate=totals['lines'] / seconds,
+                mbs=totals['bytes'] / 1e6 / seconds))
+    sys.stderr.flush()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
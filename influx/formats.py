@@ -0,0 +1,174 @@
+"""
+# Query response formats
+
+This module contains decoders for the response formats InfluxDB can return
+query results in, other than the default JSON.
+
+"""
+# System imports
+import csv
+import json
+import struct
+from datetime import datetime, timedelta
+
+
+# Accept header values for each supported response format
+JSON = 'application/json'
+CSV = 'application/csv'
+MSGPACK = 'application/x-msgpack'
+
+CONTENT_TYPES = {
+        'json': JSON,
+        'csv': CSV,
+        'msgpack': MSGPACK,
+        }
+
+# MessagePack extension type InfluxDB uses for time values
+MSGPACK_TIME_EXT = 5
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Holds the msgpack module (or None if it's not installed) once looked up
+_msgpack = []
+
+# Bytes read from the response stream at a time
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_text_lines(response, chunk_size=CHUNK_SIZE):
+    """
+    Return a generator of decoded lines from a streamed *response*, keeping
+    line endings so quoted values spanning lines survive.
+
+    :param requests.Response response: Streamed response object
+    :param int chunk_size: Bytes to read at a time
+
+    """
+    if response.encoding is None:
+        response.encoding = 'utf-8'
+
+    pending = ''
+    for chunk in response.iter_content(chunk_size, decode_unicode=True):
+        lines = (pending + chunk).split('\n')
+        # The last line may be incomplete, so keep it for the next chunk
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+def read_csv(response, chunk_size=CHUNK_SIZE):
+    """
+    Return a generator of rows (lists of strings) parsed incrementally from
+    a streamed CSV *response*.
+
+    InfluxDB writes a header row of `name`, `tags` and the result columns
+    before the first series, and again whenever the columns change. Header
+    rows are yielded like any other row. Values are not converted from
+    strings.
+
+    :param requests.Response response: Streamed response object
+    :param int chunk_size: Bytes to read at a time
+
+    """
+    try:
+        for row in csv.reader(iter_text_lines(response, chunk_size)):
+            if row:
+                yield row
+    finally:
+        response.close()
+
+
+def copy_to(response, output, chunk_size=CHUNK_SIZE):
+    """
+    Return the number of bytes copied from a streamed *response* body into
+    the file-like *output*, without decoding it.
+
+    :param requests.Response response: Streamed response object
+    :param output: File-like object opened for writing bytes
+    :param int chunk_size: Bytes to read at a time
+
+    """
+    size = 0
+    try:
+        for chunk in response.iter_content(chunk_size):
+            output.write(chunk)
+            size += len(chunk)
+    finally:
+        response.close()
+    return size
+
+
+def read_chunks(response, chunk_size=CHUNK_SIZE):
+    """
+    Return a generator of decoded JSON results from a streamed *response* to
+    a chunked query, where InfluxDB writes one result per line.
+
+    :param requests.Response response: Streamed response object
+    :param int chunk_size: Bytes to read at a time
+
+    """
+    try:
+        for line in iter_text_lines(response, chunk_size):
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    finally:
+        response.close()
+
+
+def get_msgpack():
+    """ Return the *msgpack* module, or `None` if it is not installed. """
+    if not _msgpack:
+        try:
+            import msgpack
+        except ImportError:
+            msgpack = None
+        _msgpack.append(msgpack)
+    return _msgpack[0]
+
+
+def decode(response):
+    """
+    Return the decoded body of *response*, using its content type to choose
+    between MessagePack and JSON.
+
+    :param requests.Response response: Response object
+
+    """
+    content_type = response.headers.get('Content-Type', None)
+    if isinstance(content_type, str) and content_type.startswith(MSGPACK):
+        return read_msgpack(response.content)
+    return response.json()
+
+
+def read_msgpack(data):
+    """
+    Return a MessagePack encoded query result decoded into the same structure
+    InfluxDB returns as JSON.
+
+    :param bytes data: MessagePack encoded result
+
+    """
+    result = get_msgpack().unpackb(data, raw=False, ext_hook=_ext_hook)
+
+    # JSON results leave out the series key for statements without any
+    for statement in result.get('results', None) or []:
+        if 'series' in statement and not statement['series']:
+            del statement['series']
+
+    return result
+
+
+def _ext_hook(code, data):
+    """ Decode InfluxDB time values to RFC3339 strings, as in JSON. """
+    if code != MSGPACK_TIME_EXT or len(data) != 12:
+        return get_msgpack().ExtType(code, data)
+
+    seconds, nanoseconds = struct.unpack('>qi', data)
+    stamp = _EPOCH + timedelta(seconds=seconds)
+    stamp = stamp.strftime('%Y-%m-%dT%H:%M:%S')
+    if nanoseconds:
+        stamp += '.' + '{:09d}'.format(nanoseconds).rstrip('0')
+    return stamp + 'Z'
@@ -0,0 +1,222 @@
+"""
+# Hedged reads
+
+This module contains a client for several InfluxDB instances holding the same
+data, such as replicas, which sends each read to one of them and, if it hasn't
+answered after a short delay, a duplicate to another. The first answer is
+used, so one slow instance doesn't set the tail latency of reads.
+
+"""
+# System imports
+import collections
+import itertools
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+# Seconds to wait before hedging, until enough reads have been timed
+DELAY = 0.1
+
+# Reads timed before their 95th percentile is used as the delay
+MIN_SAMPLES = 20
+
+
+class HedgedInfluxDB(object):
+    """
+    Client for several InfluxDB instances holding the same data, which hedges
+    idempotent reads across them.
+
+    Each read is sent to the next instance in turn. If it hasn't answered
+    after *delay* seconds, or fails, the same read is sent to the instance
+    after it, and whichever answers first wins. Without a *delay*, the 95th
+    percentile of recent read times is used, so about one read in twenty is
+    hedged.
+
+    Hedges are capped at *budget* of the reads made, so a slow cluster
+    doesn't get twice the load. The losing request can't be interrupted once
+    sent, so it is left to finish in its thread and its result discarded.
+
+    :param list urls: InfluxDB API urls
+    :param int timeout: Timeout in seconds for requests (default `60`)
+    :param str precision: Precision string (default `'u'`)
+    :param float delay: Seconds to wait before hedging (optional)
+    :param float budget: Maximum hedged reads as a fraction of all reads
+        (default `0.1`)
+    :param int window: Number of recent reads to take the percentile of
+        (default `100`)
+    :param \\*\\*kwargs: Other arguments for each :class:`~influx.InfluxDB`
+
+    """
+    __slots__ = [
+            'budget',
+            'clients',
+            'counts',
+            'delay',
+            'latencies',
+            'lock',
+            'turn',
+            ]
+
+    def __init__(self, urls, timeout=60, precision='u', delay=None,
+                 budget=0.1, window=100, **kwargs):
+        # The package imports this module, so the client is imported late
+        from . import InfluxDB
+        if not urls:
+            raise ValueError("At least one URL is required")
+        self.clients = [InfluxDB(url, timeout, precision, **kwargs)
+                        for url in urls]
+        self.delay = delay
+        self.budget = budget
+        self.latencies = collections.deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.turn = itertools.count()
+        self.counts = {'reads': 0, 'hedged': 0, 'hedge_won': 0}
+
+    def select_recent(self, database, measurement, fields='*', tags=None,
+                      relative_time="15m"):
+        """
+        Return the response JSON of a hedged query, see
+        :meth:`InfluxDB.select_recent`.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str fields: Fields to select in query (optional, default `'*'`)
+        :param str tags: Tags to restrict the select by (optional)
+        :param str relative_time: Relative time to now() to query for
+                                  (optional, default `'15m'`)
+
+        """
+        return self._hedge('select_recent', database, measurement, fields,
+                           tags, relative_time)
+
+    def select_where(self, database, measurement, fields='*', tags=None,
+                     where=None, desc=False, limit=None):
+        """
+        Return the response JSON of a hedged query, see
+        :meth:`InfluxDB.select_where`.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str fields: Fields to select in query (optional, default `'*'`)
+        :param str tags: Tags to restrict the select by (optional)
+        :param str where: Where clause to add (default `'time > now() - 15m'`)
+        :param bool desc: Set this to `True` if you want descending values
+        :param int limit: Limit to this number of rows
+
+        """
+        return self._hedge('select_where', database, measurement, fields,
+                           tags, where, desc, limit)
+
+    def show_tags(self, database, measurement):
+        """
+        Return the tag keys of *measurement* from a hedged query.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+
+        """
+        return self._hedge('show_tags', database, measurement)
+
+    def show_fields(self, database, measurement):
+        """
+        Return the field keys of *measurement* from a hedged query.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+
+        """
+        return self._hedge('show_fields', database, measurement)
+
+    def stats(self):
+        """
+        Return a dict of counters of `reads`, reads `hedged` and hedges which
+        answered first (`hedge_won`), and the current hedging `delay` in
+        seconds.
+
+        """
+        with self.lock:
+            stats = dict(self.counts)
+        stats['delay'] = self._delay()
+        return stats
+
+    def _hedge(self, method, *args):
+        """ Return the first result of calling *method* on two clients. """
+        first = next(self.turn) % len(self.clients)
+        with self.lock:
+            self.counts['reads'] += 1
+        if len(self.clients) == 1:
+            return self._timed(getattr(self.clients[0], method), args)
+
+        results = queue.Queue()
+        self._attempt(0, self.clients[first], method, args, results)
+        try:
+            index, value, error = results.get(timeout=self._delay())
+            if error is None:
+                return value
+        except queue.Empty:
+            error = None
+
+        # Slow or failed, so try the next instance if the budget allows
+        if not self._spend():
+            if error is None:
+                index, value, error = results.get()
+            if error is not None:
+                raise error
+            return value
+
+        second = self.clients[(first + 1) % len(self.clients)]
+        self._attempt(1, second, method, args, results)
+        errors = [error] if error is not None else []
+        while len(errors) < 2:
+            index, value, error = results.get()
+            if error is None:
+                if index:
+                    with self.lock:
+                        self.counts['hedge_won'] += 1
+                return value
+            errors.append(error)
+        raise errors[0]
+
+    def _attempt(self, index, client, method, args, results):
+        """ Call *method* on *client* in a daemon thread, putting a tuple of
+        *index*, the result and the exception on *results*. """
+        def run():
+            try:
+                value = self._timed(getattr(client, method), args)
+            except Exception as err:
+                results.put((index, None, err))
+            else:
+                results.put((index, value, None))
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def _timed(self, func, args):
+        """ Return the result of *func*, recording how long it took. """
+        start = time.time()
+        value = func(*args)
+        self.latencies.append(time.time() - start)
+        return value
+
+    def _spend(self):
+        """ Return `True` if a read may be hedged within the budget, counting
+        it if so. """
+        with self.lock:
+            if self.counts['hedged'] + 1 > self.budget * self.counts['reads']:
+                return False
+            self.counts['hedged'] += 1
+            return True
+
+    def _delay(self):
+        """ Return the seconds to wait before hedging. """
+        if self.delay is not None:
+            return self.delay
+        latencies = sorted(self.latencies)
+        if len(latencies) < MIN_SAMPLES:
+            return DELAY
+        return latencies[int(len(latencies) * 0.95)]
@@ -0,0 +1,77 @@
+"""
+# Lazy import helpers
+
+This module keeps `import influx` cheap by deferring the import of heavy
+dependencies (such as *requests*) until they are first used.
+
+"""
+# System imports
+import functools
+import importlib
+import weakref
+
+
+class LazyModule(object):
+    """
+    Stand-in for a module which is imported on first attribute access.
+
+    Once imported, the module's namespace is copied onto this object, so later
+    attribute lookups are plain instance attribute lookups.
+
+    :param str name: Fully qualified module name
+
+    """
+    def __init__(self, name):
+        self.__dict__['_lazy_name'] = name
+
+    def __getattr__(self, attr):
+        name = self.__dict__['_lazy_name']
+        module = importlib.import_module(name)
+        self.__dict__.update(module.__dict__)
+        try:
+            return getattr(module, attr)
+        except AttributeError:
+            # Submodules which the package doesn't import itself
+            module = importlib.import_module(name + '.' + attr)
+            self.__dict__[attr] = module
+            return module
+
+    def __repr__(self):
+        return "<LazyModule {!r}>".format(self.__dict__['_lazy_name'])
+
+
+def hashed_singleton(klass):
+    """
+    Wrap *klass* so there is a single instance per call signature.
+
+    This behaves like :func:`pytool.lang.hashed_singleton`, which it replaces
+    so that importing this package does not import all of *pytool*. Instances
+    are kept as weak references, and static methods remain available on the
+    returned class.
+
+    :param type klass: Class to wrap
+
+    """
+    cls_dict = {'_singletons': weakref.WeakValueDictionary()}
+
+    # Mirror original class
+    for attr in functools.WRAPPER_ASSIGNMENTS:
+        if hasattr(klass, attr):
+            cls_dict[attr] = getattr(klass, attr)
+
+    # Preserve static methods on the wrapped class type
+    for attr, value in klass.__dict__.items():
+        if isinstance(value, staticmethod):
+            cls_dict[attr] = value
+
+    def __new__(cls, *args, **kwargs):
+        signature = (args, tuple(sorted(kwargs.items())))
+        obj = cls._singletons.get(signature, None)
+        if obj is None:
+            obj = klass(*args, **kwargs)
+            cls._singletons[signature] = obj
+        return obj
+
+    cls_dict['__new__'] = __new__
+
+    return type(klass.__name__, (object,), cls_dict)
@@ -4,52 +4,169 @@
 
 """
 # System imports
+import time
 from datetime import datetime
 from numbers import Integral
 
-# 3rd party imports
-import pytool
+
+# Nanoseconds per unit of each precision
+_PRECISION_NS = {
+        None: 1,
+        'n': 1,
+        'u': 10**3,
+        'ms': 10**6,
+        's': 10**9,
+        'm': 60 * 10**9,
+        'h': 3600 * 10**9,
+        }
+
+# Multipliers from float seconds to each precision
+_PRECISION_FACTOR = {
+        None: 1e9,
+        'n': 1e9,
+        'u': 1e6,
+        'ms': 1e3,
+        's': 1,
+        'm': 1. / 60,
+        'h': 1. / 3600,
+        }
+
+# Sanity checking that the precision isn't set wrong for integer timestamps...
+# this may bite people who are using far future timestamps, which InfluxDB
+# supports
+_PRECISION_LIMIT = {
+        'u': 10**18,
+        'ms': 10**15,
+        's': 10**12,
+        }
+
+# Naive UTC epoch, aware datetimes are made naive before subtracting
+_EPOCH = datetime(1970, 1, 1)
+
+# Integer clocks, falling back to float seconds before Python 3.7
+try:
+    _time_ns = time.time_ns
+    _monotonic_ns = time.monotonic_ns
+except AttributeError:
+    def _time_ns():
+        return int(time.time() * 1e9)
+    _monotonic_ns = _time_ns
+
+# Re-anchor the monotonic clock to the wall clock this often (ns), so a long
+# running process doesn't drift away from NTP corrected time
+_ANCHOR_TTL = 300 * 10**9
+_anchor = [0, -_ANCHOR_TTL]
+
+
+def _duration_units(duration, precision=None):
+    """
+    Return *duration*, in seconds or as an InfluxQL duration string such as
+    `'1m'`, in whole units of *precision*.
+
+    """
+    if not isinstance(duration, (int, float)):
+        # The package imports this module, so the client is imported late
+        from . import InfluxDB
+        duration = InfluxDB._parse_duration(duration)
+    return int(round(duration * 10**9)) // _PRECISION_NS[precision]
+
+
+def now(precision=None):
+    """
+    Return the current UTC time as an integer timestamp in *precision*.
+
+    This reads a monotonic clock anchored to the wall clock, rather than
+    building a datetime, so it is cheap enough to call for every write.
+
+    :param str precision: Timestamp precision (optional, default `'n'`)
+
+    """
+    mono = _monotonic_ns()
+    if mono - _anchor[1] > _ANCHOR_TTL:
+        _anchor[:] = _time_ns() - _monotonic_ns(), mono
+    return (_anchor[0] + mono) // _PRECISION_NS[precision]
+
+
+def _datetime_us(stamp):
+    """ Return *stamp* as integer microseconds since the epoch. """
+    offset = stamp.utcoffset()
+    if offset is None:
+        # Naive datetimes are treated as local time, like pytool.time.as_utc
+        seconds = int(time.mktime(stamp.timetuple()))
+        return seconds * 10**6 + stamp.microsecond
+
+    delta = stamp.replace(tzinfo=None) - offset - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+
+def timestamp_converter(precision=None):
+    """
+    Return a function converting a timestamp to an integer in *precision*.
+
+    The precision is resolved once, so the returned function can be applied
+    to every point in a batch. Integers are assumed to already be in
+    *precision*, floats are seconds since the epoch, and datetimes are
+    converted with integer arithmetic so no precision is lost.
+
+    :param str precision: Timestamp precision (optional, default `'n'`)
+
+    """
+    factor = _PRECISION_FACTOR[precision]
+    divisor = _PRECISION_NS[precision]
+    limit = _PRECISION_LIMIT.get(precision, None)
+
+    def convert(timestamp):
+        if isinstance(timestamp, Integral):
+            if limit is not None:
+                assert timestamp < limit
+            return timestamp
+
+        if isinstance(timestamp, float):
+            return int(timestamp * factor)
+
+        if isinstance(timestamp, datetime):
+            return _datetime_us(timestamp) * 1000 // divisor
+
+        raise ValueError(timestamp)
+
+    return convert
+
+
+def convert_timestamps(stamps, precision=None, unit='n'):
+    """
+    Return integer epoch timestamps in *unit* converted to *precision*.
+
+    NumPy `int64` and `datetime64` arrays are converted with a single
+    vectorized operation and returned as an `int64` array; any other iterable
+    of integers is returned as a list.
+
+    :param stamps: Integer timestamps, or a NumPy array
+    :param str precision: Target precision (optional, default `'n'`)
+    :param str unit: Precision of *stamps* (optional, default `'n'`)
+
+    """
+    dtype = getattr(stamps, 'dtype', None)
+    if dtype is not None and dtype.kind == 'M':
+        stamps = stamps.astype('datetime64[ns]').astype('int64')
+        unit = 'n'
+
+    source = _PRECISION_NS[unit]
+    target = _PRECISION_NS[precision]
+
+    if dtype is not None:
+        if source >= target:
+            return stamps * (source // target)
+        return stamps // (target // source)
+
+    if source >= target:
+        factor = source // target
+        return [int(s) * factor for s in stamps]
+    factor = target // source
+    return [int(s) // factor for s in stamps]
 
 
 def _convert_timestamp(timestamp, precision=None):
-    if precision is None or precision == 'n':
-        factor = 1e9
-    elif precision == 'u':
-        factor = 1e6
-    elif precision == 'ms':
-        factor = 1e3
-    elif precision == 's':
-        factor = 1
-    elif precision == 'm':
-        factor = 1. / 60
-    elif precision == 'h':
-        factor = 1. / 3600
-
-    if isinstance(timestamp, Integral):
-        # Sanity checking that the precision isn't set wrong... this may bite
-        # people who are using far future timestamps, which InfluxDB supports
-        if precision == 'u':
-            assert timestamp < 1e18
-        elif precision == 'ms':
-            assert timestamp < 1e15
-        elif precision == 's':
-            assert timestamp < 1e12
-
-        return timestamp  # assume precision is correct if timestamp is int
-
-    if isinstance(timestamp, float):
-        return timestamp * factor
-
-    if isinstance(timestamp, datetime):
-        if not timestamp.tzinfo:
-            timestamp = pytool.time.as_utc(timestamp)
-
-        stamp = timestamp - pytool.time.fromutctimestamp(0)
-        stamp = stamp.total_seconds()
-        stamp *= factor
-        return stamp
-
-    raise ValueError(timestamp)
+    return timestamp_converter(precision)(timestamp)
 
 
 def _escape_tag(tag):
@@ -127,20 +244,446 @@ def _get_unicode(data, force=False):
         return data
 
 
-def make_lines(data, precision=None):
+def _format_float(value):
+    return repr(float(value))
+
+
+def _format_integer(value):
+    return str(int(value)) + 'i'
+
+
+def _format_boolean(value):
+    if isinstance(value, (str, bytes)):
+        value = _get_unicode(value).lower() in ('t', 'true', '1')
+    return 'true' if value else 'false'
+
+
+def _format_string(value):
+    return quote_ident(_get_unicode(value, force=True))
+
+
+# Field type names, matching the types reported by SHOW FIELD KEYS
+FLOAT = 'float'
+INTEGER = 'integer'
+BOOLEAN = 'boolean'
+STRING = 'string'
+
+_FORMATTERS = {
+        FLOAT: _format_float,
+        INTEGER: _format_integer,
+        BOOLEAN: _format_boolean,
+        STRING: _format_string,
+        }
+
+_TYPE_ALIASES = {
+        float: FLOAT,
+        int: INTEGER,
+        bool: BOOLEAN,
+        str: STRING,
+        'int': INTEGER,
+        'bool': BOOLEAN,
+        'str': STRING,
+        }
+
+
+class Schema(object):
+    """
+    Declared field types for a measurement.
+
+    Values of declared fields are converted with a fixed formatter for their
+    type instead of having their type probed for every point. Fields declared
+    as integers are written with the `i` suffix, so they are stored as true
+    integers. Fields which are not declared are serialized as usual.
+
+    :param dict fields: Field names mapped to a type, one of `'float'`,
+        `'integer'`, `'boolean'` or `'string'` (or the equivalent Python type)
+    :param dict digits: Float field names mapped to the number of decimal
+        places to write (optional)
+
+    """
+    __slots__ = [
+            'formatters',
+            'types',
+            ]
+
+    def __init__(self, fields, digits=None):
+        digits = digits or {}
+        self.types = {}
+        self.formatters = {}
+        for name, kind in fields.items():
+            kind = _TYPE_ALIASES.get(kind, kind)
+            if kind not in _FORMATTERS:
+                raise ValueError("Unknown type {!r} for field {!r}".format(
+                    kind, name))
+
+            formatter = _FORMATTERS[kind]
+            if name in digits:
+                if kind != FLOAT:
+                    raise ValueError("Digits given for non-float field "
+                                     "{!r}".format(name))
+                formatter = '{{:.{}f}}'.format(int(digits[name])).format
+
+            self.types[name] = kind
+            self.formatters[name] = _escape_tag(name) + '=', formatter
+
+    def __repr__(self):
+        return "Schema({!r})".format(self.types)
+
+
+class Series(object):
+    """
+    A measurement with a set of tags bound to it.
+
+    The escaped series key (measurement and sorted tags) is built once, so
+    every point created from this series shares it instead of re-escaping.
+
+    :param str measurement: Measurement name
+    :param dict tags: Tags for every point in this series (optional)
+    :param Schema schema: Field schema for this series (optional)
+
+    """
+    __slots__ = [
+            'key',
+            'measurement',
+            'schema',
+            'tags',
+            ]
+
+    def __init__(self, measurement, tags=None, schema=None):
+        self.measurement = measurement
+        self.tags = tags or {}
+        self.schema = schema
+        self.key = _make_key(measurement, self.tags)
+
+    def point(self, fields, time=None, tags=None):
+        """
+        Return a new :class:`Point` in this series.
+
+        :param dict fields: Fields dictionary
+        :param time: Timestamp of the point (optional)
+        :param dict tags: Additional tags for this point only (optional)
+
+        """
+        return Point(self, fields, tags, time)
+
+    def __repr__(self):
+        return "Series({!r}, {!r})".format(self.measurement, self.tags)
+
+
+class Point(object):
+    """
+    A single data point.
+
+    :param measurement: Measurement name, or a :class:`Series`
+    :param dict fields: Fields dictionary
+    :param dict tags: Tags for this point (optional)
+    :param time: Timestamp of the point (optional, defaults to the InfluxDB
+        server time)
+
+    """
+    __slots__ = [
+            'fields',
+            'measurement',
+            'tags',
+            'time',
+            ]
+
+    def __init__(self, measurement, fields, tags=None, time=None):
+        self.measurement = measurement
+        self.fields = fields
+        self.tags = tags
+        self.time = time
+
+    def key(self):
+        """ Return the escaped series key for this point. """
+        measurement = self.measurement
+        if isinstance(measurement, Series):
+            if not self.tags:
+                return measurement.key
+            tags = dict(measurement.tags)
+            tags.update(self.tags)
+            return _make_key(measurement.measurement, tags)
+        return _make_key(measurement, self.tags or {})
+
+    def __repr__(self):
+        return "Point({!r}, {!r}, {!r}, {!r})".format(
+            self.measurement, self.fields, self.tags, self.time)
+
+
+def _make_key(measurement, tags):
+    """ Return the escaped measurement and sorted tags for a line. """
+    key_values = [_escape_tag(_get_unicode(measurement))]
+
+    # tags should be sorted client-side to take load off server
+    for tag_key, tag_value in sorted(tags.items()):
+        key = _escape_tag(tag_key)
+        value = _escape_tag_value(tag_value)
+
+        if key != '' and value != '':
+            key_values.append(key + "=" + value)
+
+    return ','.join(key_values)
+
+
+def _make_line(key, fields, timestamp, convert, schema=None):
+    """ Return a single line from a series key, fields and timestamp. """
+    line = key + ' ' + _make_fields(fields, schema)
+
+    if timestamp is not None:
+        line += ' ' + str(convert(timestamp))
+
+    return line
+
+
+def _make_fields(fields, schema=None, names=None):
+    """
+    Return the field set of a line. Escaped field names are kept in *names*
+    if given, so names repeated across lines are escaped once.
+
+    """
+    formatters = schema.formatters if schema is not None else {}
+    field_values = []
+    for field_key, field_value in sorted(fields.items()):
+        formatter = formatters.get(field_key, None)
+        if formatter is not None:
+            if field_value is not None:
+                field_values.append(formatter[0] + formatter[1](field_value))
+            continue
+
+        if names is None:
+            key_ = _escape_tag(field_key)
+        else:
+            key_ = names.get(field_key, None)
+            if key_ is None:
+                key_ = names[field_key] = _escape_tag(field_key)
+        value = _escape_value(field_value)
+
+        if key_ != '' and value != '':
+            field_values.append(key_ + "=" + value)
+
+    return ','.join(field_values)
+
+
+def _get_schema(schema, measurement):
+    """ Return the :class:`Schema` to use for *measurement*, if any. """
+    if isinstance(measurement, Series):
+        if measurement.schema is not None:
+            return measurement.schema
+        measurement = measurement.measurement
+    if isinstance(schema, dict):
+        return schema.get(measurement, None)
+    return schema
+
+
+def _make_point_lines(points, precision, schema=None):
+    """ Return a list of lines for an iterable of :class:`Point`. """
+    convert = timestamp_converter(precision)
+    lines = []
+    last = None, None
+    key = None
+    point_schema = schema
+    for point in points:
+        measurement = point.measurement
+        tags = point.tags
+
+        # Points from the same series (or sharing a tags dict) reuse the key
+        if measurement is not last[0] or tags is not last[1]:
+            key = point.key()
+            last = measurement, tags
+            point_schema = _get_schema(schema, measurement)
+
+        lines.append(_make_line(key, point.fields, point.time, convert,
+                                point_schema))
+    return lines
+
+
+class LineBuffer(object):
+    """
+    A growable byte buffer for serializing line protocol into, which can be
+    cleared and reused for every write instead of building and joining a new
+    string each time.
+
+    The contents are read through a `memoryview` from :meth:`view`, which
+    can be sent as a request body without copying it. A buffer must not be
+    written to while a view of it is being sent.
+
+    :param int capacity: Initial size in bytes (default `65536`)
+
+    """
+    __slots__ = [
+            'data',
+            'size',
+            ]
+
+    def __init__(self, capacity=65536):
+        self.data = bytearray(capacity)
+        self.size = 0
+
+    def clear(self):
+        """ Empty the buffer, keeping its memory. """
+        self.size = 0
+
+    def write(self, chunk):
+        """
+        Append *chunk* to the buffer, encoding text as UTF-8.
+
+        :param bytes chunk: Bytes or text to append
+
+        """
+        if not isinstance(chunk, bytes):
+            chunk = chunk.encode('utf-8')
+        end = self.size + len(chunk)
+        if end > len(self.data):
+            self._grow(end)
+        self.data[self.size:end] = chunk
+        self.size = end
+
+    def view(self):
+        """ Return a `memoryview` of the contents. """
+        return memoryview(self.data)[:self.size]
+
+    def _grow(self, size):
+        """ Make room for at least *size* bytes. """
+        capacity = max(size, len(self.data) * 2)
+        try:
+            self.data.extend(bytearray(capacity - len(self.data)))
+        except BufferError:
+            # A view from an earlier write is still held, so the buffer
+            # can't be resized and is replaced instead
+            data = bytearray(capacity)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def __len__(self):
+        return self.size
+
+
+def make_lines_into(buffer, points, precision=None, schema=None):
+    """
+    Serialize an iterable of :class:`Point` into *buffer*, and return a
+    `memoryview` of the buffer's contents.
+
+    Each series key is escaped and encoded once for a run of points in the
+    series, and each field name is escaped once per call, with each line
+    encoded straight into the buffer.
+
+    :param LineBuffer buffer: Buffer to append to
+    :param points: Iterable of :class:`Point`
+    :param str precision: Timestamp precision (optional)
+    :param schema: :class:`Schema`, or a dict of measurement names mapped to
+        a :class:`Schema` (optional)
+
+    """
+    convert = timestamp_converter(precision)
+    names = {}
+    last = None, None
+    key = None
+    point_schema = schema
+
+    # The buffer is written to directly, which saves a method call per line
+    data = buffer.data
+    size = buffer.size
+    for point in points:
+        measurement = point.measurement
+        tags = point.tags
+
+        # Points from the same series (or sharing a tags dict) reuse the key
+        if measurement is not last[0] or tags is not last[1]:
+            key = (point.key() + ' ').encode('utf-8')
+            last = measurement, tags
+            point_schema = _get_schema(schema, measurement)
+
+        line = _make_fields(point.fields, point_schema, names)
+        if point.time is not None:
+            line = key + (line + ' ' + str(convert(point.time)) +
+                          '\n').encode('utf-8')
+        else:
+            line = key + (line + '\n').encode('utf-8')
+
+        end = size + len(line)
+        if end > len(data):
+            buffer.size = size
+            buffer._grow(end)
+            data = buffer.data
+        data[size:end] = line
+        size = end
+
+    buffer.size = size
+    return buffer.view()
+
+
+def coalesce(points):
+    """
+    Return a 2-tuple of a list of *points* with the points that share a
+    series and timestamp merged into one, and the number of points merged
+    away.
+
+    Fields are merged in order, so the last value for a field wins, as it
+    would in InfluxDB. Fields which are `None` are not written, so they don't
+    replace earlier values. Points without a timestamp are never merged,
+    since they each get the server time. The points passed in are not
+    modified.
+
+    :param list points: List of :class:`Point`
+
+    """
+    result = []
+    positions = {}
+    copied = set()
+    merged = 0
+    last = None, None
+    key = None
+    for point in points:
+        if point.time is None:
+            result.append(point)
+            continue
+
+        # Points from the same series (or sharing a tags dict) reuse the key
+        if point.measurement is not last[0] or point.tags is not last[1]:
+            key = point.key()
+            last = point.measurement, point.tags
+
+        position = positions.setdefault((key, point.time), len(result))
+        if position == len(result):
+            result.append(point)
+            continue
+
+        # Copy the first point before merging into it, so it's not modified
+        first = result[position]
+        if position not in copied:
+            first = Point(first.measurement, dict(first.fields), first.tags,
+                          first.time)
+            result[position] = first
+            copied.add(position)
+        fields = first.fields
+        for field, value in point.fields.items():
+            if value is not None:
+                fields[field] = value
+        merged += 1
+
+    return result, merged
+
+
+def make_lines(data, precision=None, schema=None):
     """Extract points from given dict.
     Extracts the points from the given dict and returns a Unicode string
     matching the line protocol introduced in InfluxDB 0.9.0.
+
+    *data* may also be an iterable of :class:`Point` objects, which are
+    serialized directly.
+
+    *schema* may be a :class:`Schema`, or a dict of measurement names mapped
+    to a :class:`Schema`. It is used for points which are not part of a
+    :class:`Series` with its own schema.
     """
+    if not isinstance(data, dict):
+        return '\n'.join(_make_point_lines(data, precision, schema)) + '\n'
+
+    convert = timestamp_converter(precision)
     lines = []
     static_tags = data.get('tags')
     for point in data['points']:
-        elements = []
-
-        # add measurement name
-        measurement = _escape_tag(_get_unicode(
-            point.get('measurement', data.get('measurement'))))
-        key_values = [measurement]
+        measurement = point.get('measurement', data.get('measurement'))
 
         # add tags
         if static_tags:
@@ -149,34 +692,8 @@ def make_lines(data, precision=None):
         else:
             tags = point.get('tags') or {}
 
-        # tags should be sorted client-side to take load off server
-        for tag_key, tag_value in sorted(tags.items()):
-            key = _escape_tag(tag_key)
-            value = _escape_tag_value(tag_value)
-
-            if key != '' and value != '':
-                key_values.append(key + "=" + value)
-
-        elements.append(','.join(key_values))
-
-        # add fields
-        field_values = []
-        for field_key, field_value in sorted(point['fields'].items()):
-            key = _escape_tag(field_key)
-            value = _escape_value(field_value)
-
-            if key != '' and value != '':
-                field_values.append(key + "=" + value)
-
-        elements.append(','.join(field_values))
-
-        # add timestamp
-        if 'time' in point:
-            timestamp = _get_unicode(str(int(
-                _convert_timestamp(point['time'], precision))))
-            elements.append(timestamp)
-
-        line = ' '.join(elements)
-        lines.append(line)
+        lines.append(_make_line(_make_key(measurement, tags), point['fields'],
+                                point.get('time', None), convert,
+                                _get_schema(schema, measurement)))
 
     return '\n'.join(lines) + '\n'
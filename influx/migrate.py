@@ -0,0 +1,119 @@
+"""
+# Measurement copy
+
+This module copies a measurement from one InfluxDB instance to another. The
+source is read in time windows as chunked, streamed queries, and each chunk is
+converted to line protocol and written while the next is read, so memory use
+is bounded by the chunks in flight rather than by the size of the
+measurement.
+
+"""
+# Project imports
+from . import bulk
+from . import line_protocol
+
+
+# Default length of each queried time window, in seconds
+WINDOW = 3600
+
+
+def copy_measurement(src_client, dst_client, database, measurement, start,
+                     end, window=WINDOW, chunk_size=10000, workers=4,
+                     dst_database=None, checkpoint=None, progress=None):
+    """
+    Return a dictionary of totals from copying the points of *measurement*
+    from *start* up to (but not including) *end* between two InfluxDB
+    instances.
+
+    The time range is queried one *window* at a time with `GROUP BY *`, so
+    tags stay tags, and fields are written with the types the source
+    reports for them. Chunks of *chunk_size* rows are written by *workers*
+    threads while the source is read, with at most twice as many chunks
+    waiting, so the copy runs at the speed of the slower instance.
+
+    After each window is written, the time it ends at is saved to the
+    *checkpoint* file, and a copy given an existing checkpoint resumes from
+    there. The checkpoint is removed once the copy is done.
+
+    :param InfluxDB src_client: Client to read with
+    :param InfluxDB dst_client: Client to write with
+    :param str database: Database name to copy from
+    :param str measurement: Measurement name to copy
+    :param start: Start of the time range, as an integer in the source
+        client's precision, float seconds or a datetime
+    :param end: End of the time range, as *start*
+    :param window: Length of each queried window, in seconds or as an
+        InfluxQL duration (default `3600`)
+    :param int chunk_size: Number of rows per chunk (default `10000`)
+    :param int workers: Number of chunks written concurrently (default `4`)
+    :param str dst_database: Database name to copy to (optional, defaults to
+        *database*)
+    :param str checkpoint: Path of the checkpoint file (optional)
+    :param progress: Callable called with the totals after each chunk
+        (optional)
+    :return dict: Totals of `'batches'`, `'lines'`, `'bytes'` and
+        `'seconds'`, and the `'offset'` time reached
+
+    """
+    convert = line_protocol.timestamp_converter(src_client.precision)
+    start = convert(start)
+    end = convert(end)
+    step = line_protocol._duration_units(window, src_client.precision)
+    if step < 1:
+        raise ValueError("Window is shorter than the client precision")
+
+    if checkpoint:
+        start = max(start, bulk.load_checkpoint(checkpoint))
+
+    schema = line_protocol.Schema(
+        src_client.show_field_types(database, measurement))
+    batches = _read_windows(src_client, dst_client.precision, database,
+                            measurement, start, end, step, chunk_size, schema)
+    totals = bulk.import_batches(dst_client, dst_database or database,
+                                 batches, workers, checkpoint, progress)
+    if checkpoint:
+        bulk.remove_checkpoint(checkpoint)
+    return totals
+
+
+def _read_windows(client, precision, database, measurement, start, end,
+                  step, chunk_size, schema):
+    """
+    Return a generator of `(time, payload)` tuples of line protocol in
+    *precision* for each chunk of *measurement* between *start* and *end*.
+
+    The time is the window start for every chunk but the last of a window,
+    which has the window end, so it is only reached once the whole window is
+    written. Windows without points give an empty payload.
+
+    """
+    while start < end:
+        stop = min(start + step, end)
+        where = "time >= {} AND time < {}".format(client._time_literal(start),
+                                                  client._time_literal(stop))
+        pending = None
+        for chunk in client._select_series(database, measurement, where,
+                                           chunk_size):
+            points = []
+            for tags, columns, values in chunk:
+                index = columns.index('time')
+                stamps = [row[index] for row in values]
+                if precision != client.precision:
+                    stamps = line_protocol.convert_timestamps(
+                        stamps, precision, client.precision)
+                # The series tags are used as they are, whatever their values
+                series = line_protocol.Series(measurement, tags, schema)
+                for row, stamp in zip(values, stamps):
+                    fields = dict(zip(columns, row))
+                    del fields['time']
+                    points.append(series.point(fields, stamp))
+
+            if pending is not None:
+                yield start, pending
+            pending = b''
+            if points:
+                pending = line_protocol.make_lines(
+                    points, precision).encode('utf-8')
+
+        yield stop, pending or b''
+        start = stop
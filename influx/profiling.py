@@ -0,0 +1,265 @@
+"""
+# Sampled profiling
+
+This module contains a profiler which runs one in every N calls of a client's
+hot paths under *cProfile*, and *tracemalloc* where it is available, and keeps
+their statistics separately for each stage:
+
+- `serialize` - Building line protocol for writes
+- `decode` - Decoding response bodies
+- `send` - Sending requests and reading responses, the network time
+
+Calls which are not sampled only pay for a counter, so the overhead is bounded
+by the sampling rate.
+
+"""
+# System imports
+import cProfile
+import pstats
+import sys
+import threading
+import time
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+# Stages of a request which are profiled
+STAGES = ('serialize', 'decode', 'send')
+
+
+class Profiler(object):
+    """
+    Profiles one in every *sample* calls of each stage.
+
+    Only one call is profiled at a time, since only one profiler can be
+    active at once, and calls made while another is being profiled run
+    without it.
+
+    :param int sample: Profile one call in this many (default `100`)
+    :param bool memory: Set this to `False` to not trace allocations
+        (default `True`)
+
+    """
+    __slots__ = [
+            'calls',
+            'lock',
+            'memory',
+            'sample',
+            'stages',
+            ]
+
+    def __init__(self, sample=100, memory=True):
+        if sample < 1:
+            raise ValueError("Sample rate must be at least 1")
+        self.sample = sample
+        self.memory = memory and tracemalloc is not None
+        self.lock = threading.Lock()
+        self.calls = dict((stage, 0) for stage in STAGES)
+        self.stages = {}
+
+    def call(self, stage, func, *args, **kwargs):
+        """
+        Return the result of calling *func*, profiling it if this call of
+        *stage* is sampled.
+
+        :param str stage: Stage name
+        :param func: Callable to call
+        :param \\*args: Positional arguments for *func*
+        :param \\*\\*kwargs: Keyword arguments for *func*
+
+        """
+        # Counts may be lost between threads, which only moves the sampling
+        count = self.calls[stage] = self.calls[stage] + 1
+        if count % self.sample or not self.lock.acquire(False):
+            return func(*args, **kwargs)
+        try:
+            return self._profile(stage, func, args, kwargs)
+        finally:
+            self.lock.release()
+
+    def report(self):
+        """ Return a :class:`ProfileReport` of the calls profiled so far. """
+        with self.lock:
+            stages = {}
+            for stage, entry in self.stages.items():
+                entry = dict(entry)
+                stats = pstats.Stats()
+                stats.add(entry['stats'])
+                entry['stats'] = stats
+                stages[stage] = entry
+            return ProfileReport(dict(self.calls), stages)
+
+    def reset(self):
+        """ Discard the calls profiled so far. """
+        with self.lock:
+            self.calls = dict((stage, 0) for stage in STAGES)
+            self.stages = {}
+
+    def dump_on_signal(self, signum, stream=None):
+        """
+        Dump a report to *stream* whenever the process receives *signum*,
+        such as `signal.SIGUSR1`. Must be called from the main thread.
+
+        :param int signum: Signal number
+        :param stream: File-like object to write to (default `sys.stderr`)
+
+        """
+        import signal
+
+        def dump():
+            self.report().dump(stream)
+
+        def handler(signum, frame):
+            # The signal may interrupt a profiled call holding the lock, so
+            # the report is made in its own thread once it is released
+            thread = threading.Thread(target=dump)
+            thread.daemon = True
+            thread.start()
+
+        signal.signal(signum, handler)
+
+    def _profile(self, stage, func, args, kwargs):
+        """ Return the result of *func* called under the profilers, expecting
+        the lock held. """
+        tracing = self.memory and self._start_tracing()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active in this process
+            profile = None
+
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            if profile is not None:
+                profile.disable()
+            peak = None
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] - tracing[0]
+                if tracing[1]:
+                    tracemalloc.stop()
+            if profile is not None:
+                self._add(stage, profile, elapsed, peak)
+
+    @staticmethod
+    def _start_tracing():
+        """
+        Return a 2-tuple of the memory traced now and whether tracing was
+        started, with the peak reset, or `None` if the peak can't be reset.
+
+        """
+        started = False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started = True
+        elif hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            # Tracing started elsewhere, with a peak we can't reset
+            return None
+        return tracemalloc.get_traced_memory()[0], started
+
+    def _add(self, stage, profile, elapsed, peak):
+        """ Add a profiled call to the statistics for *stage*. """
+        entry = self.stages.get(stage, None)
+        if entry is None:
+            entry = self.stages[stage] = {
+                    'sampled': 0,
+                    'seconds': 0.0,
+                    'peak': None,
+                    'peak_total': 0,
+                    'stats': pstats.Stats(profile),
+                    }
+        else:
+            entry['stats'].add(profile)
+        entry['sampled'] += 1
+        entry['seconds'] += elapsed
+        if peak is not None:
+            entry['peak'] = max(entry['peak'] or 0, peak)
+            entry['peak_total'] += peak
+
+
+class ProfileReport(object):
+    """
+    Statistics of the calls profiled by a :class:`Profiler`, for each stage.
+
+    :param dict calls: Stage names mapped to the number of calls
+    :param dict stages: Stage names mapped to their statistics
+
+    """
+    __slots__ = [
+            'calls',
+            'stages',
+            ]
+
+    def __init__(self, calls, stages):
+        self.calls = calls
+        self.stages = stages
+
+    def summary(self):
+        """
+        Return a dict of stage names mapped to dicts of `calls` (all calls),
+        `sampled` (calls profiled), `mean` (mean seconds per profiled call),
+        `peak` (largest allocation peak in bytes) and `mean_peak`, where the
+        allocation figures are `None` without *tracemalloc*.
+
+        """
+        summary = {}
+        for stage, calls in self.calls.items():
+            entry = self.stages.get(stage, None) or {'sampled': 0}
+            sampled = entry['sampled']
+            peak = entry.get('peak', None)
+            summary[stage] = {
+                    'calls': calls,
+                    'sampled': sampled,
+                    'mean': entry['seconds'] / sampled if sampled else None,
+                    'peak': peak,
+                    'mean_peak': (entry['peak_total'] // sampled
+                                  if peak is not None else None),
+                    }
+        return summary
+
+    def stats(self, stage):
+        """
+        Return the merged `pstats.Stats` of *stage*, or `None` if no call of
+        it was profiled.
+
+        :param str stage: Stage name
+
+        """
+        entry = self.stages.get(stage, None)
+        return entry['stats'] if entry else None
+
+    def dump(self, stream=None, limit=15, sort='cumulative'):
+        """
+        Write the summary and the top functions of each stage to *stream*.
+
+        :param stream: File-like object to write to (default `sys.stderr`)
+        :param int limit: Number of functions to show for each stage
+            (default `15`)
+        :param str sort: `pstats` sort key (default `'cumulative'`)
+
+        """
+        stream = stream or sys.stderr
+        summary = self.summary()
+        for stage in STAGES:
+            entry = summary[stage]
+            stream.write("{}: {} calls, {} profiled".format(
+                stage, entry['calls'], entry['sampled']))
+            if entry['sampled']:
+                stream.write(", {:.1f} us mean".format(entry['mean'] * 1e6))
+            if entry['peak'] is not None:
+                stream.write(", {} bytes peak, {} bytes mean peak".format(
+                    entry['peak'], entry['mean_peak']))
+            stream.write("\n")
+
+            stats = self.stats(stage)
+            if stats is not None:
+                stats.stream = stream
+                stats.sort_stats(sort).print_stats(limit)
+        stream.flush()
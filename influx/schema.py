@@ -0,0 +1,192 @@
+"""
+# Schema cache
+
+This module contains a TTL based cache for measurement tag keys and field
+keys, used by the client to avoid a round trip per `SHOW ...` query.
+
+"""
+# System imports
+import threading
+import time
+
+
+class SchemaCache(object):
+    """
+    Cache of tag keys and field keys (with their types) per measurement.
+
+    Entries expire after *ttl* seconds. A database can be warmed in bulk, in
+    which case a measurement returned with fields but no tags (or the other
+    way round) is answered as empty until the warm-up expires. Measurements
+    the warm-up didn't return at all are looked up again, since they may have
+    been written since.
+
+    A *ttl* of `0` (or `None`) disables the cache entirely.
+
+    :param float ttl: Time to live for cached entries, in seconds
+
+    """
+    __slots__ = [
+            'fields',
+            'lock',
+            'tags',
+            'ttl',
+            'warmed',
+            ]
+
+    def __init__(self, ttl=0):
+        self.ttl = ttl or 0
+        self.lock = threading.Lock()
+        # (database, measurement) -> (expires, [tag, ...])
+        self.tags = {}
+        # (database, measurement) -> (expires, [field, ...], {field: type})
+        self.fields = {}
+        # database -> expires
+        self.warmed = {}
+
+    def __bool__(self):
+        return self.ttl > 0
+
+    __nonzero__ = __bool__
+
+    def get_tags(self, database, measurement):
+        """
+        Return a list of cached tag keys, or `None` if not cached.
+
+        :param str database: Database name
+        :param str measurement: Measurement name
+
+        """
+        entry = self._get(self.tags, database, measurement)
+        if entry is None:
+            return None
+        return entry[1]
+
+    def get_fields(self, database, measurement):
+        """
+        Return a 2-tuple of cached field keys and a dict of field types, or
+        `None` if not cached.
+
+        :param str database: Database name
+        :param str measurement: Measurement name
+
+        """
+        entry = self._get(self.fields, database, measurement)
+        if entry is None:
+            return None
+        return entry[1], entry[2]
+
+    def set_tags(self, database, measurement, tags):
+        """
+        Cache the tag keys for *measurement*.
+
+        :param str database: Database name
+        :param str measurement: Measurement name
+        :param list tags: List of tag keys
+
+        """
+        if not self:
+            return
+        with self.lock:
+            self._set_tags(database, measurement, tags)
+
+    def set_fields(self, database, measurement, fields):
+        """
+        Cache the field keys and types for *measurement*.
+
+        :param str database: Database name
+        :param str measurement: Measurement name
+        :param list fields: List of 2-tuples of field key and type
+
+        """
+        if not self:
+            return
+        with self.lock:
+            self._set_fields(database, measurement, fields)
+
+    def warm(self, database, tags, fields):
+        """
+        Replace all cached entries for *database* from bulk query results.
+
+        :param str database: Database name
+        :param dict tags: Measurement name mapped to a list of tag keys
+        :param dict fields: Measurement name mapped to a list of 2-tuples of
+            field key and type
+
+        """
+        if not self:
+            return
+        with self.lock:
+            self._drop(database)
+            for measurement, values in tags.items():
+                self._set_tags(database, measurement, values)
+            for measurement, values in fields.items():
+                self._set_fields(database, measurement, values)
+            self.warmed[database] = self._expires()
+
+    def invalidate(self, database, measurement=None):
+        """
+        Drop cached entries for *measurement*, or for the whole *database* if
+        no measurement is given.
+
+        :param str database: Database name
+        :param str measurement: Measurement name (optional)
+
+        """
+        with self.lock:
+            if measurement is None:
+                self._drop(database)
+                return
+            # The measurement may be recreated, so it must be looked up again
+            # instead of being answered as empty by the warm-up
+            self.warmed.pop(database, None)
+            self.tags.pop((database, measurement), None)
+            self.fields.pop((database, measurement), None)
+
+    def clear(self):
+        """ Drop every cached entry. """
+        with self.lock:
+            self.tags.clear()
+            self.fields.clear()
+            self.warmed.clear()
+
+    def _get(self, cache, database, measurement):
+        """ Return a live cache entry, or an empty one for measurements a
+        warm database has only the other kind of key for. """
+        if not self:
+            return None
+
+        now = time.time()
+        entry = cache.get((database, measurement), None)
+        if entry is not None and entry[0] > now:
+            return entry
+
+        # If the whole database was warmed and the measurement was returned
+        # with the other kind of key, the server has none of this kind
+        if self.warmed.get(database, 0) > now:
+            other = self.fields if cache is self.tags else self.tags
+            known = other.get((database, measurement), None)
+            if known is not None and known[0] > now:
+                return (0, [], {})
+
+        return None
+
+    def _set_tags(self, database, measurement, tags):
+        """ Cache the tag keys for *measurement*, expecting the lock held. """
+        self.tags[database, measurement] = (self._expires(), list(tags))
+
+    def _set_fields(self, database, measurement, fields):
+        """ Cache the field keys and types for *measurement*, expecting the
+        lock held. """
+        names = [f[0] for f in fields]
+        types = dict((f[0], f[1] if len(f) > 1 else None) for f in fields)
+        self.fields[database, measurement] = (self._expires(), names, types)
+
+    def _drop(self, database):
+        """ Drop all entries for *database*, expecting the lock held. """
+        self.warmed.pop(database, None)
+        for cache in (self.tags, self.fields):
+            for key in [k for k in cache if k[0] == database]:
+                del cache[key]
+
+    def _expires(self):
+        return time.time() + self.ttl
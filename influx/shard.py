@@ -0,0 +1,402 @@
+"""
+# Sharded client
+
+This module contains a client which spreads series across several independent
+InfluxDB instances using a consistent hash ring, so adding an instance only
+moves a fraction of the series to it.
+
+"""
+# System imports
+import bisect
+import collections
+import hashlib
+import struct
+
+# Project imports
+from . import line_protocol
+
+
+def _hash(key):
+    """ Return a stable 64 bit hash of the string *key*. """
+    digest = hashlib.md5(key.encode('utf-8')).digest()
+    return struct.unpack('>Q', digest[:8])[0]
+
+
+class HashRing(object):
+    """
+    Consistent hash ring of nodes, each placed on the ring *replicas* times.
+
+    :param list nodes: Node names
+    :param int replicas: Points on the ring per node (default `100`)
+
+    """
+    __slots__ = [
+            'hashes',
+            'nodes',
+            'owners',
+            'replicas',
+            ]
+
+    def __init__(self, nodes, replicas=100):
+        self.replicas = replicas
+        self.nodes = []
+        self.hashes = []
+        self.owners = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        """
+        Add *node* to the ring.
+
+        :param str node: Node name
+
+        """
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        ring = list(zip(self.hashes, self.owners))
+        ring.extend((_hash('{}#{}'.format(node, i)), node)
+                    for i in range(self.replicas))
+        ring.sort()
+        self.hashes = [h for h, _ in ring]
+        self.owners = [n for _, n in ring]
+
+    def remove(self, node):
+        """
+        Remove *node* from the ring.
+
+        :param str node: Node name
+
+        """
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        ring = [(h, n) for h, n in zip(self.hashes, self.owners)
+                if n != node]
+        self.hashes = [h for h, _ in ring]
+        self.owners = [n for _, n in ring]
+
+    def get(self, key):
+        """
+        Return the node owning *key*.
+
+        :param str key: Key to look up
+
+        """
+        if not self.hashes:
+            raise ValueError("Hash ring is empty")
+        index = bisect.bisect(self.hashes, _hash(key))
+        return self.owners[index % len(self.owners)]
+
+
+class ShardedInfluxDB(object):
+    """
+    Client for several independent InfluxDB instances, with each series
+    (database, measurement and tag set) stored on one of them.
+
+    Series are placed with a consistent hash ring of the instance URLs.
+    Writes are split by instance and the pieces sent in parallel. Queries are
+    sent to every instance in parallel, and the series in the results are
+    merged and sorted by time.
+
+    Since each series lives on one instance, aggregates over a single series
+    (or grouped by every tag) are exact, but aggregates across series are
+    computed per instance and not combined.
+
+    :param list urls: InfluxDB API urls
+    :param int timeout: Timeout in seconds for requests (default `60`)
+    :param str precision: Precision string (default `'u'`)
+    :param int replicas: Points on the hash ring per instance
+        (default `100`)
+    :param \\*\\*kwargs: Other arguments for each :class:`~influx.InfluxDB`
+
+    """
+    __slots__ = [
+            'clients',
+            'precision',
+            'ring',
+            ]
+
+    def __init__(self, urls, timeout=60, precision='u', replicas=100,
+                 **kwargs):
+        # The package imports this module, so the client is imported late
+        from . import InfluxDB
+        self.precision = precision
+        self.clients = collections.OrderedDict(
+            (url, InfluxDB(url, timeout, precision, **kwargs))
+            for url in urls)
+        self.ring = HashRing(self.clients, replicas)
+
+    def shard(self, database, measurement, tags=None):
+        """
+        Return the client for the instance holding a series.
+
+        :param str database: Database name
+        :param str measurement: Measurement name
+        :param dict tags: Tags of the series (optional)
+
+        """
+        key = line_protocol._make_key(measurement, tags or {})
+        return self._shard(database, key)
+
+    def create_database(self, database):
+        """
+        Create *database* on every instance.
+
+        :param str database: Database name
+
+        """
+        self._broadcast('create_database', database)
+
+    def drop_database(self, database):
+        """
+        Drop *database* on every instance.
+
+        :param str database: Database name
+
+        """
+        self._broadcast('drop_database', database)
+
+    def drop_measurement(self, measurement, database):
+        """
+        Drop *measurement* from *database* on every instance.
+
+        :param str measurement: Measurement name
+        :param str database: Database name
+
+        """
+        self._broadcast('drop_measurement', measurement, database)
+
+    def set_field_schema(self, measurement, fields, digits=None):
+        """
+        Declare the field types for *measurement* on every instance's client,
+        see :meth:`InfluxDB.set_field_schema`.
+
+        :param str measurement: Measurement name
+        :param dict fields: Field names mapped to types
+        :param dict digits: Float field names mapped to the number of decimal
+            places to write (optional)
+
+        """
+        for client in self.clients.values():
+            client.set_field_schema(measurement, fields, digits)
+
+    def write(self, database, measurement, fields, tags={}, time=None):
+        """
+        Write a data point to the instance holding its series.
+
+        :param str database: Database name to write to
+        :param str measurement: Measurement name to write to
+        :param dict fields: Dictionary of fields to write
+        :param dict tags: Dictionary of tags to associate with this point
+        :param datetime time: UTC timestamp to use (optional)
+
+        """
+        from . import InfluxDB
+        point = InfluxDB._make_point(measurement, fields, tags, time,
+                                     precision=self.precision)
+        self.write_points(database, [point])
+
+    def write_many(self, database, measurement, fields, values, tags={},
+                   time_field=None):
+        """
+        Write many data points, split by the instance holding each series.
+
+        :param str database: Database name to write to
+        :param str measurement: Measurement name to write to
+        :param list fields: List of fields
+        :param list values: List of values (list of lists)
+        :param dict tags: Dictionary of tags to associate with these points
+        :param str time_field: Field to extract and use as the timestamp
+            (optional)
+
+        """
+        from . import InfluxDB
+        points = InfluxDB._make_many_points(measurement, fields, values, tags,
+                                            time_field)
+        self.write_points(database, points)
+
+    def write_points(self, database, points):
+        """
+        Write a list of :class:`~influx.line_protocol.Point`, split by the
+        instance holding each series, sending to each instance in parallel.
+
+        :param str database: Database name to write to
+        :param list points: List of :class:`~influx.line_protocol.Point`
+
+        """
+        shards = collections.OrderedDict()
+        last = None, None
+        client = None
+        for point in points:
+            # Points from the same series (or sharing a tags dict) are routed
+            # once
+            if point.measurement is not last[0] or point.tags is not last[1]:
+                client = self._shard(database, point.key())
+                last = point.measurement, point.tags
+            shards.setdefault(client, []).append(point)
+
+        _parallel([(client.write_points, (database, shard_points))
+                   for client, shard_points in shards.items()])
+
+    def select_recent(self, database, measurement, fields='*', tags=None,
+                      relative_time="15m"):
+        """
+        Return the merged response JSON from querying every instance, see
+        :meth:`InfluxDB.select_recent`.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str fields: Fields to select in query (optional, default `'*'`)
+        :param str tags: Tags to restrict the select by (optional)
+        :param str relative_time: Relative time to now() to query for
+                                  (optional, default `'15m'`)
+
+        """
+        results = self._broadcast('select_recent', database, measurement,
+                                  fields, tags, relative_time)
+        return ShardedInfluxDB._merge(results)
+
+    def select_where(self, database, measurement, fields='*', tags=None,
+                     where=None, desc=False, limit=None):
+        """
+        Return the merged response JSON from querying every instance, see
+        :meth:`InfluxDB.select_where`.
+
+        The *limit* is applied to each instance, and again to the merged
+        series.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+        :param str fields: Fields to select in query (optional, default `'*'`)
+        :param str tags: Tags to restrict the select by (optional)
+        :param str where: Where clause to add (default `'time > now() - 15m'`)
+        :param bool desc: Set this to `True` if you want descending values
+        :param int limit: Limit to this number of rows
+
+        """
+        results = self._broadcast('select_where', database, measurement,
+                                  fields, tags, where, desc, limit)
+        return ShardedInfluxDB._merge(results, desc, limit)
+
+    def show_tags(self, database, measurement):
+        """
+        Return the tag keys of *measurement* across every instance.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+
+        """
+        return _union(self._broadcast('show_tags', database, measurement))
+
+    def show_fields(self, database, measurement):
+        """
+        Return the field keys of *measurement* across every instance.
+
+        :param str database: Database name to query
+        :param str measurement: Measurement name to query
+
+        """
+        return _union(self._broadcast('show_fields', database, measurement))
+
+    def _shard(self, database, key):
+        """ Return the client for the series *key* in *database*. """
+        return self.clients[self.ring.get(database + '\n' + key)]
+
+    def _broadcast(self, method, *args):
+        """ Return the results of calling *method* on every client. """
+        return _parallel([(getattr(client, method), args)
+                          for client in self.clients.values()])
+
+    @staticmethod
+    def _merge(results, desc=False, limit=None):
+        """
+        Return query *results* from several instances merged into one, with
+        the rows of series sharing a name and tags sorted by time.
+
+        :param list results: Result dictionaries as returned by the API
+        :param bool desc: Sort rows by descending time
+        :param int limit: Limit each series to this number of rows
+
+        """
+        from . import InfluxDB
+
+        merged = collections.OrderedDict()
+        for result in results:
+            # Errors are returned as they are
+            if result.get('error', None):
+                return result
+            for statement in result.get('results', None) or []:
+                if statement.get('error', None):
+                    return result
+
+            for series in InfluxDB._unpack_series(result):
+                tags = series.get('tags', None) or {}
+                key = series.get('name', None), tuple(sorted(tags.items()))
+                columns = series.get('columns', None) or []
+                values = series.get('values', None) or []
+
+                entry = merged.get(key, None)
+                if entry is None:
+                    entry = dict(series)
+                    entry['columns'] = list(columns)
+                    entry['values'] = list(values)
+                    merged[key] = entry
+                    continue
+
+                # Instances may not have every field, so the columns are
+                # combined and the rows padded to match
+                if columns != entry['columns']:
+                    for column in columns:
+                        if column not in entry['columns']:
+                            entry['columns'].append(column)
+                    width = len(entry['columns'])
+                    entry['values'] = [row + [None] * (width - len(row))
+                                       for row in entry['values']]
+                    order = [columns.index(c) if c in columns else None
+                             for c in entry['columns']]
+                    values = [[row[i] if i is not None else None
+                               for i in order] for row in values]
+                entry['values'].extend(values)
+
+        for entry in merged.values():
+            if 'time' in entry['columns']:
+                index = entry['columns'].index('time')
+                entry['values'].sort(key=lambda row: row[index],
+                                     reverse=desc)
+            if limit:
+                del entry['values'][limit:]
+
+        statement = {'statement_id': 0}
+        if merged:
+            statement['series'] = list(merged.values())
+        return {'results': [statement]}
+
+
+def _parallel(calls):
+    """
+    Return the results of a list of `(func, args)` calls, made in parallel
+    threads when there is more than one, raising the first exception.
+
+    """
+    if len(calls) == 1:
+        func, args = calls[0]
+        return [func(*args)]
+
+    # The package imports this module, so the helper is imported late
+    from . import _Background
+    threads = [_Background(func, *args) for func, args in calls]
+    return [thread.result() for thread in threads]
+
+
+def _union(lists):
+    """ Return the unique items of *lists*, in order. """
+    seen = set()
+    union = []
+    for items in lists:
+        for item in items:
+            if item not in seen:
+                seen.add(item)
+                union.append(item)
+    return union
@@ -0,0 +1,145 @@
+"""
+# Request templates
+
+This module compiles the `IQL_*` request tuples into templates that build the
+method, URL and body for a request with as little per-call work as possible.
+
+Everything which does not depend on the per-call fields is resolved once: the
+base URL is joined, the client precision is substituted, and static query
+parameters are URL encoded ahead of time.
+
+"""
+# System imports
+from string import Formatter
+try:
+    from urllib import parse
+    from urllib.parse import quote_plus
+except ImportError:
+    import urlparse as parse
+    from urllib import quote_plus
+
+
+def _field_names(template):
+    """ Return the list of replacement field names in *template*. """
+    return [name for _, name, _, _ in Formatter().parse(template)
+            if name is not None]
+
+
+def _join_url(url, path):
+    """
+    Return *path* joined to the base *url*. Unlike :func:`urljoin`, this
+    works for any scheme, such as `http+unix`.
+
+    """
+    scheme, sep, rest = url.partition('://')
+    if not sep:
+        return parse.urljoin(url, path)
+    return scheme + sep + parse.urljoin('//' + rest, path)[2:]
+
+
+def _compile_format(template, precision, direct=False):
+    """
+    Return a 2-tuple of a constant value and a formatter callable for the
+    string *template*. Exactly one of the two will be `None`.
+
+    :param str template: Format string
+    :param str precision: Client precision to substitute ahead of time
+    :param bool direct: Allow single field templates to return the field
+        value as is, without converting it to a string
+
+    """
+    if not template:
+        return template, None
+
+    template = template.replace('{precision}', precision)
+    names = _field_names(template)
+
+    # Nothing left to format, so the value is constant
+    if not names:
+        return template.format(), None
+
+    # Templates which are a single field are looked up directly, which avoids
+    # copying large values (such as line protocol bodies) through format()
+    if direct and len(names) == 1 and template == '{' + names[0] + '}':
+        name = names[0]
+        return None, lambda fields: fields[name]
+
+    return None, lambda fields: template.format(**fields)
+
+
+class Template(object):
+    """
+    A request template compiled from an `IQL_*` tuple for a single client.
+
+    :param tuple influxql: Tuple describing an InfluxQL API request
+    :param str url: InfluxDB API url
+    :param str precision: Client precision
+
+    """
+    __slots__ = [
+            'body',
+            'body_format',
+            'method',
+            'query',
+            'query_format',
+            'url',
+            'url_format',
+            ]
+
+    def __init__(self, influxql, url, precision):
+        method, path, params, data = influxql
+        self.method = method
+
+        # Split off any query string in the path, so the path can be joined
+        # with the base URL once
+        path, _, path_query = path.partition('?')
+        self.url, self.url_format = _compile_format(
+            _join_url(url, path), precision)
+
+        items = parse.parse_qsl(path_query, keep_blank_values=True)
+        if isinstance(params, dict):
+            items.extend(sorted(params.items()))
+        elif params:
+            items.extend((i[0], i[1]) for i in params)
+
+        static = []
+        self.query_format = []
+        for key, value in items:
+            key = quote_plus(key)
+            value, formatter = _compile_format(value, precision)
+            if formatter is None:
+                static.append(key + '=' + quote_plus(value))
+            else:
+                self.query_format.append((key + '=', formatter))
+        self.query = '&'.join(static)
+
+        self.body, self.body_format = _compile_format(data, precision,
+                                                      direct=True)
+
+    def build(self, fields):
+        """
+        Return a 3-tuple of method, url and body for a request.
+
+        :param dict fields: Fields to format the template with
+
+        """
+        query = self.query
+        if self.query_format:
+            query = [query] if query else []
+            for key, formatter in self.query_format:
+                query.append(key + quote_plus(formatter(fields)))
+            query = '&'.join(query)
+
+        if self.url_format is None:
+            url = self.url
+        else:
+            url = self.url_format(fields)
+        if query:
+            url += '?' + query
+
+        if self.body_format is None:
+            body = self.body
+        else:
+            body = self.body_format(fields)
+
+        return self.method, url, body
@@ -0,0 +1,203 @@
+"""
+# UDP transport
+
+This module contains a client which writes line protocol to an InfluxDB UDP
+listener, for high rate metrics where losing the occasional point is cheaper
+than waiting on an HTTP round trip.
+
+"""
+# System imports
+import errno
+import socket
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+# Project imports
+from . import line_protocol
+from .lazy import hashed_singleton
+
+
+# Default InfluxDB UDP listener port
+UDP_PORT = 8089
+
+# Payload bytes per datagram, which fits an Ethernet frame
+MTU = 1400
+
+# Send errors which mean the datagram was dropped locally
+_DROPPED = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS)
+
+
+@hashed_singleton
+class InfluxUDP:
+    """
+    InfluxDB UDP client class
+
+    Writes data points to an InfluxDB UDP listener with non-blocking sends.
+    Nothing is read back, so write errors are not reported, and datagrams
+    which the local network stack has no room for are dropped and counted.
+
+    The database and timestamp precision are set in the listener's
+    configuration, so *precision* must match the listener's `precision`
+    setting, and the *database* argument of the write methods is ignored.
+    This keeps the write methods a drop in replacement for those of
+    :class:`~influx.InfluxDB`.
+
+    :param str url: Listener URL, such as `'udp://127.0.0.1:8089'`
+    :param str precision: Timestamp precision (default `'n'`)
+    :param int mtu: Maximum payload bytes per datagram (default `1400`)
+
+    """
+    __slots__ = [
+            'address',
+            'dropped',
+            'field_schemas',
+            'mtu',
+            'precision',
+            'sent',
+            'socket',
+            'url',
+            '__weakref__',
+            ]
+
+    def __init__(self, url, precision='n', mtu=MTU):
+        parts = urlsplit(url)
+        if parts.scheme != 'udp' or not parts.hostname:
+            raise ValueError("Invalid UDP url {!r}".format(url))
+
+        self.url = url
+        self.precision = precision
+        self.mtu = mtu
+        self.field_schemas = {}
+        self.sent = 0
+        self.dropped = 0
+
+        # Resolve the address once, instead of on every send
+        family, kind, proto, _, self.address = socket.getaddrinfo(
+            parts.hostname, parts.port or UDP_PORT, 0, socket.SOCK_DGRAM)[0]
+        self.socket = socket.socket(family, kind, proto)
+        self.socket.setblocking(False)
+
+    def write(self, database, measurement, fields, tags={}, time=None):
+        """
+        Write a data point.
+
+        :param str database: Ignored, the listener's database is used
+        :param str measurement: Measurement name to write to
+        :param dict fields: Dictionary of fields to write
+        :param dict tags: Dictionary of tags to associate with these points
+        :param datetime time: UTC timestamp to use (optional, defaults to now)
+
+        """
+        # The package imports this module, so the client is imported late
+        from . import InfluxDB
+        lines = InfluxDB._make_lines(
+            measurement, fields, tags, time, precision=self.precision,
+            schema=self.field_schemas.get(measurement, None))
+        self.write_lines(database, lines)
+
+    def write_many(self, database, measurement, fields, values, tags={},
+                   time_field=None):
+        """
+        Write many data points.
+
+        :param str database: Ignored, the listener's database is used
+        :param str measurement: Measurement name to write to
+        :param list fields: List of fields
+        :param list values: List of values (list of lists)
+        :param dict tags: Dictionary of tags to associate with these points
+        :param str time_field: Field to extract and use as the timestamp
+            (optional)
+
+        """
+        from . import InfluxDB
+        lines = InfluxDB._make_many_lines(
+            measurement, fields, values, tags, time_field,
+            precision=self.precision,
+            schema=self.field_schemas.get(measurement, None))
+        self.write_lines(database, lines)
+
+    def write_points(self, database, points):
+        """
+        Write a list of :class:`~influx.line_protocol.Point` objects.
+
+        :param str database: Ignored, the listener's database is used
+        :param list points: List of :class:`~influx.line_protocol.Point`
+
+        """
+        lines = line_protocol.make_lines(points, precision=self.precision,
+                                         schema=self.field_schemas)
+        self.write_lines(database, lines)
+
+    def write_lines(self, database, lines):
+        """
+        Write line protocol *lines*, packed into as few datagrams as fit in
+        the MTU without splitting a line.
+
+        :param str database: Ignored, the listener's database is used
+        :param str lines: Newline separated line protocol lines
+
+        """
+        if not isinstance(lines, bytes):
+            lines = lines.encode('utf-8')
+
+        for datagram in InfluxUDP._datagrams(lines, self.mtu):
+            try:
+                self.socket.sendto(datagram, self.address)
+            except socket.error as err:
+                if err.errno not in _DROPPED:
+                    raise
+                self.dropped += 1
+            else:
+                self.sent += 1
+
+    def set_field_schema(self, measurement, fields, digits=None):
+        """
+        Declare the field types for *measurement*, see
+        :meth:`InfluxDB.set_field_schema`.
+
+        :param str measurement: Measurement name
+        :param dict fields: Field names mapped to types
+        :param dict digits: Float field names mapped to the number of decimal
+            places to write (optional)
+
+        """
+        if fields is None:
+            self.field_schemas.pop(measurement, None)
+            return
+        self.field_schemas[measurement] = line_protocol.Schema(fields, digits)
+
+    def close(self):
+        """ Close the socket. """
+        self.socket.close()
+
+    @staticmethod
+    def _datagrams(payload, mtu):
+        """
+        Return a generator of datagrams of at most *mtu* bytes from
+        *payload*, split only at line endings.
+
+        A single line longer than *mtu* is sent in a datagram on its own.
+
+        :param bytes payload: Newline separated line protocol
+        :param int mtu: Maximum datagram size
+
+        """
+        start = 0
+        size = len(payload)
+        while start < size:
+            end = start + mtu
+            if end >= size:
+                yield payload[start:]
+                return
+
+            cut = payload.rfind(b'\n', start, end)
+            if cut < 0:
+                cut = payload.find(b'\n', end)
+                if cut < 0:
+                    yield payload[start:]
+                    return
+
+            yield payload[start:cut + 1]
+            start = cut + 1
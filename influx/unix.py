@@ -0,0 +1,107 @@
+"""
+# Unix domain socket transport
+
+This module contains a *requests* transport adapter which sends HTTP requests
+over a unix domain socket, for talking to an InfluxDB on the same host without
+going through TCP.
+
+Client URLs for this transport use the `http+unix://` scheme, either with the
+socket path as the URL path (`http+unix:///var/run/influxdb.sock`) or percent
+encoded as the host (`http+unix://%2Fvar%2Frun%2Finfluxdb.sock/`), which also
+allows an API path prefix after it.
+
+"""
+# System imports
+import socket
+try:
+    from urllib.parse import unquote, urlsplit
+except ImportError:
+    from urllib import unquote
+    from urlparse import urlsplit
+
+# 3rd party imports
+import requests
+import urllib3
+
+
+SCHEME = 'http+unix://'
+
+# Host used in request URLs and headers, which InfluxDB ignores
+HOST = 'localhost'
+
+
+def split_url(url):
+    """
+    Return a 2-tuple of the socket path and the base URL for requests from a
+    `http+unix://` *url*.
+
+    :param str url: Client URL
+
+    """
+    parts = urlsplit(url)
+    if parts.netloc:
+        path = unquote(parts.netloc)
+        prefix = parts.path
+    else:
+        path = parts.path
+        prefix = ''
+
+    if not path:
+        raise ValueError("Missing socket path in {!r}".format(url))
+
+    if not prefix.endswith('/'):
+        prefix += '/'
+    return path, SCHEME + HOST + prefix
+
+
+class UnixConnection(urllib3.connection.HTTPConnection):
+    """ HTTP connection over the unix domain socket at *socket_path*. """
+    def __init__(self, *args, **kwargs):
+        self.socket_path = kwargs.pop('socket_path')
+        super(UnixConnection, self).__init__(*args, **kwargs)
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except socket.error as err:
+            sock.close()
+            raise urllib3.exceptions.NewConnectionError(
+                self, "Failed to connect to {}: {}".format(self.socket_path,
+                                                           err))
+        return sock
+
+
+class UnixConnectionPool(urllib3.HTTPConnectionPool):
+    """ Pool of :class:`UnixConnection` objects. """
+    ConnectionCls = UnixConnection
+
+
+class UnixAdapter(requests.adapters.HTTPAdapter):
+    """
+    Transport adapter sending every request through a pool of connections to
+    the unix domain socket at *socket_path*, whatever the request host is.
+
+    :param str socket_path: Path of the socket InfluxDB listens on
+    :param \\*\\*kwargs: Arguments for :class:`requests.adapters.HTTPAdapter`
+
+    """
+    def __init__(self, socket_path, **kwargs):
+        self.socket_path = socket_path
+        super(UnixAdapter, self).__init__(**kwargs)
+        self.pool = UnixConnectionPool(HOST, maxsize=self._pool_maxsize,
+                                       block=self._pool_block,
+                                       socket_path=socket_path)
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None,
+                                        cert=None):
+        return self.pool
+
+    def get_connection(self, url, proxies=None):
+        return self.pool
+
+    def close(self):
+        super(UnixAdapter, self).close()
+        self.pool.close()
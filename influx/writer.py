@@ -0,0 +1,855 @@
+"""
+# Buffered writers
+
+This module contains writers which accept points without waiting on InfluxDB,
+and send them in batches from background threads.
+
+"""
+# System imports
+import collections
+import io
+import logging
+import os
+import threading
+import time
+
+# Project imports
+from . import line_protocol
+
+
+# Overflow policies for a full WriteQueue
+BLOCK = 'block'
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+SPILL = 'spill'
+
+POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST, SPILL)
+
+# Seconds to wait before replaying the spill file again after a failed
+# replay, doubled after each failure up to the maximum
+REPLAY_BACKOFF = 1.0
+MAX_REPLAY_BACKOFF = 60.0
+
+# Aggregates a RollupWriter can keep for each field
+AGGREGATES = ('min', 'max', 'mean', 'sum', 'count', 'last')
+
+# Aggregates kept for fields which are not numbers
+_ANY_AGGREGATES = ('count', 'last')
+
+
+log = logging.getLogger('influx-client')
+
+
+class WriteQueue(object):
+    """
+    Bounded in memory queue of points, written to InfluxDB in batches by
+    background sender threads.
+
+    Producers call :meth:`put` (or :meth:`put_line`), which serializes the
+    point and returns without making a request. When the queue holds
+    *maxsize* points, the *policy* decides what happens to the next one:
+
+    - `'block'` - Wait up to *timeout* seconds for room, then drop the point
+    - `'drop_newest'` - Drop the point being added
+    - `'drop_oldest'` - Drop the oldest queued point to make room
+    - `'spill'` - Append the point to the file at *spill_path*, which is
+      written to InfluxDB by the senders whenever the queue runs empty, and
+      kept if that fails, to be tried again after a backoff
+
+    With *coalesce*, points are queued unserialized, and the points in each
+    batch which share a series and timestamp are merged into one before being
+    serialized, with the last value for each field winning, as it would in
+    InfluxDB.
+
+    With *batching*, the batch size follows an
+    :class:`~influx.batching.AdaptiveBatchSize` instead of *batch_size*, and
+    each write's time or error is recorded with it.
+
+    Sender threads are daemons, so call :meth:`close` (or :meth:`flush`)
+    before exiting to write any points still queued.
+
+    :param InfluxDB client: Client to write with
+    :param int maxsize: Maximum number of points held in memory
+        (default `100000`)
+    :param str policy: Overflow policy (default `'block'`)
+    :param float timeout: Seconds to wait for room with the `'block'` policy
+        (optional, default waits forever)
+    :param int workers: Number of sender threads (default `1`)
+    :param int batch_size: Maximum number of points per write request
+        (default `5000`)
+    :param float flush_interval: Maximum seconds a point waits for a batch to
+        fill before being sent (default `1.0`)
+    :param str spill_path: File to spill points to with the `'spill'` policy
+    :param bool coalesce: Merge points with the same series and timestamp in
+        each batch (default `False`)
+    :param AdaptiveBatchSize batching: Controller to size batches with
+        (optional)
+
+    """
+    __slots__ = [
+            'batch_size',
+            'batching',
+            'client',
+            'coalesce',
+            'counters',
+            'flush_interval',
+            'flushing',
+            'idle',
+            'inflight',
+            'items',
+            'lock',
+            'maxsize',
+            'not_empty',
+            'not_full',
+            'policy',
+            'replay_after',
+            'replay_backoff',
+            'replaying',
+            'spill_lock',
+            'spill_path',
+            'stopped',
+            'threads',
+            'timeout',
+            ]
+
+    def __init__(self, client, maxsize=100000, policy=BLOCK, timeout=None,
+                 workers=1, batch_size=5000, flush_interval=1.0,
+                 spill_path=None, coalesce=False, batching=None):
+        if policy not in POLICIES:
+            raise ValueError("Unknown overflow policy {!r}".format(policy))
+        if policy == SPILL and not spill_path:
+            raise ValueError("The spill policy requires a spill_path")
+
+        self.client = client
+        self.maxsize = maxsize
+        self.policy = policy
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.coalesce = coalesce
+        self.batching = batching
+
+        self.items = collections.deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.idle = threading.Condition(self.lock)
+        self.spill_lock = threading.Lock()
+        self.inflight = 0
+        self.flushing = 0
+        self.replaying = False
+        self.replay_after = 0
+        self.replay_backoff = REPLAY_BACKOFF
+        self.stopped = False
+        self.counters = dict.fromkeys(('queued', 'written', 'dropped',
+                                       'spilled', 'failed', 'coalesced'), 0)
+
+        self.threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, database, measurement, fields, tags=None, time=None):
+        """
+        Return `True` if the point was queued (or spilled), or `False` if it
+        was dropped.
+
+        The point is serialized right away (unless coalescing), using the
+        client precision and any field schema, and *time* defaults to the time
+        of this call.
+
+        :param str database: Database name to write to
+        :param str measurement: Measurement name to write to
+        :param dict fields: Dictionary of fields to write
+        :param dict tags: Dictionary of tags to associate with this point
+        :param datetime time: UTC timestamp to use (optional)
+
+        """
+        client = self.client
+        if self.coalesce:
+            # The point is serialized later, so it gets its own copies of the
+            # caller's dicts, which may be reused for the next point
+            point = client._make_point(measurement, dict(fields),
+                                       dict(tags or {}), time,
+                                       precision=client.precision)
+            return self.put_line(database, point)
+
+        line = client._make_lines(
+            measurement, fields, tags or {}, time, precision=client.precision,
+            schema=client.field_schemas.get(measurement, None))
+        return self.put_line(database, line)
+
+    def put_line(self, database, line):
+        """
+        Return `True` if the line protocol *line* was queued (or spilled), or
+        `False` if it was dropped.
+
+        :param str database: Database name to write to
+        :param str line: Line protocol line, ending with a newline
+
+        """
+        spill = False
+        with self.lock:
+            if self.stopped:
+                raise ValueError("Write queue is closed")
+
+            if len(self.items) >= self.maxsize:
+                if self.policy == BLOCK:
+                    if not self._wait_for_room():
+                        self.counters['dropped'] += 1
+                        return False
+                elif self.policy == DROP_NEWEST:
+                    self.counters['dropped'] += 1
+                    return False
+                elif self.policy == DROP_OLDEST:
+                    self.items.popleft()
+                    self.counters['dropped'] += 1
+                else:
+                    spill = True
+
+            if not spill:
+                self.items.append((database, line))
+                self.counters['queued'] += 1
+                if len(self.items) >= self._batch_size():
+                    self.not_empty.notify()
+                return True
+
+        # Write to disk outside the queue lock, so senders aren't held up
+        self._spill(database, line)
+        return True
+
+    def stats(self):
+        """
+        Return a dict of counters: `'queued'` (points accepted into the
+        queue), `'written'`, `'dropped'`, `'spilled'`, `'failed'` (points
+        in write requests which raised), `'coalesced'` (points merged into
+        another before sending) and `'pending'` (points in memory right now).
+
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats['pending'] = len(self.items) + self.inflight
+        return stats
+
+    def flush(self, timeout=None):
+        """
+        Return `True` once every point queued in memory has been sent, or
+        `False` if that took longer than *timeout* seconds.
+
+        :param float timeout: Seconds to wait (optional, default forever)
+
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.lock:
+            self.flushing += 1
+            self.not_empty.notify_all()
+            try:
+                while self.items or self.inflight:
+                    if not self.threads:
+                        return False
+                    if not _wait(self.idle, deadline):
+                        return False
+            finally:
+                self.flushing -= 1
+        return True
+
+    def close(self, timeout=None):
+        """
+        Stop accepting points, send every point queued in memory and stop the
+        sender threads.
+
+        :param float timeout: Seconds to wait for the senders (optional,
+            default forever)
+
+        """
+        with self.lock:
+            self.stopped = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in self.threads:
+            if deadline is None:
+                thread.join()
+            else:
+                thread.join(max(0, deadline - time.time()))
+
+    def _wait_for_room(self):
+        """ Return `True` once there is room, expecting the lock held. """
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+        while len(self.items) >= self.maxsize:
+            if self.stopped or not _wait(self.not_full, deadline):
+                return False
+        return True
+
+    def _run(self):
+        """ Sender thread main loop. """
+        while True:
+            with self.lock:
+                self._wait_for_batch()
+                if not self.items:
+                    if self.stopped:
+                        self.idle.notify_all()
+                        return
+                    replay = self._should_replay()
+                    batch = None
+                else:
+                    count = min(self._batch_size(), len(self.items))
+                    batch = [self.items.popleft() for _ in range(count)]
+                    self.inflight += count
+                    self.not_full.notify_all()
+
+            if batch is None:
+                if replay:
+                    self._replay()
+                continue
+
+            self._send(batch)
+
+            with self.lock:
+                self.inflight -= len(batch)
+                if not self.items and not self.inflight:
+                    self.idle.notify_all()
+
+    def _wait_for_batch(self):
+        """ Wait for a full batch or the flush interval, expecting the lock
+        held. """
+        deadline = time.time() + self.flush_interval
+        while (len(self.items) < self._batch_size() and not self.stopped and
+                not self.flushing):
+            if not _wait(self.not_empty, deadline):
+                return
+
+    def _send(self, batch, replay=False):
+        """
+        Write a *batch* of `(database, line or point)` items, by database,
+        returning the items which failed to be written.
+
+        Failed items from the spill file (with *replay*) are not counted as
+        failed, since the caller keeps them to be replayed again.
+
+        """
+        unsent = []
+        databases = collections.OrderedDict()
+        for database, item in batch:
+            databases.setdefault(database, []).append(item)
+
+        for database, items in databases.items():
+            try:
+                lines = self._serialize(items)
+                start = time.time()
+                self.client.write_lines(database, lines)
+            except Exception as err:
+                if self.batching is not None:
+                    self.batching.failure(err)
+                # Points rejected by an open circuit breaker are kept in the
+                # spill file, to be replayed once it closes
+                if replay:
+                    log.warning("Failed replaying %s points to %s: %s",
+                                len(items), database, err)
+                    unsent.extend((database, item) for item in items)
+                    continue
+                if self.spill_path and _is_circuit_open(err):
+                    for item in items:
+                        self._spill(database, item)
+                    continue
+                log.exception("Failed writing %s points to %s", len(items),
+                              database)
+                unsent.extend((database, item) for item in items)
+                counter = 'failed'
+            else:
+                if self.batching is not None:
+                    self.batching.success(len(items), time.time() - start)
+                counter = 'written'
+            with self.lock:
+                self.counters[counter] += len(items)
+        return unsent
+
+    def _batch_size(self):
+        """ Return the number of points to send per write request. """
+        if self.batching is not None:
+            return self.batching.size
+        return self.batch_size
+
+    def _serialize(self, items):
+        """ Return line protocol for *items*, coalescing any points. When the
+        client reuses buffers, it is written into this sender's buffer. """
+        lines = []
+        points = []
+        for item in items:
+            if isinstance(item, line_protocol.Point):
+                points.append(item)
+            else:
+                lines.append(item)
+
+        if points:
+            points, merged = line_protocol.coalesce(points)
+            with self.lock:
+                self.counters['coalesced'] += merged
+
+        buffer = self.client._line_buffer()
+        if buffer is None:
+            if points:
+                lines.append(self._make_lines(points))
+            return ''.join(lines)
+
+        for line in lines:
+            buffer.write(line)
+        return line_protocol.make_lines_into(
+            buffer, points, self.client.precision, self.client.field_schemas)
+
+    def _make_lines(self, points):
+        """ Return line protocol for *points* using the client settings. """
+        return line_protocol.make_lines(points,
+                                        precision=self.client.precision,
+                                        schema=self.client.field_schemas)
+
+    def _spill(self, database, line):
+        """ Append *line* (or a point) to the spill file, with each line
+        of it prefixed by *database*. """
+        if isinstance(line, line_protocol.Point):
+            line = self._make_lines([line])
+        records = u''.join(u'{}\t{}\n'.format(database, part)
+                           for part in line.split('\n') if part)
+        with self.spill_lock:
+            with io.open(self.spill_path, 'a', encoding='utf-8') as spill:
+                spill.write(records)
+        with self.lock:
+            self.counters['spilled'] += 1
+
+    def _should_replay(self):
+        """ Return `True` if this sender should replay the spill file,
+        expecting the lock held. """
+        if self.replaying or not self.spill_path:
+            return False
+        breaker = getattr(self.client, 'breaker', None)
+        if breaker is not None and breaker.stats()['state'] == 'open':
+            return False
+        if time.time() < self.replay_after:
+            return False
+        if not os.path.exists(self.spill_path + '.replay'):
+            try:
+                if not os.path.getsize(self.spill_path):
+                    return False
+            except OSError:
+                return False
+        self.replaying = True
+        return True
+
+    def _replay(self):
+        """
+        Send the points in the spill file, in batches.
+
+        If a batch fails, the points not yet written are kept in the replay
+        file and the replay is stopped, to be tried again after a backoff.
+
+        """
+        replay = self.spill_path + '.replay'
+        failed = False
+        try:
+            # Move the spill file aside, so points spilled meanwhile are kept
+            # for the next replay
+            with self.spill_lock:
+                if not os.path.exists(replay):
+                    os.rename(self.spill_path, replay)
+
+            unsent = []
+            batch = []
+            with io.open(replay, 'r', encoding='utf-8') as spill:
+                for line in spill:
+                    database, _, line = line.partition('\t')
+                    batch.append((database, line))
+                    if len(batch) >= self._batch_size():
+                        unsent = self._send(batch, replay=True)
+                        batch = []
+                        if unsent:
+                            break
+                if batch:
+                    unsent = self._send(batch, replay=True)
+                if unsent:
+                    failed = True
+                    self._keep(replay, unsent, spill)
+            if not failed:
+                os.remove(replay)
+        except (IOError, OSError):
+            failed = True
+            log.exception("Failed replaying %s", replay)
+        finally:
+            with self.lock:
+                self.replaying = False
+                if failed:
+                    self.replay_after = time.time() + self.replay_backoff
+                    self.replay_backoff = min(MAX_REPLAY_BACKOFF,
+                                              self.replay_backoff * 2)
+                else:
+                    self.replay_backoff = REPLAY_BACKOFF
+
+    @staticmethod
+    def _keep(replay, unsent, spill):
+        """ Rewrite the *replay* file with the *unsent* items followed by
+        the lines left in the open *spill* file. """
+        with io.open(replay + '.tmp', 'w', encoding='utf-8') as kept:
+            kept.write(u''.join(u'{}\t{}'.format(database, line)
+                                for database, line in unsent))
+            for line in spill:
+                kept.write(line)
+        os.rename(replay + '.tmp', replay)
+
+
+class RollupWriter(object):
+    """
+    Writer which aggregates points into fixed time windows in memory, and
+    writes one point per series and window instead of every point.
+
+    Each window is written through the client with one field per aggregate,
+    named `<field>_<aggregate>` (such as `value_mean`), and the window start
+    as its time. Fields which are not numbers only get `count` and `last`.
+
+    A window is written once a point at least *lateness* past its end has
+    been seen. Points for a window which has already been written are late,
+    and are dropped and counted, since writing them would replace the
+    window's aggregates. When more than *max_series* series and windows are
+    held, the oldest windows are written early to bound memory. Windows
+    which fail to be written are logged, counted and kept, and are written
+    again along with the next windows to close.
+
+    Windows are only written as newer points arrive, so call :meth:`close`
+    (or :meth:`flush` with *force*) when done writing.
+
+    :param InfluxDB client: Client to write with
+    :param interval: Window length in seconds, or as an InfluxQL duration
+        (default `60`)
+    :param tuple aggregates: Aggregates to keep (default all of `'min'`,
+        `'max'`, `'mean'`, `'sum'`, `'count'` and `'last'`)
+    :param lateness: How long past the end of a window to wait for points,
+        in seconds or as an InfluxQL duration (default `0`)
+    :param int max_series: Maximum series and window pairs held in memory
+        (default `100000`)
+
+    """
+    __slots__ = [
+            'aggregates',
+            'client',
+            'closed',
+            'convert',
+            'counters',
+            'interval',
+            'lateness',
+            'lock',
+            'max_series',
+            'open',
+            'watermark',
+            'windows',
+            ]
+
+    def __init__(self, client, interval=60, aggregates=AGGREGATES,
+                 lateness=0, max_series=100000):
+        for aggregate in aggregates:
+            if aggregate not in AGGREGATES:
+                raise ValueError("Unknown aggregate {!r}".format(aggregate))
+
+        self.client = client
+        self.aggregates = tuple(aggregates)
+        self.interval = line_protocol._duration_units(interval,
+                                                      client.precision)
+        self.lateness = line_protocol._duration_units(lateness,
+                                                      client.precision)
+        self.max_series = max_series
+        if self.interval < 1:
+            raise ValueError("Interval is shorter than the client precision")
+
+        self.convert = line_protocol.timestamp_converter(client.precision)
+        self.lock = threading.Lock()
+        # window start -> {(database, measurement, tags): {field: state}}
+        self.windows = {}
+        # Number of series and window pairs held
+        self.open = 0
+        # Latest timestamp seen, and the start of the first window still open
+        self.watermark = None
+        self.closed = None
+        self.counters = dict.fromkeys(('points', 'late', 'written',
+                                       'failed', 'evicted'), 0)
+
+    def write(self, database, measurement, fields, tags={}, time=None):
+        """
+        Add a data point to its window.
+
+        :param str database: Database name to write to
+        :param str measurement: Measurement name to write to
+        :param dict fields: Dictionary of fields to write
+        :param dict tags: Dictionary of tags to associate with this point
+        :param datetime time: UTC timestamp to use (optional, defaults to now)
+
+        """
+        point = self.client._make_point(measurement, fields, tags, time,
+                                        precision=self.client.precision)
+        self.write_points(database, [point])
+
+    def write_many(self, database, measurement, fields, values, tags={},
+                   time_field=None):
+        """
+        Add many data points to their windows.
+
+        :param str database: Database name to write to
+        :param str measurement: Measurement name to write to
+        :param list fields: List of fields
+        :param list values: List of values (list of lists)
+        :param dict tags: Dictionary of tags to associate with these points
+        :param str time_field: Field to extract and use as the timestamp
+            (optional, defaults to now)
+
+        """
+        points = self.client._make_many_points(measurement, fields, values,
+                                               tags, time_field)
+        self.write_points(database, points)
+
+    def write_points(self, database, points):
+        """
+        Add a list of :class:`~influx.line_protocol.Point` to their windows.
+
+        :param str database: Database name to write to
+        :param list points: List of :class:`~influx.line_protocol.Point`
+
+        """
+        precision = self.client.precision
+        closed = []
+        with self.lock:
+            for point in points:
+                stamp = point.time
+                if stamp is None:
+                    stamp = line_protocol.now(precision)
+                closed.extend(self._add(database, point, self.convert(stamp)))
+        self._write(closed)
+
+    def flush(self, force=False):
+        """
+        Write every window which is complete, or every window if *force* is
+        set. Points for force written windows which arrive later are late.
+
+        :param bool force: Write windows which are still open
+
+        """
+        with self.lock:
+            if force:
+                closed = self._close(None)
+            else:
+                closed = []
+        self._write(closed)
+
+    def close(self):
+        """ Write every window, including those still open. """
+        self.flush(force=True)
+
+    def stats(self):
+        """
+        Return a dict of counters: `'points'` (points added), `'late'`
+        (points dropped for windows already written), `'written'`
+        (aggregated points written), `'failed'` (aggregated points whose
+        write raised, kept to be written again), `'evicted'` (windows written
+        early to bound memory) and `'open'` (series and window pairs held).
+
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats['open'] = self.open
+        return stats
+
+    def _add(self, database, point, stamp):
+        """
+        Add *point* at *stamp* to its window, returning a list of windows
+        closed by it, expecting the lock held.
+
+        """
+        closed = []
+        self.counters['points'] += 1
+
+        # Moving the watermark on closes every window it is far enough past
+        if self.watermark is None or stamp > self.watermark:
+            self.watermark = stamp
+            boundary = self._start(stamp - self.lateness)
+            if self.closed is None or boundary > self.closed:
+                closed.extend(self._close(boundary))
+
+        start = self._start(stamp)
+        if self.closed is not None and start < self.closed:
+            self.counters['late'] += 1
+            return closed
+
+        measurement = point.measurement
+        tags = point.tags
+        if isinstance(measurement, line_protocol.Series):
+            if tags:
+                tags = dict(measurement.tags, **tags)
+            else:
+                tags = measurement.tags
+            measurement = measurement.measurement
+        key = (database, measurement,
+               tuple(sorted(tags.items())) if tags else ())
+
+        window = self.windows.get(start, None)
+        if window is None:
+            window = self.windows[start] = {}
+        fields = window.get(key, None)
+        if fields is None:
+            fields = window[key] = {}
+            self.open += 1
+
+        for field, value in point.fields.items():
+            if value is None:
+                continue
+            state = fields.get(field, None)
+            if state is None:
+                # min, max, sum, count, last, count of numbers
+                state = fields[field] = [None, None, None, 0, None, 0]
+            state[3] += 1
+            state[4] = value
+            # Booleans are ints, but only numbers are aggregated
+            if (not isinstance(value, (int, float)) or
+                    isinstance(value, bool)):
+                continue
+            if state[5]:
+                if value < state[0]:
+                    state[0] = value
+                if value > state[1]:
+                    state[1] = value
+                state[2] += value
+            else:
+                state[0] = state[1] = state[2] = value
+            state[5] += 1
+
+        # Write the oldest windows early if we're holding too much
+        while self.open > self.max_series and len(self.windows) > 1:
+            boundary = min(self.windows) + self.interval
+            self.counters['evicted'] += 1
+            closed.extend(self._close(boundary))
+
+        return closed
+
+    def _start(self, stamp):
+        """ Return the start of the window holding *stamp*. """
+        return stamp - stamp % self.interval
+
+    def _close(self, boundary):
+        """
+        Return a list of `(start, window)` for windows starting before
+        *boundary* (or all windows), removing them, expecting the lock held.
+
+        """
+        if boundary is None:
+            if not self.windows:
+                return []
+            boundary = max(self.windows) + self.interval
+
+        closed = []
+        for start in sorted(self.windows):
+            if start >= boundary:
+                break
+            window = self.windows.pop(start)
+            self.open -= len(window)
+            closed.append((start, window))
+
+        if self.closed is None or boundary > self.closed:
+            self.closed = boundary
+        return closed
+
+    def _write(self, closed):
+        """ Write aggregated points for closed windows, by database. """
+        if not closed:
+            return
+
+        # database -> ([point], [(start, key, fields)])
+        databases = collections.OrderedDict()
+        for start, window in closed:
+            for key, fields in window.items():
+                database, measurement, tags = key
+                values = {}
+                for field, state in fields.items():
+                    for aggregate in self.aggregates:
+                        value = _aggregate(aggregate, state)
+                        if value is not None:
+                            values[field + '_' + aggregate] = value
+                point = line_protocol.Point(measurement, values, dict(tags),
+                                            start)
+                points, entries = databases.setdefault(database, ([], []))
+                points.append(point)
+                entries.append((start, key, fields))
+
+        for database, (points, entries) in databases.items():
+            try:
+                self.client.write_points(database, points)
+            except Exception:
+                log.exception("Failed writing %s rollup points to %s",
+                              len(points), database)
+                self._restore(entries)
+                with self.lock:
+                    self.counters['failed'] += len(points)
+                continue
+            with self.lock:
+                self.counters['written'] += len(points)
+
+    def _restore(self, entries):
+        """
+        Put the windows of a failed write back, to be written when the next
+        windows close. Points for them are still late, since they were
+        closed.
+
+        """
+        with self.lock:
+            for start, key, fields in entries:
+                window = self.windows.get(start, None)
+                if window is None:
+                    window = self.windows[start] = {}
+                if key not in window:
+                    self.open += 1
+                window[key] = fields
+
+
+def _aggregate(aggregate, state):
+    """ Return the value of *aggregate* from a field's rollup *state*. """
+    if aggregate == 'count':
+        return state[3]
+    if aggregate == 'last':
+        return state[4]
+    if state[2] is None:
+        return None
+    if aggregate == 'min':
+        return state[0]
+    if aggregate == 'max':
+        return state[1]
+    if aggregate == 'sum':
+        return state[2]
+    return state[2] / float(state[5])
+
+
+def _is_circuit_open(err):
+    """ Return `True` if *err* is a circuit breaker rejection. """
+    # Only clients with a breaker raise these, so the module is imported late
+    from .breaker import CircuitOpenError
+    return isinstance(err, CircuitOpenError)
+
+
+def _wait(condition, deadline):
+    """
+    Wait on *condition* until notified or *deadline*, returning `False` if the
+    deadline has passed.
+
+    :param threading.Condition condition: Condition, with its lock held
+    :param float deadline: Time to wait until, or `None` to wait forever
+
+    """
+    if deadline is None:
+        condition.wait()
+        return True
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        return False
+    condition.wait(remaining)
+    return True
@@ -15,6 +15,9 @@ See [GitHub](https://github.com/AxiomExergy/influx-client) for documentation.
 
 # Used for installing test dependencies directly
 tests_require = [
+    'pytool',
+    'msgpack',
+    'pyarrow',
     'mock',
     'nose',
     'flake8',
@@ -33,14 +36,19 @@ setup(
     author_email="shakefu@gmail.com",
     packages=find_packages(exclude=['test', 'test_*', 'fixtures']),
     install_requires=[
-        'pytool',
         'requests',
-        'simplejson',
         ],
     test_suite='nose.collector',
     tests_require=tests_require,
-    # For installing test dependencies directly
-    extras_require={'test': tests_require},
+    # For installing test and optional dependencies directly
+    extras_require={
+        'test': tests_require,
+        'msgpack': ['msgpack'],
+        'arrow': ['pyarrow'],
+        },
+    entry_points={
+        'console_scripts': ['influx-bulk=influx.bulk:main'],
+        },
     keywords=['influx-client', 'database', 'influx', 'influxdb', 'client'],
     classifiers=[
         'Development Status :: 5 - Production/Stable',
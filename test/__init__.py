@@ -3,10 +3,13 @@
 
 """
 # System imports
+import io
 import os
+import sys
 import math
 import time
 import datetime
+import subprocess
 
 # 3rd party imports
 import pytool
@@ -532,7 +535,7 @@ def test_safe_request():
     select.status_code = 200
     select.json.return_value = '200 OK'
 
-    with mock.patch.object(client.session, 'request') as request:
+    with mock.patch.object(client.session, 'send') as request:
         request.side_effect = [
             missing_db, created_db, select
         ]
@@ -917,3 +920,1917 @@ def test_missing_tags():
     _, orig_values = client.unpack(resp)
 
     eq_(len(values), len(orig_values))
+
+
+def _mock_response(data, status_code=200):
+    """ Helper to return a mock response object returning *data* as JSON. """
+    resp = mock.MagicMock()
+    resp.status_code = status_code
+    resp.json.return_value = data
+    return resp
+
+
+def test_warm_schema():
+    client = influx.client(_get_url(), schema_ttl=60)
+    client.schema.clear()
+
+    tags = _mock_response({'results': [{'statement_id': 0, 'series': [
+        {'name': 'cpu', 'columns': ['tagKey'], 'values': [['host']]},
+        {'name': 'mem', 'columns': ['tagKey'],
+         'values': [['host'], ['region']]},
+        ]}]})
+    fields = _mock_response({'results': [{'statement_id': 0, 'series': [
+        {'name': 'cpu', 'columns': ['fieldKey', 'fieldType'],
+         'values': [['idle', 'float'], ['count', 'integer']]},
+        {'name': 'mem', 'columns': ['fieldKey', 'fieldType'],
+         'values': [['free', 'integer']]},
+        {'name': 'disk', 'columns': ['fieldKey', 'fieldType'],
+         'values': [['used', 'integer']]},
+        ]}]})
+    written = _mock_response({'results': [{'statement_id': 0, 'series': [
+        {'name': 'new', 'columns': ['tagKey'], 'values': [['host']]},
+        ]}]})
+
+    with mock.patch.object(client.session, 'send') as request:
+        request.side_effect = [tags, fields, written]
+        client.warm_schema('db')
+
+        eq_(client.show_tags('db', 'cpu'), ['host'])
+        eq_(client.show_tags('db', 'mem'), ['host', 'region'])
+        eq_(client.show_fields('db', 'cpu'), ['idle', 'count'])
+        eq_(client.show_field_types('db', 'cpu'),
+            {'idle': 'float', 'count': 'integer'})
+        eq_(client.show_tags('db', 'disk'), [])
+        eq_(len(request.call_args_list), 2)
+
+        # Not returned by the warm-up, so it may have been written since
+        eq_(client.show_tags('db', 'new'), ['host'])
+        eq_(len(request.call_args_list), 3)
+
+        ok_(request.call_args_list[0][0][0].url.endswith(
+            'q=SHOW+TAG+KEYS&db=db'))
+        ok_(request.call_args_list[1][0][0].url.endswith(
+            'q=SHOW+FIELD+KEYS&db=db'))
+
+
+def test_schema_invalidated_by_drop_measurement():
+    client = influx.client(_get_url(), schema_ttl=60)
+    client.schema.clear()
+
+    client.schema.set_tags('db', 'cpu', ['host'])
+    eq_(client.show_tags('db', 'cpu'), ['host'])
+
+    dropped = _mock_response({'results': [{'statement_id': 0}]})
+    tags = _mock_response({'results': [{'statement_id': 0, 'series': [
+        {'name': 'cpu', 'columns': ['tagKey'], 'values': [['region']]},
+        ]}]})
+
+    with mock.patch.object(client.session, 'send') as request:
+        request.side_effect = [dropped, tags]
+        client.drop_measurement('cpu', 'db')
+        eq_(client.show_tags('db', 'cpu'), ['region'])
+        eq_(len(request.call_args_list), 2)
+
+
+def test_schema_cache_disabled_by_default():
+    client = influx.client(_get_url())
+
+    client.schema.set_tags('db', 'cpu', ['host'])
+    eq_(client.schema.get_tags('db', 'cpu'), None)
+
+
+def test_make_request_template():
+    client = influx.client(_get_url())
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        client.write('my db', 'test_measurement', {'value': 1.0},
+                     time=1521241703.097608)
+        client.write('other', 'test_measurement', {'value': 2.0},
+                     time=1521241703.097608)
+
+        first, second = [c[0][0] for c in send.call_args_list]
+        eq_(first.method, 'POST')
+        eq_(first.url, _get_url() + '/write?precision=u&db=my+db')
+        eq_(first.body, b'test_measurement value=1.0 1521241703097608\n')
+        eq_(second.url, _get_url() + '/write?precision=u&db=other')
+        eq_(send.call_args_list[0][1]['timeout'], 60)
+
+    # Each IQL template is only compiled once per client
+    template = client._template(influx.IQL_WRITE)
+    ok_(client._template(influx.IQL_WRITE) is template)
+
+
+def test_make_request_template_query():
+    client = influx.client(_get_url())
+
+    template = client._template(influx.IQL_SELECT)
+    method, url, body = template.build({
+        'database': 'db', 'measurement': 'm', 'fields': '*',
+        'where': "time > now() - 1h"})
+
+    eq_(method, 'GET')
+    eq_(url, _get_url() + '/query?epoch=u&db=db&q=SELECT+%2A+FROM+m+WHERE+'
+        'time+%3E+now%28%29+-+1h')
+    eq_(body, '')
+
+
+def test_import_is_lazy():
+    # Importing the package must not pull in the HTTP stack or pytool
+    script = ("import sys, influx, influx.line_protocol; "
+              "print(','.join(m for m in ('requests', 'simplejson', 'pytool')"
+              " if m in sys.modules))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    loaded = subprocess.check_output([sys.executable, '-c', script], cwd=root)
+
+    eq_(loaded.decode('utf-8').strip(), '')
+
+
+def test_hashed_singleton():
+    client = influx.InfluxDB(_get_url())
+
+    ok_(client is influx.InfluxDB(_get_url()))
+    ok_(client is not influx.InfluxDB(_get_url(), 30))
+    ok_(influx.InfluxDB._make_lines is not None)
+
+
+def test_make_lines_points():
+    make_lines = influx.line_protocol.make_lines
+    series = influx.Series('test_series', {'tag1': 'a b', 'tag0': 'z'})
+    points = [
+            series.point({'value': 1.0}, 1000),
+            series.point({'value': 2.0}, 2000, {'extra': 'yes'}),
+            influx.Point('other', {'value': 3}, {'tag1': 'c'}),
+            ]
+
+    lines = make_lines(points)
+
+    eq_(lines, 'test_series,tag0=z,tag1=a\\ b value=1.0 1000\n'
+        'test_series,extra=yes,tag0=z,tag1=a\\ b value=2.0 2000\n'
+        'other,tag1=c value=3\n')
+
+
+def test_make_lines_points_match_dicts():
+    make_lines = influx.line_protocol.make_lines
+    data = {
+            'tags': {'host': 'server01'},
+            'points': [{
+                'measurement': 'cpu',
+                'fields': {'idle': 0.5, 'user': 3},
+                'tags': {'core': '1'},
+                'time': 1521241703.097608,
+                }],
+            }
+    series = influx.Series('cpu', {'host': 'server01'})
+    point = series.point({'idle': 0.5, 'user': 3}, 1521241703.097608,
+                         {'core': '1'})
+
+    eq_(make_lines([point], 'u'), make_lines(data, 'u'))
+
+
+def test_write_points():
+    client = influx.client(_get_url())
+    series = influx.Series('test_measurement', {'host': 'a'})
+    points = [series.point({'value': i}, i) for i in range(1, 3)]
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        eq_(client.write_points('test', points), None)
+
+        eq_(send.call_args[0][0].body,
+            b'test_measurement,host=a value=1 1\n'
+            b'test_measurement,host=a value=2 2\n')
+
+
+def test_make_lines_schema():
+    make_lines = influx.line_protocol.make_lines
+    schema = influx.line_protocol.Schema(
+        {'value': 'float', 'count': 'integer', 'ok': 'boolean',
+         'name': 'string', 'rounded': float}, digits={'rounded': 2})
+    series = influx.Series('typed', schema=schema)
+    point = series.point({'value': 1, 'count': 2.0, 'ok': 1, 'name': 3,
+                          'rounded': 1.23456, 'other': 4, 'empty': None})
+
+    eq_(make_lines([point]), 'typed count=2i,name="3",ok=true,other=4,'
+        'rounded=1.23,value=1.0\n')
+
+
+@raises(ValueError)
+def test_make_lines_schema_unknown_type():
+    influx.line_protocol.Schema({'value': 'decimal'})
+
+
+def test_make_many_lines_with_field_schema():
+    client = influx.client(_get_url())
+    client.set_field_schema('test_typed', {'alpha': 'integer'})
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        client.write_many('test', 'test_typed', ['alpha', 'beta'],
+                          [[1, 2], [3, 4]])
+        client.set_field_schema('test_typed', None)
+        client.write_many('test', 'test_typed', ['alpha', 'beta'],
+                          [[1, 2]])
+
+        eq_(send.call_args_list[0][0][0].body,
+            b'test_typed alpha=1i,beta=2\ntest_typed alpha=3i,beta=4\n')
+        eq_(send.call_args_list[1][0][0].body, b'test_typed alpha=1,beta=2\n')
+
+
+def test_convert_timestamp_datetime_exact():
+    convert = influx.line_protocol.timestamp_converter('n')
+    stamp = datetime.datetime(2018, 3, 16, 23, 8, 23, 97608,
+                              tzinfo=pytool.time.UTC())
+
+    eq_(convert(stamp), 1521241703097608000)
+    eq_(influx.line_protocol.timestamp_converter('u')(stamp),
+        1521241703097608)
+    eq_(influx.line_protocol.timestamp_converter('m')(stamp), 25354028)
+
+
+def test_convert_timestamp_naive_datetime():
+    convert = influx.line_protocol.timestamp_converter('u')
+    stamp = datetime.datetime(2018, 3, 16, 23, 8, 23, 97608)
+
+    eq_(convert(stamp), int(round(pytool.time.toutctimestamp(stamp) * 1e6)))
+
+
+def test_convert_timestamps_bulk():
+    convert_timestamps = influx.line_protocol.convert_timestamps
+
+    eq_(convert_timestamps([1521241703097608192], 'u'), [1521241703097608])
+    eq_(convert_timestamps([1521241703], 'ms', unit='s'), [1521241703000])
+
+
+def test_now_precision():
+    now = influx.line_protocol.now
+    expected = pytool.time.toutctimestamp(pytool.time.utcnow())
+
+    ok_(abs(now('s') - expected) < 2)
+    ok_(abs(now('ms') / 1e3 - expected) < 2)
+
+
+def _fake_select(rows, columns=('time', 'value')):
+    """
+    Return a fake session send function answering SELECT queries from *rows*,
+    honoring `time >= ...`, `time <= ...`, `ORDER BY time DESC`, `LIMIT` and
+    `OFFSET`.
+
+    """
+    import re
+    from influx.template import parse
+
+    def send(request, **kwargs):
+        query = dict(parse.parse_qsl(parse.urlsplit(request.url).query))['q']
+        result = sorted(rows, key=lambda r: r[0])
+        if 'DESC' in query:
+            result = result[::-1]
+        match = re.search(r'time (>=|<=) (\d+)', query)
+        if match:
+            cursor = int(match.group(2))
+            if match.group(1) == '>=':
+                result = [r for r in result if r[0] >= cursor]
+            else:
+                result = [r for r in result if r[0] <= cursor]
+        match = re.search(r'OFFSET (\d+)', query)
+        if match:
+            result = result[int(match.group(1)):]
+        match = re.search(r'LIMIT (\d+)', query)
+        if match:
+            result = result[:int(match.group(1))]
+        send.queries.append(query)
+        series = {'name': 'm', 'columns': list(columns), 'values': result}
+        return _mock_response({'results': [{'statement_id': 0,
+                                            'series': [series]}]})
+
+    send.queries = []
+    return send
+
+
+def test_paginate():
+    client = influx.client(_get_url())
+    # Duplicate timestamps across every page boundary
+    rows = [[1, 'a'], [2, 'b'], [2, 'c'], [3, 'd'], [3, 'e'], [3, 'f'],
+            [3, 'g'], [4, 'h'], [5, 'i']]
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = _fake_select(rows)
+        pages = list(client.paginate('db', 'm', where='time > 0',
+                                     page_size=2))
+
+    eq_([row for _, values in pages for row in values], rows)
+    ok_(all(columns == ['time', 'value'] for columns, _ in pages))
+    ok_('(time > 0) AND time >= 2u' in send.side_effect.queries[1])
+
+
+def test_paginate_desc_prefetch():
+    client = influx.client(_get_url())
+    rows = [[i // 2, str(i)] for i in range(25)]
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = _fake_select(rows)
+        pages = list(client.paginate('db', 'm', where='time > 0',
+                                     page_size=4, desc=True, prefetch=True))
+
+    values = [row for _, page in pages for row in page]
+    eq_(sorted(values), sorted(rows))
+    eq_([r[0] for r in values], sorted([r[0] for r in rows], reverse=True))
+
+
+def test_paginate_long_run():
+    client = influx.client(_get_url())
+    # One timestamp shared by more rows than the warning threshold
+    rows = [[1, 'a']] + [[2, str(i)] for i in range(55)] + [[3, 'z']]
+
+    with mock.patch.object(client.session, 'send') as send, \
+            mock.patch.object(influx, 'RUN_PAGES_WARNING', 4), \
+            mock.patch.object(influx.log, 'warning') as warning:
+        send.side_effect = _fake_select(rows)
+        pages = list(client.paginate('db', 'm', where='time > 0',
+                                     page_size=10))
+
+    eq_([row for _, values in pages for row in values], rows)
+    queries = send.side_effect.queries
+    ok_(all('LIMIT 10' in query for query in queries))
+    ok_('LIMIT 10 OFFSET 39' in queries[4])
+    eq_(warning.call_count, 1)
+
+
+def test_nice_interval():
+    _nice_interval = influx.InfluxDB._nice_interval
+
+    eq_(_nice_interval(0.0004), '1ms')
+    eq_(_nice_interval(0.3), '500ms')
+    eq_(_nice_interval(3), '5s')
+    eq_(_nice_interval(86.4), '2m')
+    eq_(_nice_interval(3600), '1h')
+    eq_(_nice_interval(50000), '1d')
+    eq_(_nice_interval(700000), '2w')
+
+
+def test_parse_duration():
+    _parse_duration = influx.InfluxDB._parse_duration
+
+    eq_(_parse_duration('15m'), 900)
+    eq_(_parse_duration('1h30m'), 5400)
+    eq_(_parse_duration('500ms'), 0.5)
+
+
+def test_duration_units():
+    from influx.line_protocol import _duration_units
+    eq_(_duration_units(90, 's'), 90)
+    eq_(_duration_units('1m30s', 'ms'), 90000)
+    eq_(_duration_units(0.5, 's'), 0)
+    eq_(_duration_units('500ms'), 500000000)
+
+
+@raises(ValueError)
+def test_parse_duration_invalid():
+    influx.InfluxDB._parse_duration('1 hour')
+
+
+def test_select_aggregate():
+    client = influx.client(_get_url())
+    result = {'results': [{'statement_id': 0, 'series': [
+        {'name': 'm', 'tags': {'host': 'a'}, 'columns': ['time', 'mean_value'],
+         'values': [[0, 1.5], [60000000, 2.5]]},
+        {'name': 'm', 'tags': {'host': 'b'}, 'columns': ['time', 'mean_value'],
+         'values': [[0, 3.5]]},
+        ]}]}
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(result)
+        series = client.select_aggregate('db', 'm', start='1d',
+                                         tags={'env': 'prod'},
+                                         group_by_tags=['host'], fill='none')
+
+        query = influx.template.parse.parse_qs(influx.template.parse.urlsplit(
+            send.call_args[0][0].url).query)['q'][0]
+
+    eq_(query, 'SELECT mean("value") AS "mean_value" FROM m WHERE '
+        'time > now() - 1d AND "env"=\'prod\' GROUP BY time(2m), "host" '
+        'fill(none)')
+    eq_(series, [('m', {'host': 'a'}, ['time', 'mean_value'],
+                  [[0, 1.5], [60000000, 2.5]]),
+                 ('m', {'host': 'b'}, ['time', 'mean_value'], [[0, 3.5]])])
+
+
+def test_select_aggregate_time_range():
+    client = influx.client(_get_url())
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response({'results': [{'statement_id': 0}]})
+        series = client.select_aggregate(
+            'db', 'm', fields={'value': ['min', 'max']}, start=1000.0,
+            end=4600.0, points=60, where='"host" = \'a\'')
+
+        query = influx.template.parse.parse_qs(influx.template.parse.urlsplit(
+            send.call_args[0][0].url).query)['q'][0]
+
+    eq_(query, 'SELECT min("value") AS "min_value", max("value") AS '
+        '"max_value" FROM m WHERE time >= 1000000000u AND time < 4600000000u '
+        'AND ("host" = \'a\') GROUP BY time(1m)')
+    eq_(series, [])
+
+
+def test_select_aggregate_int_seconds():
+    client = influx.client(_get_url())
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response({'results': [{'statement_id': 0}]})
+        client.select_aggregate('db', 'm', start=1500000000, end=1500003600,
+                                points=60)
+        client.select_aggregate('db', 'm', start=u'1h', points=60)
+
+        queries = [influx.template.parse.parse_qs(
+            influx.template.parse.urlsplit(call[0][0].url).query)['q'][0]
+            for call in send.call_args_list]
+
+    eq_(queries[0], 'SELECT mean("value") AS "mean_value" FROM m WHERE '
+        'time >= 1500000000000000u AND time < 1500003600000000u '
+        'GROUP BY time(1m)')
+    eq_(queries[1], 'SELECT mean("value") AS "mean_value" FROM m WHERE '
+        'time > now() - 1h GROUP BY time(1m)')
+
+
+@raises(ValueError)
+def test_select_aggregate_needs_range():
+    client = influx.client(_get_url())
+    client.select_aggregate('db', 'm', where="time > '2018-01-01'")
+
+
+def _stream_response(body, status_code=200):
+    """ Helper to return a real response object streaming *body*. """
+    import requests
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp.raw = io.BytesIO(body)
+    return resp
+
+
+def test_select_where_csv():
+    client = influx.client(_get_url())
+    body = (b'name,tags,time,value,note\n'
+            b'm,,1000,1.5,"a, b"\n'
+            b'm,,2000,2.5,"multi\nline"\n')
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _stream_response(body)
+        rows = client.select_where('db', 'm', where='time > 0', format='csv')
+        rows = list(rows)
+
+        request = send.call_args[0][0]
+        eq_(request.headers['Accept'], 'application/csv')
+        eq_(send.call_args[1]['stream'], True)
+
+    eq_(rows, [['name', 'tags', 'time', 'value', 'note'],
+               ['m', '', '1000', '1.5', 'a, b'],
+               ['m', '', '2000', '2.5', 'multi\nline']])
+
+
+def test_select_recent_csv_output():
+    client = influx.client(_get_url())
+    body = b'name,tags,time,value\n' + b'm,,1000,1.5\n' * 1000
+    output = io.BytesIO()
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _stream_response(body)
+        size = client.select_recent('db', 'm', format='csv', output=output)
+
+    eq_(size, len(body))
+    eq_(output.getvalue(), body)
+
+
+def test_read_csv_small_chunks():
+    body = b'name,tags,time,value\nm,,1000,"x\ny"\nm,,2000,2\n'
+    rows = influx.formats.read_csv(_stream_response(body), chunk_size=3)
+
+    eq_(list(rows), [['name', 'tags', 'time', 'value'],
+                     ['m', '', '1000', 'x\ny'], ['m', '', '2000', '2']])
+
+
+@raises(ValueError)
+def test_select_where_unknown_format():
+    client = influx.client(_get_url())
+    client.select_where('db', 'm', format='xml')
+
+
+def test_read_msgpack():
+    import msgpack
+    result = {'results': [
+        {'statement_id': 0, 'series': [
+            {'name': 'm', 'columns': ['time', 'value'],
+             'values': [[1000, 1.5], [2000, 2.5]]}]},
+        {'statement_id': 1, 'series': []},
+        ]}
+    data = msgpack.packb(result, use_bin_type=True)
+
+    eq_(influx.formats.read_msgpack(data), {'results': [
+        {'statement_id': 0, 'series': [
+            {'name': 'm', 'columns': ['time', 'value'],
+             'values': [[1000, 1.5], [2000, 2.5]]}]},
+        {'statement_id': 1},
+        ]})
+
+
+def test_read_msgpack_time():
+    import msgpack
+    import struct
+    stamp = msgpack.ExtType(5, struct.pack('>qi', 1521241703, 97608192))
+    data = msgpack.packb({'results': [{'statement_id': 0, 'series': [
+        {'name': 'm', 'columns': ['time'], 'values': [[stamp]]}]}]})
+
+    result = influx.formats.read_msgpack(data)
+    eq_(result['results'][0]['series'][0]['values'],
+        [['2018-03-16T23:08:23.097608192Z']])
+
+
+def test_msgpack_client():
+    import msgpack
+    client = influx.client(_get_url(), msgpack=True)
+    body = msgpack.packb({'results': [{'statement_id': 0, 'series': [
+        {'name': 'm', 'columns': ['tagKey'], 'values': [['host']]}]}]})
+    resp = _stream_response(body)
+    resp.headers['Content-Type'] = 'application/x-msgpack'
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = resp
+        eq_(client.show_tags('db', 'm'), ['host'])
+        eq_(send.call_args[0][0].headers['Accept'], 'application/x-msgpack')
+
+
+def test_select_where_msgpack_json_fallback():
+    client = influx.client(_get_url())
+    resp = _stream_response(b'{"results": [{"statement_id": 0}]}')
+    resp.headers['Content-Type'] = 'application/json'
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = resp
+        result = client.select_where('db', 'm', format='msgpack')
+
+    eq_(result, {'results': [{'statement_id': 0}]})
+
+
+def _fake_chunks(chunks, field_types):
+    """
+    Return a fake session send function answering a chunked SELECT with the
+    JSON *chunks* and SHOW FIELD KEYS with *field_types*.
+
+    """
+    import json
+
+    def send(request, **kwargs):
+        if 'SHOW+FIELD+KEYS' in request.url:
+            return _mock_response({'results': [{'statement_id': 0, 'series': [
+                {'name': 'm', 'columns': ['fieldKey', 'fieldType'],
+                 'values': [list(f) for f in field_types]}]}]})
+        body = ''.join(json.dumps(c) + '\n' for c in chunks)
+        return _stream_response(body.encode('utf-8'))
+
+    return send
+
+
+def _chunk(values, columns=('time', 'host', 'value')):
+    return {'results': [{'statement_id': 0, 'series': [
+        {'name': 'm', 'columns': list(columns), 'values': values}]}]}
+
+
+def test_select_to_arrow():
+    import pyarrow as pa
+    client = influx.client(_get_url())
+    chunks = [_chunk([[1000, 'a', 1], [2000, 'b', 2.5]]),
+              _chunk([[3000, None, 3]])]
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = _fake_chunks(chunks, [('value', 'float')])
+        table = client.select_to_arrow('db', 'm', where='time > 0',
+                                       chunk_size=2)
+
+        request = send.call_args_list[0][0][0]
+        ok_('chunked=true' in request.url)
+        ok_('chunk_size=2' in request.url)
+        eq_(send.call_args_list[0][1]['stream'], True)
+
+    eq_(table.num_rows, 3)
+    eq_(table.schema.field('time').type, pa.timestamp('us', tz='UTC'))
+    eq_(table.schema.field('host').type, pa.string())
+    eq_(table.schema.field('value').type, pa.float64())
+    eq_(table.column('value').to_pylist(), [1.0, 2.5, 3.0])
+    eq_(table.column('host').to_pylist(), ['a', 'b', None])
+
+
+def test_select_to_arrow_empty():
+    client = influx.client(_get_url())
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = _fake_chunks([{'results': [{'statement_id': 0}]}],
+                                        [])
+        table = client.select_to_arrow('db', 'm')
+
+    eq_(table.num_rows, 0)
+
+
+@raises(influx.requests.exceptions.HTTPError)
+def test_select_to_arrow_chunk_error():
+    client = influx.client(_get_url())
+    chunks = [_chunk([[1000, 'a', 1.5]]),
+              {'results': [{'statement_id': 0, 'error': 'max-select-point'}]}]
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = _fake_chunks(chunks, [('value', 'float')])
+        client.select_to_arrow('db', 'm')
+
+
+def test_select_to_arrow_computed_columns():
+    import pyarrow as pa
+    client = influx.client(_get_url())
+    columns = ('time', 'mean', 'spread')
+    chunks = [_chunk([[1000, 1, None], [2000, 2, None]], columns),
+              _chunk([[3000, 2.5, 0.5]], columns)]
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = _fake_chunks(chunks, [])
+        table = client.select_to_arrow('db', 'm', fields='mean, spread',
+                                       chunk_size=2)
+
+    eq_(table.schema.field('mean').type, pa.float64())
+    eq_(table.schema.field('spread').type, pa.float64())
+    eq_(table.column('mean').to_pylist(), [1.0, 2.0, 2.5])
+    eq_(table.column('spread').to_pylist(), [None, None, 0.5])
+
+
+@raises(ValueError)
+def test_export_parquet_late_column():
+    client = influx.client(_get_url())
+    columns = ('time', 'host', 'spread')
+    chunks = [_chunk([[1000, 'a', None]], columns),
+              _chunk([[2000, 'b', 0.5]], columns)]
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = _fake_chunks(chunks, [])
+        client.export_parquet(io.BytesIO(), 'db', 'm', chunk_size=1)
+
+
+def test_export_parquet():
+    import pyarrow.parquet as pq
+    client = influx.client(_get_url())
+    chunks = [_chunk([[1000, 'a', 1], [2000, 'b', 2]]),
+              _chunk([[3000, 'c', 3]])]
+    output = io.BytesIO()
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = _fake_chunks(chunks, [('value', 'integer')])
+        eq_(client.export_parquet(output, 'db', 'm', chunk_size=2), 3)
+
+    output.seek(0)
+    parquet = pq.ParquetFile(output)
+    eq_(parquet.num_row_groups, 2)
+    eq_(parquet.read().column('value').to_pylist(), [1, 2, 3])
+
+
+def test_write_queue():
+    client = influx.client(_get_url())
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        queue = influx.WriteQueue(client, flush_interval=60)
+        ok_(queue.put('db', 'm', {'value': 1.0}, time=1000))
+        ok_(queue.put('db', 'm', {'value': 2.0}, {'host': 'a'}, time=2000))
+        ok_(queue.put_line('other', 'm value=3.0 3000\n'))
+        ok_(queue.flush(timeout=5))
+        queue.close()
+
+        bodies = [c[0][0].body for c in send.call_args_list]
+
+    eq_(bodies, [b'm value=1.0 1000\nm,host=a value=2.0 2000\n',
+                 b'm value=3.0 3000\n'])
+    stats = queue.stats()
+    eq_(stats['queued'], 3)
+    eq_(stats['written'], 3)
+    eq_(stats['pending'], 0)
+
+
+def test_write_queue_failed():
+    client = influx.client(_get_url())
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response({'error': 'unable to parse'}, 400)
+        queue = influx.WriteQueue(client)
+        queue.put_line('db', 'm value=1.0 1000\n')
+        queue.close()
+
+    eq_(queue.stats()['failed'], 1)
+    eq_(queue.stats()['written'], 0)
+
+
+def test_write_queue_drop_newest():
+    queue = influx.WriteQueue(None, maxsize=2, policy='drop_newest',
+                              workers=0)
+    ok_(queue.put_line('db', 'a\n'))
+    ok_(queue.put_line('db', 'b\n'))
+    ok_(not queue.put_line('db', 'c\n'))
+
+    eq_([i[1] for i in queue.items], ['a\n', 'b\n'])
+    eq_(queue.stats()['dropped'], 1)
+    eq_(len(queue), 2)
+
+
+def test_write_queue_drop_oldest():
+    queue = influx.WriteQueue(None, maxsize=2, policy='drop_oldest',
+                              workers=0)
+    for line in ('a\n', 'b\n', 'c\n'):
+        ok_(queue.put_line('db', line))
+
+    eq_([i[1] for i in queue.items], ['b\n', 'c\n'])
+    eq_(queue.stats()['dropped'], 1)
+
+
+def test_write_queue_block_timeout():
+    queue = influx.WriteQueue(None, maxsize=1, policy='block', timeout=0.01,
+                              workers=0)
+    ok_(queue.put_line('db', 'a\n'))
+
+    start = time.time()
+    ok_(not queue.put_line('db', 'b\n'))
+    ok_(time.time() - start >= 0.01)
+    eq_(queue.stats()['dropped'], 1)
+
+
+@raises(ValueError)
+def test_write_queue_closed():
+    queue = influx.WriteQueue(None, workers=0)
+    queue.close()
+    queue.put_line('db', 'a\n')
+
+
+@raises(ValueError)
+def test_write_queue_spill_requires_path():
+    influx.WriteQueue(None, policy='spill', workers=0)
+
+
+def test_write_queue_spill_and_replay():
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), 'spill')
+    queue = influx.WriteQueue(None, maxsize=1, policy='spill',
+                              spill_path=path, workers=0)
+    ok_(queue.put_line('db', 'a 1\n'))
+    ok_(queue.put_line('db', 'b 2\n'))
+    ok_(queue.put_line('other', 'c 3\n'))
+
+    with open(path) as spill:
+        eq_(spill.read(), 'db\tb 2\nother\tc 3\n')
+    eq_(queue.stats()['spilled'], 2)
+    eq_(queue.stats()['queued'], 1)
+
+    # A new queue replays the spill file once its own queue is empty
+    client = influx.client(_get_url())
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        queue = influx.WriteQueue(client, policy='spill', spill_path=path,
+                                  flush_interval=0.01)
+        for _ in range(500):
+            if queue.stats()['written'] == 2:
+                break
+            time.sleep(0.01)
+        queue.close()
+
+        bodies = [c[0][0].body for c in send.call_args_list]
+
+    eq_(bodies, [b'b 2\n', b'c 3\n'])
+    ok_(not os.path.exists(path + '.replay'))
+
+
+def test_write_queue_replay_keeps_failed_points():
+    import requests
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), 'spill')
+    queue = influx.WriteQueue(None, maxsize=1, policy='spill',
+                              spill_path=path, workers=0)
+    for i in range(5):
+        queue.put_line('db', 'm v={} {}\n'.format(i, i))
+    eq_(queue.stats()['spilled'], 4)
+
+    # Failed replays keep every point, and are retried after a backoff
+    client = influx.client(_get_url())
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = requests.exceptions.ConnectionError()
+        queue = influx.WriteQueue(client, policy='spill', spill_path=path,
+                                  flush_interval=0.01, batch_size=2)
+        for _ in range(500):
+            if send.call_count:
+                break
+            time.sleep(0.01)
+        time.sleep(0.2)
+        queue.close()
+    eq_(send.call_count, 1)
+    eq_(queue.stats()['failed'], 0)
+    with open(path + '.replay') as replay:
+        eq_(replay.read(), ''.join('db\tm v={} {}\n'.format(i, i)
+                                   for i in range(1, 5)))
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        queue = influx.WriteQueue(client, policy='spill', spill_path=path,
+                                  flush_interval=0.01, batch_size=2)
+        for _ in range(500):
+            if queue.stats()['written'] == 4:
+                break
+            time.sleep(0.01)
+        queue.close()
+        bodies = [c[0][0].body for c in send.call_args_list]
+
+    eq_(b''.join(bodies), b''.join('m v={} {}\n'.format(i, i)
+                                   .encode('utf-8') for i in range(1, 5)))
+    ok_(not os.path.exists(path + '.replay'))
+
+
+def test_write_queue_spill_multiple_lines():
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), 'spill')
+    queue = influx.WriteQueue(None, maxsize=1, policy='spill',
+                              spill_path=path, workers=0)
+    ok_(queue.put_line('db', 'a 1\n'))
+    ok_(queue.put_line('db', 'b 2\nc 3\n'))
+    ok_(queue.put_line('other', 'd 4'))
+
+    with open(path) as spill:
+        eq_(spill.read(), 'db\tb 2\ndb\tc 3\nother\td 4\n')
+
+    client = influx.client(_get_url())
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        queue = influx.WriteQueue(client, policy='spill', spill_path=path,
+                                  flush_interval=0.01)
+        for _ in range(500):
+            if queue.stats()['written'] == 3:
+                break
+            time.sleep(0.01)
+        queue.close()
+
+        sent = [(c[0][0].url, c[0][0].body) for c in send.call_args_list]
+
+    eq_([body for _, body in sent], [b'b 2\nc 3\n', b'd 4\n'])
+    ok_('db=db' in sent[0][0])
+    ok_('db=other' in sent[1][0])
+
+
+def _udp_listener():
+    """ Return a bound UDP socket and its udp:// URL. """
+    import socket
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.settimeout(5)
+    return listener, 'udp://127.0.0.1:{}'.format(listener.getsockname()[1])
+
+
+def test_udp_datagrams():
+    payload = b'aaaa\nbbbb\ncccccccccccc\ndd\n'
+    eq_(list(influx.InfluxUDP._datagrams(payload, 10)),
+        [b'aaaa\nbbbb\n', b'cccccccccccc\n', b'dd\n'])
+    eq_(list(influx.InfluxUDP._datagrams(payload, 100)), [payload])
+    eq_(list(influx.InfluxUDP._datagrams(b'', 10)), [])
+
+
+def test_udp_write():
+    listener, url = _udp_listener()
+    client = influx.InfluxUDP(url, precision='u')
+
+    client.write('ignored', 'm', {'value': 1.0}, {'host': 'a'}, 1000)
+    eq_(listener.recv(2048), b'm,host=a value=1.0 1000\n')
+
+    client.write_many('ignored', 'm', ['time', 'value'],
+                      [[1000, 1.0], [2000, 2.0]], time_field='time')
+    eq_(listener.recv(2048), b'm value=1.0 1000\nm value=2.0 2000\n')
+
+    client.close()
+    listener.close()
+
+
+def test_udp_write_lines_mtu():
+    listener, url = _udp_listener()
+    client = influx.InfluxUDP(url, mtu=40)
+    lines = ''.join('m value={} {}\n'.format(i, i) for i in range(10))
+
+    client.write_lines('ignored', lines)
+    received = []
+    while len(b''.join(received)) < len(lines):
+        received.append(listener.recv(2048))
+
+    ok_(all(len(d) <= 40 for d in received))
+    ok_(all(d.endswith(b'\n') for d in received))
+    eq_(b''.join(received), lines.encode('utf-8'))
+    eq_(client.sent, len(received))
+    eq_(client.dropped, 0)
+
+    client.close()
+    listener.close()
+
+
+@raises(ValueError)
+def test_udp_bad_url():
+    influx.InfluxUDP('http://127.0.0.1:8086')
+
+
+def _unix_server():
+    """
+    Return a stand-in InfluxDB HTTP server listening on a unix socket in a
+    background thread, and the list of `(method, path, body)` requests it
+    receives. Writes and pings are answered with a 204, and queries with an
+    empty result.
+
+    """
+    import tempfile
+    import threading
+    try:
+        from socketserver import ThreadingMixIn, UnixStreamServer
+        from http.server import BaseHTTPRequestHandler
+    except ImportError:
+        from SocketServer import ThreadingMixIn, UnixStreamServer
+        from BaseHTTPServer import BaseHTTPRequestHandler
+
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.do_POST()
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0) or 0)
+            received.append((self.command, self.path,
+                             self.rfile.read(length)))
+            if self.path.startswith('/write') or self.path == '/ping':
+                self.send_response(204)
+                self.send_header('X-Influxdb-Version', '1.5.2')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = b'{"results": [{"statement_id": 0}]}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, UnixStreamServer):
+        daemon_threads = True
+
+    path = os.path.join(tempfile.mkdtemp(), 'influxdb.sock')
+    server = Server(path, Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, path, received
+
+
+def test_unix_split_url():
+    from influx import unix
+    eq_(unix.split_url('http+unix:///var/run/influxdb.sock'),
+        ('/var/run/influxdb.sock', 'http+unix://localhost/'))
+    eq_(unix.split_url('http+unix://%2Fvar%2Frun%2Finfluxdb.sock/api'),
+        ('/var/run/influxdb.sock', 'http+unix://localhost/api/'))
+
+
+def test_unix_socket_transport():
+    server, path, received = _unix_server()
+    client = influx.client('http+unix://' + path)
+
+    try:
+        client.write('db', 'm', {'value': 1.0}, time=1000)
+        eq_(client.select_where('db', 'm', where='time > 0'),
+            {'results': [{'statement_id': 0}]})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    eq_(received[0], ('POST', '/write?precision=u&db=db',
+                      b'm value=1.0 1000\n'))
+    method, url, _ = received[1]
+    eq_(method, 'GET')
+    ok_(url.startswith('/query?'))
+    ok_('q=SELECT+%2A+FROM+m+WHERE+time+%3E+0' in url)
+
+
+def test_ping():
+    client = influx.client(_get_url())
+    resp = _mock_response(None, 204)
+    resp.headers = {'X-Influxdb-Version': '1.5.2'}
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = resp
+        eq_(client.ping(), '1.5.2')
+        eq_(client.warm(3), '1.5.2')
+
+        eq_(send.call_count, 4)
+        ok_(send.call_args[0][0].url.endswith('/ping'))
+
+    eq_(client.version, '1.5.2')
+    ok_(client.latency >= 0)
+
+
+def test_warm_on_create():
+    server, path, received = _unix_server()
+    try:
+        client = influx.client('http+unix://' + path, warm=2)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    eq_(received, [('GET', '/ping', b'')] * 2)
+    eq_(client.version, '1.5.2')
+
+
+def test_warm_on_create_unavailable():
+    client = influx.client('http+unix:///nonexistent/influxdb.sock', warm=1)
+    eq_(client.version, None)
+
+
+def test_keepalive():
+    client = influx.client(_get_url())
+    resp = _mock_response(None, 204)
+    resp.headers = {'X-Influxdb-Version': '1.5.2'}
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = resp
+        client.start_keepalive(0.01, connections=2)
+        for _ in range(500):
+            if send.call_count >= 4:
+                break
+            time.sleep(0.01)
+        client.stop_keepalive()
+
+    ok_(send.call_count >= 4)
+    eq_(client.keepalive, None)
+
+
+def test_coalesce():
+    from influx.line_protocol import Point, Series, coalesce
+    series = Series('m', {'host': 'a'})
+    first = series.point({'a': 1, 'b': 1}, 1000)
+    points = [
+        first,
+        series.point({'a': 2}, 2000),
+        Point('m', {'b': 2}, {'host': 'a'}, 1000),
+        series.point({'a': 3, 'b': None}, 1000),
+        series.point({'a': 4}),
+        series.point({'a': 5}),
+        ]
+
+    result, merged = coalesce(points)
+
+    eq_(merged, 2)
+    eq_([(p.fields, p.time) for p in result],
+        [({'a': 3, 'b': 2}, 1000), ({'a': 2}, 2000), ({'a': 4}, None),
+         ({'a': 5}, None)])
+    # The points passed in are left alone
+    eq_(first.fields, {'a': 1, 'b': 1})
+
+
+def test_write_many_coalesce():
+    client = influx.client(_get_url())
+    before = client.coalesced
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        client.write_many('db', 'm', ['time', 'a', 'b'],
+                          [[1000, 1, None], [1000, None, 2], [2000, 3, 4],
+                           [1000, 5, None]],
+                          time_field='time', coalesce=True)
+        body = send.call_args[0][0].body
+
+    eq_(body, b'm a=5,b=2 1000\nm a=3,b=4 2000\n')
+    eq_(client.coalesced - before, 2)
+
+
+def test_write_queue_coalesce():
+    client = influx.client(_get_url())
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        queue = influx.WriteQueue(client, flush_interval=60, coalesce=True)
+        queue.put('db', 'm', {'a': 1}, {'host': 'x'}, time=1000)
+        queue.put('db', 'm', {'b': 2.0}, {'host': 'x'}, time=1000)
+        queue.put('db', 'm', {'a': 3}, {'host': 'y'}, time=1000)
+        queue.put_line('db', 'n value=1.0 1000\n')
+        queue.close()
+
+        body = send.call_args[0][0].body
+
+    eq_(body, b'n value=1.0 1000\n'
+              b'm,host=x a=1,b=2.0 1000\nm,host=y a=3 1000\n')
+    stats = queue.stats()
+    eq_(stats['coalesced'], 1)
+    eq_(stats['written'], 4)
+
+
+def test_write_queue_coalesce_reused_dicts():
+    client = influx.client(_get_url())
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        queue = influx.WriteQueue(client, flush_interval=60, coalesce=True)
+        fields = {'v': 1, 'h': 'a'}
+        tags = {'h': 'VALUE'}
+        queue.put('db', 'm', fields, tags, time=1)
+        fields['v'] = 2
+        queue.put('db', 'm', fields, tags, time=2)
+        queue.close()
+
+        body = send.call_args[0][0].body
+
+    # The caller's dicts are left alone, and each point keeps its own values
+    eq_(body, b'm,h=a v=1 1\nm,h=a v=2 2\n')
+    eq_(fields, {'v': 2, 'h': 'a'})
+    eq_(tags, {'h': 'VALUE'})
+
+
+def _rollup_client():
+    """ Return a fake client recording the points written through it. """
+    client = influx.client(_get_url())
+    written = []
+
+    def write_points(database, points):
+        written.extend((database, p.measurement, p.tags, p.time, p.fields)
+                       for p in points)
+
+    fake = mock.MagicMock()
+    fake.precision = 's'
+    fake.write_points.side_effect = write_points
+    fake._make_point = client._make_point
+    fake._make_many_points = client._make_many_points
+    return fake, written
+
+
+def test_rollup_writer():
+    client, written = _rollup_client()
+    rollup = influx.RollupWriter(client, '1m',
+                                 aggregates=('min', 'max', 'mean', 'count',
+                                             'last'))
+
+    rollup.write('db', 'm', {'value': 2.0, 'state': 'on'}, {'host': 'a'},
+                 time=60)
+    rollup.write_many('db', 'm', ['time', 'value'],
+                      [[70, 4.0], [80, 0.0], [90, 6.0]], {'host': 'a'},
+                      time_field='time')
+    rollup.write('db', 'm', {'value': 1.0}, {'host': 'b'}, time=100)
+    eq_(written, [])
+
+    # The first point in the next window closes this one
+    rollup.write('db', 'm', {'value': 9.0}, {'host': 'a'}, time=120)
+    eq_(sorted(written, key=lambda w: w[2]['host']), [
+        ('db', 'm', {'host': 'a'}, 60, {
+            'value_min': 0.0, 'value_max': 6.0, 'value_mean': 3.0,
+            'value_count': 4, 'value_last': 6.0,
+            'state_count': 1, 'state_last': 'on'}),
+        ('db', 'm', {'host': 'b'}, 60, {
+            'value_min': 1.0, 'value_max': 1.0, 'value_mean': 1.0,
+            'value_count': 1, 'value_last': 1.0}),
+        ])
+
+    # Points for a written window are dropped
+    rollup.write('db', 'm', {'value': 5.0}, {'host': 'a'}, time=119)
+    eq_(rollup.stats()['late'], 1)
+
+    del written[:]
+    rollup.close()
+    eq_(written, [('db', 'm', {'host': 'a'}, 120, {
+        'value_min': 9.0, 'value_max': 9.0, 'value_mean': 9.0,
+        'value_count': 1, 'value_last': 9.0})])
+    eq_(rollup.stats()['open'], 0)
+
+
+def test_rollup_writer_mixed_types():
+    client, written = _rollup_client()
+    rollup = influx.RollupWriter(client, 60, aggregates=('sum', 'mean',
+                                                         'count', 'last'))
+
+    # Only numbers are aggregated, though every value is counted
+    for value in ('x', 1.0, True, 3.0):
+        rollup.write('db', 'm', {'v': value}, time=10)
+    rollup.close()
+    eq_(written, [('db', 'm', {}, 0, {'v_sum': 4.0, 'v_mean': 2.0,
+                                      'v_count': 4, 'v_last': 3.0})])
+
+
+def test_rollup_writer_failed_write():
+    client, written = _rollup_client()
+    write_points = client.write_points.side_effect
+    client.write_points.side_effect = [ValueError("Failed"), None]
+    rollup = influx.RollupWriter(client, 60, aggregates=('sum',))
+
+    rollup.write('db', 'm', {'value': 1}, time=10)
+    rollup.write('db', 'm', {'value': 2}, time=20)
+    rollup.write('db', 'm', {'value': 4}, time=70)
+    stats = rollup.stats()
+    eq_(stats['failed'], 1)
+    eq_(stats['written'], 0)
+    eq_(stats['open'], 2)
+
+    # The failed window is written with the next windows to close
+    client.write_points.side_effect = write_points
+    rollup.close()
+    eq_(written, [('db', 'm', {}, 0, {'value_sum': 3}),
+                  ('db', 'm', {}, 60, {'value_sum': 4})])
+    stats = rollup.stats()
+    eq_(stats['written'], 2)
+    eq_(stats['open'], 0)
+
+
+def test_rollup_writer_lateness():
+    client, written = _rollup_client()
+    rollup = influx.RollupWriter(client, 60, aggregates=('sum',),
+                                 lateness=30)
+
+    rollup.write('db', 'm', {'value': 1}, time=10)
+    rollup.write('db', 'm', {'value': 1}, time=80)
+    # Still within the lateness of the first window
+    rollup.write('db', 'm', {'value': 1}, time=20)
+    eq_(written, [])
+
+    rollup.write('db', 'm', {'value': 1}, time=90)
+    eq_(written, [('db', 'm', {}, 0, {'value_sum': 2})])
+    eq_(rollup.stats()['late'], 0)
+
+
+def test_rollup_writer_max_series():
+    client, written = _rollup_client()
+    rollup = influx.RollupWriter(client, 60, aggregates=('count',),
+                                 lateness=600, max_series=2)
+
+    rollup.write('db', 'm', {'value': 1}, {'host': 'a'}, time=0)
+    rollup.write('db', 'm', {'value': 1}, {'host': 'b'}, time=0)
+    rollup.write('db', 'm', {'value': 1}, {'host': 'a'}, time=60)
+
+    eq_(sorted(w[2]['host'] for w in written), ['a', 'b'])
+    stats = rollup.stats()
+    eq_(stats['evicted'], 1)
+    eq_(stats['open'], 1)
+
+
+@raises(ValueError)
+def test_rollup_writer_bad_aggregate():
+    client, _ = _rollup_client()
+    influx.RollupWriter(client, aggregates=('median',))
+
+
+def test_hash_ring():
+    from influx.shard import HashRing
+    keys = ['series{}'.format(i) for i in range(2000)]
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    before = dict((k, ring.get(k)) for k in keys)
+
+    # Every node gets a share of the keys
+    counts = dict((n, list(before.values()).count(n)) for n in ring.nodes)
+    ok_(min(counts.values()) > 250)
+
+    # Adding a node only moves keys onto the new node
+    ring.add('e')
+    after = dict((k, ring.get(k)) for k in keys)
+    moved = [k for k in keys if before[k] != after[k]]
+    ok_(all(after[k] == 'e' for k in moved))
+    ok_(0.1 < len(moved) / float(len(keys)) < 0.3)
+
+    # Removing it moves them back
+    ring.remove('e')
+    eq_(before, dict((k, ring.get(k)) for k in keys))
+
+
+def test_sharded_write_many():
+    client = influx.ShardedInfluxDB(['http://shard1:8086',
+                                     'http://shard2:8086'])
+    sent = {}
+
+    def write_points(self, database, points):
+        sent.setdefault(self.url, []).extend((database, p.key())
+                                             for p in points)
+
+    # Clients have slots, so their class is patched instead
+    cls = type(client.clients['http://shard1:8086'])
+    with mock.patch.object(cls, 'write_points', autospec=True,
+                           side_effect=write_points):
+        client.write_many('db', 'm', ['time', 'host', 'value'],
+                          [[i, 'h{}'.format(i % 20), 1.0]
+                           for i in range(200)],
+                          {'host': 'VALUE'}, time_field='time')
+
+    eq_(set(sent), set(client.clients))
+    eq_(sum(len(k) for k in sent.values()), 200)
+    for url, keys in sent.items():
+        for database, key in keys:
+            eq_(database, 'db')
+            host = key.split('=')[1]
+            eq_(client.shard('db', 'm', {'host': host}).url, url)
+
+
+def test_sharded_select_where_merge():
+    client = influx.ShardedInfluxDB(['http://shard1:8086',
+                                     'http://shard2:8086'])
+    results = {
+        'http://shard1:8086': {'results': [{'statement_id': 0, 'series': [
+            {'name': 'm', 'columns': ['time', 'host', 'a'],
+             'values': [[1, 'x', 1], [4, 'x', 4]]}]}]},
+        'http://shard2:8086': {'results': [{'statement_id': 0, 'series': [
+            {'name': 'm', 'columns': ['time', 'b', 'host'],
+             'values': [[2, 20, 'y'], [3, 30, 'y']]}]}]},
+        }
+
+    cls = type(client.clients['http://shard1:8086'])
+    with mock.patch.object(cls, 'select_where', autospec=True,
+                           side_effect=lambda self, *a: results[self.url]):
+        result = client.select_where('db', 'm', where='time > 0', desc=True,
+                                     limit=3)
+
+    eq_(result, {'results': [{'statement_id': 0, 'series': [
+        {'name': 'm', 'columns': ['time', 'host', 'a', 'b'],
+         'values': [[4, 'x', 4, None], [3, 'y', None, 30],
+                    [2, 'y', None, 20]]}]}]})
+
+
+def _bulk_file(data, suffix='.lp'):
+    """ Return the path of a temporary file holding *data*. """
+    import tempfile
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(handle, 'wb') as target:
+        target.write(data)
+    return path
+
+
+def test_bulk_read_batches():
+    from influx import bulk
+    lines = [u'm,host=h{} value={}i {}'.format(i, i, i).encode('utf-8')
+             for i in range(100)]
+    path = _bulk_file(b'\n'.join(lines))
+    try:
+        batches = list(bulk.read_batches(path, 100))
+        # Every batch is whole lines, and the last line has no line ending
+        for end, payload in batches[:-1]:
+            ok_(payload.endswith(b'\n'))
+        eq_(b''.join(p for _, p in batches), b'\n'.join(lines))
+        eq_(batches[-1][0], os.path.getsize(path))
+
+        # Reading from an offset continues after that batch
+        end = batches[3][0]
+        rest = b''.join(p for _, p in bulk.read_batches(path, 100, end))
+        eq_(rest, b''.join(p for _, p in batches[4:]))
+
+        # Lines longer than a batch are not split
+        long_batches = list(bulk.read_batches(path, 5))
+        eq_([p for _, p in long_batches],
+            [line + b'\n' for line in lines[:-1]] + [lines[-1]])
+    finally:
+        os.remove(path)
+
+
+def test_bulk_import_resumes_from_checkpoint():
+    from influx import bulk
+    client = influx.InfluxDB('http://bulk:8086', precision='n')
+    lines = [u'm value={} {}'.format(i, i).encode('utf-8')
+             for i in range(1000)]
+    path = _bulk_file(b''.join(line + b'\n' for line in lines))
+    checkpoint = path + '.checkpoint'
+    written = []
+    failed = []
+
+    def fail_once(self, database, payload):
+        # The batch holding the middle line fails the first time
+        if b'm value=500 ' in payload and not failed:
+            failed.append(payload)
+            raise RuntimeError("down")
+        written.append(payload)
+
+    try:
+        # Clients have slots, so their class is patched instead
+        with mock.patch.object(type(client), 'write_lines', autospec=True,
+                               side_effect=fail_once):
+            try:
+                bulk.import_file(client, 'db', path, 1000, 1, checkpoint)
+            except RuntimeError:
+                pass
+            else:
+                ok_(False, "Import did not fail")
+
+            offset = bulk.load_checkpoint(checkpoint)
+            ok_(0 < offset < os.path.getsize(path))
+            totals = bulk.import_file(client, 'db', path, 1000, 3,
+                                      checkpoint)
+
+        ok_(not os.path.exists(checkpoint))
+        eq_(totals['offset'], os.path.getsize(path))
+        # Each line is written once
+        posted = b''.join(written).splitlines()
+        eq_(sorted(posted), sorted(lines))
+    finally:
+        os.remove(path)
+
+
+def test_bulk_import_progress_error():
+    from influx import bulk
+    client = influx.InfluxDB('http://bulk-progress:8086')
+    batches = ((i, b'm v=1 1\n') for i in range(1, 20))
+
+    def progress(totals):
+        raise KeyError("Failed")
+
+    # Clients have slots, so their class is patched instead
+    with mock.patch.object(type(client), 'write_lines', autospec=True):
+        thread = influx._Background(bulk.import_batches, client, 'db',
+                                    batches, 2, None, progress)
+        thread.join(5)
+    ok_(not thread.is_alive())
+    ok_(isinstance(thread.error, KeyError))
+
+
+def test_bulk_read_csv_batches():
+    from influx import bulk
+    path = _bulk_file(b'time,host,value,ok,note\n'
+                      b'1,a,1.5,true,x y\n'
+                      b'2,,2,false,\n', '.csv')
+    try:
+        batches = list(bulk.read_csv_batches(path, 'cpu', ['host'], 'time'))
+    finally:
+        os.remove(path)
+
+    eq_(batches, [(53, b'cpu,host=a note="x y",ok=True,value=1.5 1\n'
+                       b'cpu ok=False,value=2 2\n')])
+
+
+def test_bulk_read_csv_tag_values():
+    from influx import bulk
+    path = _bulk_file(b'time,host,VALUE,value\n'
+                      b'1,VALUE,a,1\n'
+                      b'2,,VALUE,2\n', '.csv')
+    try:
+        batches = list(bulk.read_csv_batches(path, 'cpu', ['host', 'VALUE'],
+                                             'time'))
+    finally:
+        os.remove(path)
+
+    # Tag values (and names) are written as they are
+    eq_(batches, [(45, b'cpu,VALUE=a,host=VALUE value=1 1\n'
+                       b'cpu,VALUE=VALUE value=2 2\n')])
+
+
+def test_bulk_csv_values():
+    from influx.bulk import _convert
+    eq_([_convert(v) for v in ('1', '-2', '+3', '1.5', '.5', '1e3', '2.E-1')],
+        [1, -2, 3, 1.5, 0.5, 1000.0, 0.2])
+    eq_([_convert(v) for v in ('nan', 'inf', '-Infinity', '1_000', '1e999',
+                               ' 1', '1\n', '0x10', '1.2.3')],
+        ['nan', 'inf', '-Infinity', '1_000', '1e999', ' 1', '1\n', '0x10',
+         '1.2.3'])
+    eq_([_convert(v) for v in ('', 'TRUE', 'false')], [None, True, False])
+
+
+def test_bulk_read_csv_quoted_line_endings():
+    from influx import bulk
+    data = (b'time,note\n' +
+            b''.join('{},"line {}\nnext"\r\n'.format(i, i).encode('utf-8')
+                     for i in range(1, 7)))
+    path = _bulk_file(data, '.csv')
+    try:
+        batches = list(bulk.read_csv_batches(path, 'm', time_field='time',
+                                             batch_bytes=40))
+        resumed = list(bulk.read_csv_batches(path, 'm', time_field='time',
+                                             batch_bytes=40,
+                                             offset=batches[0][0]))
+    finally:
+        os.remove(path)
+
+    # Batches end between rows, however long they are
+    lines = b''.join('m note="line {}\\nnext" {}\n'.format(i, i)
+                     .encode('utf-8') for i in range(1, 7))
+    eq_(b''.join(payload for _, payload in batches), lines)
+    eq_([payload.count(b'\n') for _, payload in batches], [3, 3])
+    eq_(batches[-1][0], len(data))
+    eq_(resumed, batches[1:])
+
+
+def test_copy_measurement():
+    import json
+    try:
+        from urllib.parse import unquote_plus
+    except ImportError:
+        from urllib import unquote_plus
+
+    src = influx.InfluxDB('http://copy-src:8086', precision='s')
+    dst = influx.InfluxDB('http://copy-dst:8086', precision='ms')
+    windows = {
+        'time >= 0s AND time < 100s': [
+            {'results': [{'statement_id': 0, 'series': [
+                {'name': 'm', 'tags': {'host': 'a'},
+                 'columns': ['time', 'count', 'value'],
+                 'values': [[10, 2, 1], [20, None, 2.5]]},
+                {'name': 'm', 'tags': {'host': ''},
+                 'columns': ['time', 'count', 'value'],
+                 'values': [[30, 3, 3]]},
+                {'name': 'm', 'tags': {'host': 'VALUE'},
+                 'columns': ['time', 'count', 'value'],
+                 'values': [[40, 1, 0.5]]}]}]},
+            _chunk([[90, 4, 4.5]], ('time', 'count', 'value'))],
+        'time >= 100s AND time < 200s': [{'results': [{'statement_id': 0}]}],
+        'time >= 200s AND time < 250s': [
+            _chunk([[200, 5, 5]], ('time', 'count', 'value'))],
+        }
+    queries = []
+
+    def send(request, **kwargs):
+        query = unquote_plus(request.url)
+        if 'SHOW FIELD KEYS' in query:
+            return _mock_response({'results': [{'statement_id': 0, 'series': [
+                {'name': 'm', 'columns': ['fieldKey', 'fieldType'],
+                 'values': [['count', 'integer'], ['value', 'float']]}]}]})
+        ok_('GROUP BY *' in query)
+        where = query.split('WHERE ')[1].split(' GROUP')[0]
+        queries.append(where)
+        body = ''.join(json.dumps(c) + '\n' for c in windows[where])
+        return _stream_response(body.encode('utf-8'))
+
+    written = []
+    with mock.patch.object(src.session, 'send', side_effect=send):
+        # Clients have slots, so their class is patched instead
+        with mock.patch.object(type(dst), 'write_lines', autospec=True,
+                               side_effect=lambda self, db, payload:
+                               written.append((self.url, db, payload))):
+            totals = influx.copy_measurement(src, dst, 'db', 'm', 0, 250,
+                                             window='100s', workers=1,
+                                             dst_database='copy')
+
+    eq_(queries, sorted(windows))
+    eq_(written, [
+        ('http://copy-dst:8086', 'copy',
+         b'm,host=a count=2i,value=1.0 10000\n'
+         b'm,host=a value=2.5 20000\n'
+         b'm count=3i,value=3.0 30000\n'
+         b'm,host=VALUE count=1i,value=0.5 40000\n'),
+        ('http://copy-dst:8086', 'copy',
+         b'm count=4i,value=4.5 90000\n'),
+        ('http://copy-dst:8086', 'copy',
+         b'm count=5i,value=5.0 200000\n'),
+        ])
+    eq_(totals['lines'], 6)
+    eq_(totals['offset'], 250)
+
+
+def test_profiling_samples_stages():
+    client = influx.InfluxDB('http://profile:8086', precision='s')
+    profiler = client.start_profiling(sample=2)
+    eq_(client.profiler, profiler)
+
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response({}, 204)
+        for i in range(5):
+            client.write('db', 'm', {'value': 1.0}, {'host': 'a'}, i)
+        send.return_value = _mock_response({'results': [{}]})
+        client.select_where('db', 'm', where='time > 0')
+
+    report = client.stop_profiling()
+    ok_(client.profiler is None)
+    summary = report.summary()
+    eq_(summary['serialize']['calls'], 5)
+    eq_(summary['serialize']['sampled'], 2)
+    eq_(summary['send']['calls'], 6)
+    eq_(summary['send']['sampled'], 3)
+    # Query responses are decoded to check for errors, and again for results
+    eq_(summary['decode']['calls'], 2)
+    eq_(summary['decode']['sampled'], 1)
+    ok_(summary['serialize']['mean'] > 0)
+    ok_(summary['serialize']['peak'] > 0)
+
+    # The serializer's own functions are in its profile
+    functions = [name for _, _, name in report.stats('serialize').stats]
+    ok_('make_lines' in functions)
+
+    output = io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+    report.dump(output, limit=5)
+    ok_(output.getvalue().startswith('serialize: 5 calls, 2 profiled'))
+
+
+def test_profiling_off_by_default():
+    client = influx.InfluxDB('http://profile-off:8086')
+    eq_(client.profiler, None)
+    eq_(client.stop_profiling(), None)
+
+
+def test_line_buffer():
+    from influx.line_protocol import LineBuffer, Point, make_lines_into
+    points = [Point('m', {'a b': 1.0, 's': 'x'}, {'host': 'a'}, i)
+              for i in range(20)]
+    points.append(Point('n', {'v': 2.0}, None, 30))
+    buffer = LineBuffer(16)
+
+    view = make_lines_into(buffer, points, 's')
+    eq_(bytes(view), influx.line_protocol.make_lines(points, 's')
+        .encode('utf-8'))
+
+    # A held view can't stop the buffer growing
+    buffer.clear()
+    make_lines_into(buffer, points * 10, 's')
+    eq_(bytes(buffer.view()), influx.line_protocol.make_lines(
+        points * 10, 's').encode('utf-8'))
+    eq_(bytes(view[:4]), b'm,ho')
+
+
+def test_reuse_buffers_over_socket():
+    server, path, received = _unix_server()
+    client = influx.InfluxDB('http+unix://' + path, reuse_buffers=True)
+
+    try:
+        client.write('db', 'm', {'value': 1.0}, time=1000)
+        client.write_many('db', 'm', ['value', 'time'],
+                          [[2.0, 2000], [3.0, 3000]], time_field='time')
+        client.write_points('db', [influx.Point('p', {'v': 1.0}, None, 5)])
+        queue = influx.WriteQueue(client, flush_interval=0.01)
+        queue.put_line('db', u'q v=1.0 6\n')
+        queue.put('db', 'q', {'v': 2.0}, time=7)
+        queue.close(5)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    eq_([body for _, _, body in received], [
+        b'm value=1.0 1000\n',
+        b'm value=2.0 2000\nm value=3.0 3000\n',
+        b'p v=1.0 5\n',
+        b'q v=1.0 6\nq v=2.0 7\n',
+        ])
+
+
+def test_circuit_breaker_opens_and_probes():
+    import requests
+    from influx.breaker import CircuitBreaker, CircuitOpenError
+    breaker = CircuitBreaker(failures=3, reset=10)
+    client = influx.InfluxDB('http://breaker:8086', breaker=breaker)
+    now = [1000.0]
+
+    with mock.patch('influx.breaker._clock', lambda: now[0]):
+        breaker.changed = now[0]
+        with mock.patch.object(client.session, 'send') as send:
+            send.side_effect = requests.exceptions.ConnectionError()
+            for _ in range(3):
+                try:
+                    client.write('db', 'm', {'value': 1.0}, time=1)
+                except CircuitOpenError:
+                    raise AssertionError("Circuit opened early")
+                except requests.exceptions.ConnectionError:
+                    pass
+            eq_(breaker.stats()['state'], 'open')
+
+            # Open circuits fail without sending
+            for _ in range(5):
+                try:
+                    client.write('db', 'm', {'value': 1.0}, time=1)
+                except CircuitOpenError:
+                    pass
+            eq_(send.call_count, 3)
+            eq_(breaker.stats()['rejected'], 5)
+
+            # A failed probe opens it again
+            now[0] += 10
+            eq_(breaker.stats()['state'], 'half_open')
+            try:
+                client.write('db', 'm', {'value': 1.0}, time=1)
+            except CircuitOpenError:
+                raise AssertionError("Probe was rejected")
+            except requests.exceptions.ConnectionError:
+                pass
+            eq_(send.call_count, 4)
+            eq_(breaker.stats()['state'], 'open')
+
+            # Only one probe is let through at a time
+            now[0] += 10
+            ok_(breaker.allow())
+            try:
+                client.write('db', 'm', {'value': 1.0}, time=1)
+                raise AssertionError("Second probe was sent")
+            except CircuitOpenError:
+                pass
+
+            # A successful probe closes it
+            breaker.success()
+            send.side_effect = None
+            send.return_value = _mock_response(None, 204)
+            client.write('db', 'm', {'value': 1.0}, time=1)
+            eq_(send.call_count, 5)
+
+    stats = breaker.stats()
+    eq_(stats['state'], 'closed')
+    eq_(stats['consecutive'], 0)
+    eq_(stats['tripped'], 1)
+
+
+def test_circuit_breaker_failure_rate():
+    from influx.breaker import CircuitBreaker
+    breaker = CircuitBreaker(failures=0, rate=0.5, window=4)
+    client = influx.InfluxDB('http://breaker-rate:8086', breaker=breaker)
+
+    # Server errors count as failures, other responses don't
+    responses = [_mock_response(None, status) for status in
+                 (500, 204, 400, 503)]
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = responses[:3]
+        for _ in range(3):
+            try:
+                client.write('db', 'm', {'value': 1.0}, time=1)
+            except Exception:
+                pass
+        eq_(breaker.stats()['state'], 'closed')
+        eq_(breaker.stats()['failure_rate'], 1 / 3.0)
+
+        send.side_effect = responses[3:]
+        try:
+            client.write('db', 'm', {'value': 1.0}, time=1)
+        except Exception:
+            pass
+    eq_(breaker.stats()['state'], 'open')
+    eq_(breaker.stats()['failure_rate'], 0.5)
+
+
+def test_write_queue_spills_on_open_circuit():
+    import tempfile
+    from influx.breaker import CircuitBreaker
+    path = os.path.join(tempfile.mkdtemp(), 'spill')
+    breaker = CircuitBreaker(failures=1, reset=3600)
+    breaker.failure()
+    client = influx.InfluxDB('http://breaker-queue:8086', breaker=breaker)
+
+    with mock.patch.object(client.session, 'send') as send:
+        queue = influx.WriteQueue(client, policy='spill', spill_path=path,
+                                  flush_interval=0.01)
+        queue.put_line('db', 'a 1\n')
+        queue.put_line('db', 'b 2\n')
+        queue.close(5)
+    eq_(send.call_count, 0)
+
+    with open(path) as spill:
+        eq_(spill.read(), 'db\ta 1\ndb\tb 2\n')
+    eq_(queue.stats()['spilled'], 2)
+    eq_(queue.stats()['failed'], 0)
+
+
+def _hedged_select(delays):
+    """
+    Return a fake `select_where` which answers with the client's URL after
+    the delay in seconds given for it in *delays*, raising a delay which is
+    an exception.
+
+    """
+    def select_where(self, *args):
+        delay = delays[self.url]
+        if isinstance(delay, Exception):
+            raise delay
+        time.sleep(delay)
+        return self.url
+    return select_where
+
+
+def test_hedged_read_goes_to_second_instance():
+    client = influx.HedgedInfluxDB(['http://hedge1:8086',
+                                    'http://hedge2:8086'], delay=0.05,
+                                   budget=1.0)
+    delays = {'http://hedge1:8086': 1.0, 'http://hedge2:8086': 0}
+
+    # Clients have slots, so their class is patched instead
+    cls = type(client.clients[0])
+    with mock.patch.object(cls, 'select_where', autospec=True,
+                           side_effect=_hedged_select(delays)):
+        start = time.time()
+        eq_(client.select_where('db', 'm'), 'http://hedge2:8086')
+        ok_(time.time() - start < 0.5)
+
+        # Reads take turns on the instances, and fast ones aren't hedged
+        eq_(client.select_where('db', 'm'), 'http://hedge2:8086')
+
+    eq_(client.stats(), {'reads': 2, 'hedged': 1, 'hedge_won': 1,
+                         'delay': 0.05})
+
+
+def test_hedged_read_budget():
+    client = influx.HedgedInfluxDB(['http://hedge3:8086',
+                                    'http://hedge4:8086'], delay=0.01,
+                                   budget=0.5)
+    delays = {'http://hedge3:8086': 0.1,
+              'http://hedge4:8086': ValueError("Failed")}
+
+    cls = type(client.clients[0])
+    with mock.patch.object(cls, 'select_where', autospec=True,
+                           side_effect=_hedged_select(delays)):
+        # The first read is over budget, so waits for the slow instance
+        eq_(client.select_where('db', 'm'), 'http://hedge3:8086')
+        eq_(client.stats()['hedged'], 0)
+
+        # A failure is hedged at once, within the budget
+        eq_(client.select_where('db', 'm'), 'http://hedge3:8086')
+        eq_(client.stats()['hedged'], 1)
+        eq_(client.stats()['hedge_won'], 1)
+
+        # Failures are raised over the budget, or when the hedge fails too
+        delays['http://hedge3:8086'] = KeyError("Failed")
+        for error in (KeyError, ValueError):
+            try:
+                client.select_where('db', 'm')
+                raise AssertionError("Error not raised")
+            except error:
+                pass
+        eq_(client.stats()['hedged'], 2)
+
+
+def test_hedged_read_delay_percentile():
+    client = influx.HedgedInfluxDB(['http://hedge5:8086',
+                                    'http://hedge6:8086'])
+    eq_(client.stats()['delay'], influx.hedge.DELAY)
+    client.latencies.extend(i / 1000.0 for i in range(100))
+    eq_(client.stats()['delay'], 0.095)
+
+
+def test_adaptive_batch_size():
+    import requests
+    from influx.batching import AdaptiveBatchSize
+    batching = AdaptiveBatchSize(1000, minimum=100, maximum=1600, target=0.5,
+                                 step=500)
+
+    # Full batches written quickly grow the size, up to the maximum
+    batching.success(1000, 0.1)
+    eq_(batching.size, 1500)
+    batching.success(500, 0.1)
+    eq_(batching.size, 1500)
+    batching.success(1500, 0.1)
+    eq_(batching.size, 1600)
+
+    # Slow writes, timeouts and overload statuses halve it
+    batching.success(1600, 1.0)
+    eq_(batching.size, 800)
+    ok_(batching.failure(requests.exceptions.ReadTimeout()))
+    eq_(batching.size, 400)
+    response = _mock_response(None, 413)
+    ok_(batching.failure(requests.exceptions.HTTPError(response=response)))
+    eq_(batching.size, 200)
+
+    # Other errors leave it alone, and it stops at the minimum
+    response = _mock_response(None, 400)
+    ok_(not batching.failure(requests.exceptions.HTTPError(
+        response=response)))
+    ok_(not batching.failure(requests.exceptions.ConnectionError()))
+    eq_(batching.size, 200)
+    batching.success(200, 1.0)
+    batching.success(100, 1.0)
+    eq_(batching.size, 100)
+
+    stats = batching.stats()
+    eq_(stats['size'], 100)
+    eq_(stats['writes'], 6)
+    eq_(stats['errors'], 4)
+    eq_(stats['increases'], 2)
+    eq_(stats['decreases'], 4)
+    ok_(stats['throughput'] > 0)
+
+
+@raises(ValueError)
+def test_adaptive_batch_size_bounds():
+    influx.AdaptiveBatchSize(50, minimum=100)
+
+
+def test_write_many_adaptive_batches():
+    batching = influx.AdaptiveBatchSize(4, minimum=1, maximum=4, step=1)
+    client = influx.InfluxDB('http://batching:8086', batching=batching)
+
+    # A batch refused as too large is split and retried, and the batch size
+    # grows again as batches are written
+    too_large = _mock_response({'error': 'Request Entity Too Large'}, 413)
+    with mock.patch.object(client.session, 'send') as send:
+        send.side_effect = [too_large] + [_mock_response(None, 204)] * 5
+        client.write_many('db', 'm', ['time', 'value'],
+                          [[i, float(i)] for i in range(9)],
+                          time_field='time')
+        bodies = [c[0][0].body for c in send.call_args_list]
+
+    eq_([body.count(b'\n') for body in bodies], [4, 2, 3, 4])
+    eq_(b''.join(bodies[1:]), influx.InfluxDB._make_many_lines(
+        'm', ['time', 'value'], [[i, float(i)] for i in range(9)],
+        time_field='time', precision='u').encode('utf-8'))
+    stats = batching.stats()
+    eq_(stats['size'], 4)
+    eq_(stats['points'], 9)
+    eq_(stats['decreases'], 1)
+
+
+def test_write_queue_adaptive_batches():
+    batching = influx.AdaptiveBatchSize(2, minimum=1, maximum=3, step=1)
+    client = influx.InfluxDB('http://batching-queue:8086')
+    with mock.patch.object(client.session, 'send') as send:
+        send.return_value = _mock_response(None, 204)
+        queue = influx.WriteQueue(client, batching=batching,
+                                  flush_interval=5)
+        for i in range(5):
+            queue.put_line('db', 'm v={} {}\n'.format(i, i))
+        ok_(queue.flush(5))
+        queue.close(5)
+        bodies = [c[0][0].body for c in send.call_args_list]
+
+    eq_(b''.join(bodies), b''.join(
+        'm v={} {}\n'.format(i, i).encode('utf-8') for i in range(5)))
+    eq_(batching.stats()['points'], 5)
+    eq_(batching.size, 3)